@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+
+class AnalyticsCache:
+    """
+    In-memory store for analytics results.
+
+    Entries are keyed by (graph version, analytic name, parameters), so a
+    result computed for one version of the graph is never served for
+    another. Concurrent lookups of a key that is being computed wait for
+    that computation instead of starting their own. Cached values are shared
+    between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        # Results for versions older than this, finished by readers still
+        # pinned to an old graph, are returned but not stored
+        self._oldest_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(version, name, params):
+        return (version, name, tuple(sorted(params.items())))
+
+    def get(self, version, name, **params):
+        """Return (found, value) without computing anything"""
+        key = self.make_key(version, name, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True, self._entries[key]
+        return False, None
+
+    def put(self, version, name, value, **params):
+        key = self.make_key(version, name, params)
+        with self._lock:
+            if self._oldest_version is not None and version < self._oldest_version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, version, name, compute, **params):
+        """Return the cached result for this key, computing and storing it on a miss"""
+        key = self.make_key(version, name, params)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+                self.misses += 1
+
+        if not owner:
+            # Another thread is computing this key; share its result, or
+            # try again ourselves if that computation failed
+            event.wait()
+            found, value = self.get(version, name, **params)
+            if found:
+                with self._lock:
+                    self.hits += 1
+                return value
+            return self.get_or_compute(version, name, compute, **params)
+
+        # Compute outside the lock so that nested lookups of shared
+        # intermediates (PageRank, components, degrees) can proceed
+        try:
+            value = compute()
+            self.put(version, name, value, **params)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+        return value
+
+    def invalidate(self, keep_version=None):
+        """Drop every entry, or every entry not belonging to keep_version"""
+        with self._lock:
+            if keep_version is None:
+                self._entries.clear()
+                return
+            self._oldest_version = keep_version
+            for key in [k for k in self._entries if k[0] != keep_version]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
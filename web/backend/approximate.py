@@ -0,0 +1,436 @@
+import threading
+import time
+
+import numpy as np
+
+from impact import propagate_bitsets, scenario_bits
+from risk import node_uniforms
+
+APPROXIMATE_METRICS = ["clustering", "betweenness", "diameter", "reachability"]
+
+# Two-sided 95% normal quantile used for all confidence intervals
+Z_95 = 1.96
+
+# Registers per node of the reachability sketches; relative error about 1.04 / sqrt(REACH_REGISTERS)
+REACH_REGISTERS = 64
+
+# Bootstrap resamples for the distance-distribution intervals
+BOOTSTRAP_SAMPLES = 200
+
+# Samples needed before an interval is trusted to decide that an estimate is precise enough
+MIN_SAMPLES = 30
+
+
+def _mean_interval(values, population):
+    """Mean of a sample drawn without replacement and its 95% interval (finite population corrected)"""
+    k = len(values)
+    mean = float(np.mean(values)) if k else 0.0
+    if k < 2:
+        return mean, None, None
+    half = Z_95 * float(np.std(values, ddof=1)) / np.sqrt(k) * np.sqrt(max(1 - k / population, 0.0))
+    return mean, mean - half, mean + half
+
+
+class SampledEstimator:
+    """
+    An estimate that improves as more sampled units (nodes or BFS sources)
+    are processed. Units are taken in a fixed random order without
+    replacement, so once every unit is processed the estimate is exact.
+    refine() can be called from several threads; units are claimed under a
+    lock and processed outside it.
+    """
+
+    # Units claimed per step; subclasses size it to their cost per unit
+    chunk = 64
+
+    def __init__(self, population, seed=42):
+        self.population = population
+        self.order = np.random.default_rng(seed).permutation(population)
+        self.taken = 0
+        self.processed = 0
+        self.steps = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def complete(self):
+        return self.processed >= self.population
+
+    def precise_enough(self, precision):
+        """Whether the relative half-width of the main interval is within precision"""
+        with self._lock:
+            return self._precise_enough(precision)
+
+    def _precise_enough(self, precision):
+        if self.complete():
+            return True
+        if self.processed < MIN_SAMPLES:
+            return False
+        value, low, high = self.interval()
+        if low is None:
+            return False
+        return (high - low) / 2 <= precision * max(abs(value), 1e-12)
+
+    def refine(self, seconds, precision=None):
+        """
+        Process more units for up to `seconds`, or until the estimate is
+        precise enough. The first call always processes one step, so that
+        there is an estimate at all; after that a step is only started when
+        it is expected to finish in time.
+        """
+        deadline = time.perf_counter() + seconds
+        while self.taken == 0 or time.perf_counter() + self.step_seconds() < deadline:
+            with self._lock:
+                if self.taken >= self.population or (precision is not None and self._precise_enough(precision)):
+                    return
+                units = self.order[self.taken:self.taken + self.chunk]
+                self.taken += len(units)
+            start = time.perf_counter()
+            samples = self.process(units)
+            with self._lock:
+                self.merge(samples)
+                self.processed += len(units)
+                self.steps += 1
+                self.seconds += time.perf_counter() - start
+
+    def step_seconds(self):
+        """Average time of a step so far"""
+        return self.seconds / self.steps if self.steps else 0.0
+
+    def summary(self):
+        return {
+            "samples": self.processed,
+            "population": self.population,
+            "exact": self.complete(),
+            "seconds": self.seconds,
+        }
+
+
+class ClusteringEstimator(SampledEstimator):
+    """
+    Average local clustering coefficient (as nx.average_clustering on the
+    undirected graph) from the exact coefficients of sampled nodes.
+    """
+
+    chunk = 256
+
+    def __init__(self, undirected, seed=42):
+        super().__init__(undirected.number_of_nodes(), seed)
+        self.graph = undirected
+        src, dst = undirected.edge_arrays()
+        n = undirected.number_of_nodes()
+        # Rows are sorted, so the packed edge keys are too
+        self.keys = src.astype(np.int64) * n + dst
+        self.row_lengths = undirected.out_degree()
+        self.degree = self.row_lengths - np.bincount(src[src == dst], minlength=n)
+        self.values = []
+
+    def process(self, nodes):
+        n = self.population
+        v, u = self.graph.out_edges(np.sort(nodes))
+        keep = v != u
+        v, u = v[keep], u[keep]
+        # Every neighbour w of every neighbour u of v closes a triangle when (v, w) is an edge
+        middle, w = self.graph.out_edges(u)
+        owners = np.repeat(v, self.row_lengths[u])
+        keys = owners * n + w
+        pos = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        closed = (self.keys[pos] == keys) & (w != owners) & (w != middle)
+        triangles = np.bincount(owners[closed], minlength=n)[nodes] / 2
+        degree = self.degree[nodes]
+        pairs = degree * (degree - 1) / 2
+        return np.divide(triangles, pairs, out=np.zeros(len(nodes)), where=pairs > 0)
+
+    def merge(self, samples):
+        self.values.append(samples)
+
+    def interval(self):
+        values = np.concatenate(self.values) if self.values else np.zeros(0)
+        return _mean_interval(values, self.population)
+
+    def estimate(self, top_k=10):
+        with self._lock:
+            value, low, high = self.interval()
+            return {"average_clustering": value, "ci_low": low, "ci_high": high, **self.summary()}
+
+
+class BetweennessEstimator(SampledEstimator):
+    """
+    Normalized betweenness centrality (as nx.betweenness_centrality on the
+    directed graph) from Brandes' dependency accumulation over sampled
+    sources, scaled by population / samples. Intervals come from the
+    per-source variance of every node's dependencies.
+    """
+
+    chunk = 2
+
+    def __init__(self, graph, seed=42):
+        super().__init__(graph.number_of_nodes(), seed)
+        self.graph = graph
+        self.sums = np.zeros(self.population)
+        self.squares = np.zeros(self.population)
+
+    def _dependencies(self, source):
+        n = self.population
+        dist = np.full(n, -1, dtype=np.int64)
+        sigma = np.zeros(n)
+        dist[source] = 0
+        sigma[source] = 1
+        frontier = np.array([source])
+        levels = []
+        depth = 0
+        # Per-level work is proportional to the level's edges, never to n,
+        # since directed searches can have hundreds of thin levels
+        while len(frontier):
+            src, dst = self.graph.out_edges(frontier)
+            fresh = np.unique(dst[dist[dst] < 0])
+            dist[fresh] = depth + 1
+            on_path = dist[dst] == depth + 1
+            src, dst = src[on_path], dst[on_path]
+            sigma[fresh] = np.bincount(np.searchsorted(fresh, dst), weights=sigma[src], minlength=len(fresh))
+            levels.append((frontier, src, dst))
+            frontier = fresh
+            depth += 1
+        delta = np.zeros(n)
+        for frontier, src, dst in reversed(levels):
+            weights = sigma[src] / sigma[dst] * (1 + delta[dst])
+            delta[frontier] += np.bincount(np.searchsorted(frontier, src), weights=weights, minlength=len(frontier))
+        delta[source] = 0
+        return delta
+
+    def process(self, sources):
+        return [self._dependencies(source) for source in sources]
+
+    def merge(self, samples):
+        for delta in samples:
+            self.sums += delta
+            self.squares += delta * delta
+
+    def _scale(self):
+        n = self.population
+        return 1 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+
+    def _node_intervals(self):
+        k = max(self.processed, 1)
+        mean = self.sums / k
+        value = mean * self.population * self._scale()
+        if self.processed < 2:
+            return value, None
+        variance = np.maximum(self.squares / k - mean * mean, 0) * k / (k - 1)
+        fpc = np.sqrt(max(1 - k / self.population, 0.0))
+        half = Z_95 * np.sqrt(variance / k) * fpc * self.population * self._scale()
+        return value, half
+
+    def interval(self):
+        # Precision is judged on the most central node
+        value, half = self._node_intervals()
+        top = int(np.argmax(value))
+        if half is None:
+            return float(value[top]), None, None
+        return float(value[top]), float(value[top] - half[top]), float(value[top] + half[top])
+
+    def estimate(self, top_k=10):
+        with self._lock:
+            value, half = self._node_intervals()
+            top = np.argsort(-value, kind="stable")[:top_k]
+            nodes = [
+                {
+                    "node": int(self.graph.node_ids[i]),
+                    "betweenness": float(value[i]),
+                    "ci_low": float(value[i] - half[i]) if half is not None else None,
+                    "ci_high": float(value[i] + half[i]) if half is not None else None,
+                }
+                for i in top
+            ]
+            return {"top_nodes": nodes, **self.summary()}
+
+
+class DiameterEstimator(SampledEstimator):
+    """
+    Distance distribution of the undirected graph from breadth-first
+    searches out of sampled sources, 64 at a time as bitsets. Gives the
+    effective diameter (90th percentile distance, interpolated as SNAP
+    does), the average distance and the longest distance seen, which is a
+    lower bound of the diameter. Intervals bootstrap over the sources.
+    """
+
+    chunk = 64
+
+    def __init__(self, undirected, seed=42):
+        super().__init__(undirected.number_of_nodes(), seed)
+        self.graph = undirected
+        self.seed = seed
+        # Row d holds, per processed source, the number of nodes at distance d + 1
+        self.histograms = np.zeros((0, 0), dtype=np.int64)
+
+    def process(self, sources):
+        num = len(sources)
+        visited = np.zeros((self.population, 1), dtype=np.uint64)
+        order = np.argsort(sources)
+        rows = sources[order]
+        visited[rows, 0] = np.uint64(1) << order.astype(np.uint64)
+        counts = []
+        for _, reached, bits in propagate_bitsets(self.graph, visited, rows, visited[rows], self.population):
+            counts.append(scenario_bits(bits, num).sum(axis=0))
+        return np.array(counts, dtype=np.int64).reshape(len(counts), num)
+
+    def merge(self, samples):
+        levels = max(len(self.histograms), len(samples))
+        merged = np.zeros((levels, self.histograms.shape[1] + samples.shape[1]), dtype=np.int64)
+        merged[:len(self.histograms), :self.histograms.shape[1]] = self.histograms
+        merged[:len(samples), self.histograms.shape[1]:] = samples
+        self.histograms = merged
+
+    @staticmethod
+    def _effective_diameter(counts, quantile=0.9):
+        total = counts.sum()
+        if total == 0:
+            return 0.0
+        cumulative = np.cumsum(counts) / total
+        d = int(np.searchsorted(cumulative, quantile))
+        below = cumulative[d - 1] if d > 0 else 0.0
+        # Interpolate between distance d and d + 1 (counts[d] is distance d + 1)
+        return d + (quantile - below) / (cumulative[d] - below)
+
+    @staticmethod
+    def _average_distance(counts):
+        total = counts.sum()
+        return float((np.arange(1, len(counts) + 1) * counts).sum() / total) if total else 0.0
+
+    def _bootstrap(self, statistic):
+        k = self.histograms.shape[1]
+        if k < 2:
+            return None, None
+        rng = np.random.default_rng(self.seed)
+        draws = rng.integers(0, k, size=(BOOTSTRAP_SAMPLES, k))
+        values = [statistic(self.histograms[:, draw].sum(axis=1)) for draw in draws]
+        return float(np.percentile(values, 2.5)), float(np.percentile(values, 97.5))
+
+    def interval(self):
+        counts = self.histograms.sum(axis=1)
+        low, high = self._bootstrap(self._effective_diameter)
+        return self._effective_diameter(counts), low, high
+
+    def estimate(self, top_k=10):
+        with self._lock:
+            counts = self.histograms.sum(axis=1)
+            value, low, high = self.interval()
+            average_low, average_high = self._bootstrap(self._average_distance)
+            return {
+                "effective_diameter": value,
+                "ci_low": low,
+                "ci_high": high,
+                "average_distance": self._average_distance(counts),
+                "average_distance_ci_low": average_low,
+                "average_distance_ci_high": average_high,
+                "diameter_lower_bound": int(np.flatnonzero(counts).max() + 1) if counts.any() else 0,
+                **self.summary(),
+            }
+
+
+class ReachabilityEstimator:
+    """
+    Number of nodes reachable from every node along directed edges, from
+    HyperLogLog sketches (as in HyperANF): every node starts with a sketch
+    of itself and each hop merges the sketches of its successors, so after
+    h hops a node's sketch counts the nodes within h hops. Refining runs
+    more hops until no sketch changes. Every per-node count has a relative
+    standard error of about 1.04 / sqrt(REACH_REGISTERS); the interval of
+    the average assumes those errors can be fully correlated.
+    """
+
+    def __init__(self, graph, registers=REACH_REGISTERS, seed=42):
+        self.graph = graph
+        self.registers = registers
+        n = graph.number_of_nodes()
+        # Each node lands in one register with a geometric rank
+        u = node_uniforms(graph.node_ids, 0, seed)
+        slot = np.minimum((u * registers).astype(np.int64), registers - 1)
+        rest = np.maximum(u * registers - slot, 2.0**-60)
+        self.sketches = np.zeros((n, registers), dtype=np.uint8)
+        self.sketches[np.arange(n), slot] = np.minimum(np.floor(-np.log2(rest)) + 1, 255).astype(np.uint8)
+        self.hops = 0
+        self.converged = n == 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._refine_lock = threading.Lock()
+
+    def _hop(self):
+        """Sketches after one more hop"""
+        offsets = self.graph.out_offsets
+        merged = self.sketches.copy()
+        rows_with_edges = np.flatnonzero(np.diff(offsets) > 0)
+        row_ends = offsets[rows_with_edges + 1]
+        # Gather the successor sketches of a few million bytes' worth of edges at a time
+        edges_per_step = max(1, (1 << 22) // self.registers)
+        begin = 0
+        while begin < len(rows_with_edges):
+            limit = offsets[rows_with_edges[begin]] + edges_per_step
+            end = max(begin + 1, int(np.searchsorted(row_ends, limit, side="right")))
+            rows = rows_with_edges[begin:end]
+            counts = offsets[rows + 1] - offsets[rows]
+            starts = np.r_[0, np.cumsum(counts)[:-1]]
+            _, targets = self.graph.out_edges(rows)
+            merged[rows] = np.maximum(merged[rows], np.maximum.reduceat(self.sketches[targets], starts, axis=0))
+            begin = end
+        return merged
+
+    def refine(self, seconds, precision=None):
+        """
+        Run more hops for up to `seconds`, at least one on the first call
+        and otherwise only hops expected to finish in time (precision is
+        fixed by the number of registers).
+        """
+        deadline = time.perf_counter() + seconds
+        # One refiner at a time; when another one is running, leave the work
+        # to it (unless there is no estimate yet) and keep reading the last
+        # finished hop meanwhile
+        if not self._refine_lock.acquire(blocking=self.hops == 0):
+            return
+        try:
+            while not self.converged and (self.hops == 0 or time.perf_counter() + self.step_seconds() < deadline):
+                start = time.perf_counter()
+                merged = self._hop()
+                with self._lock:
+                    self.converged = np.array_equal(merged, self.sketches)
+                    self.sketches = merged
+                    self.hops += 1
+                    self.seconds += time.perf_counter() - start
+        finally:
+            self._refine_lock.release()
+
+    def step_seconds(self):
+        """Average time of a hop so far"""
+        return self.seconds / self.hops if self.hops else 0.0
+
+    def complete(self):
+        return self.converged
+
+    def precise_enough(self, precision):
+        return self.converged
+
+    def counts(self):
+        """HyperLogLog estimate of every node's sketch size"""
+        m = self.registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.sketches.astype(np.float64)), axis=1)
+        zeros = np.count_nonzero(self.sketches == 0, axis=1)
+        small = (raw <= 2.5 * m) & (zeros > 0)
+        raw[small] = m * np.log(m / zeros[small])
+        return raw
+
+    def estimate(self, top_k=10):
+        with self._lock:
+            counts = self.counts()
+            error = Z_95 * 1.04 / np.sqrt(self.registers)
+            average = float(counts.mean()) if len(counts) else 0.0
+            return {
+                "average_reachable": average,
+                "ci_low": average * (1 - error),
+                "ci_high": average * (1 + error),
+                "median_reachable": float(np.median(counts)) if len(counts) else 0.0,
+                "p90_reachable": float(np.percentile(counts, 90)) if len(counts) else 0.0,
+                "hops": self.hops,
+                "exact": False,
+                "converged": self.converged,
+                "seconds": self.seconds,
+            }
@@ -0,0 +1,278 @@
+"""
+Benchmark of the analytics hot paths on synthetic co-purchase graphs.
+
+Generates directed power-law graphs offline at several scales, times
+load_graph (parsing and snapshot), get_basic_stats, get_community_detection
+and get_risk_analysis with the peak memory each allocates, and measures /query
+throughput through an in-process ASGI client. Results are written as JSON
+and can be compared against a stored baseline:
+
+    python benchmark.py --scales 1e4 1e5 1e6 --output results.json
+    python benchmark.py --baseline benchmark_baseline.json
+    python benchmark.py --scales 1e4 1e5 1e6 --save-baseline benchmark_baseline.json
+
+The run exits with status 1 when a stage is slower (or /query throughput
+lower) than the baseline by more than --threshold.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+# Edges per node of the generated graphs, close to Amazon0302 (1.23M edges, 262k nodes)
+AVG_OUT_DEGREE = 5
+# Share of co-purchases within a product's neighbourhood of ids; these form the communities
+LOCAL_SHARE = 0.8
+LOCAL_SPAN = 50
+
+QUERIES = [
+    "give me an overview stats",
+    "show risk clusters",
+    "degree distribution",
+    "which products are important hubs",
+    "community structure of the network",
+]
+
+# Differences below this many seconds are never reported as regressions
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def generate_copurchase_graph(num_edges, seed=0):
+    """
+    (sources, targets) of a synthetic directed co-purchase graph with about
+    num_edges edges. Out-degrees follow a power law; most targets lie close
+    to their source in id order, giving community structure, and the rest
+    are drawn with power-law popularity, giving hubs with large in-degree.
+    """
+    rng = np.random.default_rng(seed)
+    num_nodes = max(num_edges // AVG_OUT_DEGREE, 2)
+    activity = rng.pareto(1.5, num_nodes) + 1
+    sources = rng.choice(num_nodes, size=num_edges, p=activity / activity.sum())
+    popularity = rng.pareto(1.2, num_nodes) + 1
+    popular = rng.choice(num_nodes, size=num_edges, p=popularity / popularity.sum())
+    local = (sources + rng.integers(-LOCAL_SPAN, LOCAL_SPAN + 1, num_edges)) % num_nodes
+    targets = np.where(rng.random(num_edges) < LOCAL_SHARE, local, popular)
+    keep = sources != targets
+    return sources[keep], targets[keep]
+
+
+def write_edge_list(path, sources, targets):
+    """Write edges in the gzipped SNAP format of the Amazon0302 dataset"""
+    with gzip.open(path, "wb", compresslevel=1) as f:
+        f.write(b"# Synthetic co-purchase graph\n# FromNodeId\tToNodeId\n")
+        chunk = 1000000
+        for start in range(0, len(sources), chunk):
+            rows = zip(sources[start:start + chunk].tolist(), targets[start:start + chunk].tolist())
+            f.write("".join("%d\t%d\n" % row for row in rows).encode())
+
+
+def dataset_dir(work_dir, num_edges, seed):
+    """Directory holding the generated dataset of one scale, generated on first use"""
+    path = os.path.join(work_dir, f"edges-{num_edges}-seed-{seed}")
+    dataset = os.path.join(path, "amazon0302.txt.gz")
+    if not os.path.exists(dataset):
+        os.makedirs(path, exist_ok=True)
+        sources, targets = generate_copurchase_graph(num_edges, seed)
+        write_edge_list(dataset + ".tmp", sources, targets)
+        os.replace(dataset + ".tmp", dataset)
+    return path
+
+
+def timed(fn):
+    """Seconds taken by one call of fn"""
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def traced(fn):
+    """
+    Peak memory (MB) allocated by one call of fn above what was allocated
+    before it, as seen by tracemalloc (Python objects and NumPy arrays).
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return (peak - before) / 2**20
+
+
+def run_stages(data_dir, measure):
+    """
+    Apply measure to every stage on fresh analyzers, from a cold load onwards.
+    Returns the analyzer the stages ran on and the measurement of each stage.
+    """
+    from graph_analysis import AmazonGraphAnalyzer
+
+    # Cold load parses the edge list and writes the snapshot; warm load maps it
+    snapshot = os.path.join(data_dir, "amazon0302.snapshot")
+    if os.path.isdir(snapshot):
+        shutil.rmtree(snapshot)
+    elif os.path.exists(snapshot):
+        os.remove(snapshot)
+    stages = {"load_graph": measure(AmazonGraphAnalyzer(data_dir).load_graph)}
+    analyzer = AmazonGraphAnalyzer(data_dir)
+    stages["load_snapshot"] = measure(analyzer.load_graph)
+    stages["get_basic_stats"] = measure(analyzer.get_basic_stats)
+    stages["get_community_detection"] = measure(analyzer.get_community_detection)
+    stages["get_risk_analysis"] = measure(analyzer.get_risk_analysis)
+    return analyzer, stages
+
+
+async def query_throughput(analyzer, requests, concurrency):
+    """Requests per second and latency percentiles of /query, through the ASGI app in-process"""
+    import httpx
+    import main
+
+    main.graph_analyzer = analyzer
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # Compute everything the queries need before measuring
+        for query in QUERIES:
+            response = await client.post("/query", json={"query": query})
+            response.raise_for_status()
+
+        latencies = []
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(QUERIES[i % len(QUERIES)])
+
+        async def worker():
+            while not queue.empty():
+                query = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.post("/query", json={"query": query})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": seconds,
+        "requests_per_second": requests / seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def run_scale(num_edges, work_dir, seed, requests, concurrency):
+    start = time.perf_counter()
+    data_dir = dataset_dir(work_dir, num_edges, seed)
+    generate_seconds = time.perf_counter() - start
+
+    # Tracing slows allocation-heavy code down, so memory gets a pass of its own
+    _, peaks = run_stages(data_dir, traced)
+    analyzer, seconds = run_stages(data_dir, timed)
+    stages = {name: {"seconds": seconds[name], "peak_mb": peaks[name]} for name in seconds}
+
+    return {
+        "nodes": analyzer.graph.number_of_nodes(),
+        "edges": analyzer.graph.number_of_edges(),
+        "generate_seconds": generate_seconds,
+        "stages": stages,
+        "query": asyncio.run(query_throughput(analyzer, requests, concurrency)),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Lines describing every measurement against the baseline, and the regressions among them"""
+    lines, regressions = [], []
+    for scale, current in results["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if previous is None:
+            lines.append(f"{scale:>10} edges: not in baseline")
+            continue
+        for stage, measured in current["stages"].items():
+            if stage not in previous["stages"]:
+                continue
+            before, after = previous["stages"][stage]["seconds"], measured["seconds"]
+            ratio = after / before if before > 0 else float("inf")
+            slower = ratio > 1 + threshold and after - before > MIN_REGRESSION_SECONDS
+            line = f"{scale:>10} edges {stage:<24} {before:9.3f}s -> {after:9.3f}s ({ratio:5.2f}x)"
+            lines.append(line + ("  REGRESSION" if slower else ""))
+            if slower:
+                regressions.append(line)
+        before = previous["query"]["requests_per_second"]
+        after = current["query"]["requests_per_second"]
+        slower = after < before * (1 - threshold)
+        line = f"{scale:>10} edges {'/query throughput':<24} {before:9.1f}/s -> {after:9.1f}/s ({after / before:5.2f}x)"
+        lines.append(line + ("  REGRESSION" if slower else ""))
+        if slower:
+            regressions.append(line)
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", type=float, default=[1e4, 1e5, 1e6],
+                        help="numbers of edges to generate (1e4 to 1e7)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "supply-chain-benchmark"),
+                        help="where generated datasets are kept between runs")
+    parser.add_argument("--requests", type=int, default=2000, help="/query requests per scale")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent /query clients")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="write results to this file as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default 0.25)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "note": f"recorded on a machine with {os.cpu_count()} CPU(s); timings only compare on the same hardware",
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        num_edges = int(scale)
+        print(f"Benchmarking {num_edges} edges...")
+        results["scales"][str(num_edges)] = run_scale(
+            num_edges, args.work_dir, args.seed, args.requests, args.concurrency
+        )
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.threshold)
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+    else:
+        print(json.dumps(results["scales"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from csr_graph import CSRGraph
+
+PartitionSummary = namedtuple(
+    "PartitionSummary",
+    ["sizes", "internal_edges", "density", "member_offsets", "members"],
+)
+
+CommunityRun = namedtuple("CommunityRun", ["partition", "complete", "iterations", "seconds"])
+
+
+def relabel_by_size(labels):
+    """Renumber arbitrary labels to 0..k-1 by decreasing community size"""
+    _, labels = np.unique(labels, return_inverse=True)
+    labels = labels.ravel()
+    sizes = np.bincount(labels)
+    order = np.argsort(-sizes, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[labels].astype(np.int32)
+
+
+def summarize_partition(graph, labels, scores=None):
+    """
+    Per-community statistics for a partition, in one pass over the edges.
+
+    labels[i] is the community of node i (0..k-1). Returns sizes, internal
+    edge counts and densities per community, plus the members of every
+    community grouped CSR-style (members[member_offsets[c]:member_offsets[c + 1]])
+    and ordered by decreasing score (degree by default), so the first
+    entries of each group are its top members.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    num = int(labels.max()) + 1 if len(labels) else 0
+    sizes = np.bincount(labels, minlength=num)
+
+    src, dst = graph.edge_arrays()
+    inside = labels[src] == labels[dst]
+    entries = np.bincount(labels[src[inside]], minlength=num)
+    if graph.directed:
+        internal = entries
+        pairs = sizes * (sizes - 1.0)
+    else:
+        # Undirected edges are stored in both rows, self-loops once
+        loops = np.bincount(labels[src[inside & (src == dst)]], minlength=num)
+        internal = (entries + loops) // 2
+        pairs = sizes * (sizes - 1.0) / 2
+    density = np.divide(internal, pairs, out=np.zeros(num), where=pairs > 0)
+
+    if scores is None:
+        scores = graph.degree()
+    members = np.lexsort((-np.asarray(scores, dtype=float), labels))
+    member_offsets = np.zeros(num + 1, dtype=np.int64)
+    np.cumsum(sizes, out=member_offsets[1:])
+    return PartitionSummary(sizes, internal, density, member_offsets, members)
+
+
+def label_propagation(graph, seed=None, max_iter=100, time_budget=None):
+    """
+    Bounded label propagation on an undirected CSRGraph.
+
+    Every node adopts the most frequent label among its neighbours (ties
+    broken at random, but reproducibly for a given seed). Updates are applied
+    to one random half of the nodes per round to avoid oscillation. Stops
+    once every node holds a majority label, after max_iter rounds or when time_budget
+    seconds have passed; in the latter two cases the partition found so far is
+    returned with complete=False.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n = graph.number_of_nodes()
+    labels = np.arange(n)
+    src, dst = graph.edge_arrays()
+    keep = src != dst
+    src = src[keep].astype(np.int64)
+    dst = dst[keep].astype(np.int64)
+
+    complete = False
+    iterations = 0
+    while iterations < max_iter:
+        if time_budget is not None and time.perf_counter() - start > time_budget:
+            break
+        iterations += 1
+
+        # Count neighbour labels per node; keys come back sorted by node
+        keys, counts = np.unique(src * n + labels[dst], return_counts=True)
+        nodes = keys // n
+        candidates = keys % n
+        run_start = np.r_[True, nodes[1:] != nodes[:-1]]
+        run = np.cumsum(run_start) - 1
+        first = np.flatnonzero(run_start)
+
+        # Converged once every node already holds one of its majority labels
+        own = candidates == labels[nodes]
+        best_count = np.maximum.reduceat(counts, first)
+        own_count = np.bincount(run, weights=np.where(own, counts, 0))
+        if np.all(own_count == best_count):
+            complete = True
+            break
+
+        # Keep the current label on ties, otherwise break ties at random;
+        # the bonuses stay below 1 so they never outweigh a real vote
+        votes = counts + 0.5 * own + 0.2 * rng.random(len(counts))
+        best_vote = np.maximum.reduceat(votes, first)
+        winners = np.flatnonzero(votes == best_vote[run])
+        update = rng.random(len(winners)) < 0.5
+        labels[nodes[winners[update]]] = candidates[winners[update]]
+
+    return CommunityRun(relabel_by_size(labels), complete, iterations, time.perf_counter() - start)
+
+
+def _sampled_edge_betweenness(src, dst, num_nodes, sources):
+    """
+    Edge betweenness estimated from BFS trees of the sampled sources
+    (Brandes' algorithm, vectorized level by level over the edge arrays).
+    Returns one score per entry of the symmetric (src, dst) arrays.
+    """
+    order = np.argsort(src, kind="stable")
+    src, dst = src[order], dst[order]
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=offsets[1:])
+
+    scores = np.zeros(len(src))
+    for source in sources:
+        dist = np.full(num_nodes, -1, dtype=np.int64)
+        sigma = np.zeros(num_nodes)
+        dist[source] = 0
+        sigma[source] = 1.0
+        frontier = np.array([source])
+        levels = []
+        while len(frontier):
+            # All edge entries leaving the frontier
+            counts = offsets[frontier + 1] - offsets[frontier]
+            starts = np.repeat(offsets[frontier] - np.cumsum(np.r_[0, counts[:-1]]), counts)
+            entries = starts + np.arange(counts.sum())
+            targets = dst[entries]
+            fresh = dist[targets] == -1
+            dist[targets[fresh]] = dist[frontier[0]] + 1
+            forward = dist[targets] == dist[frontier[0]] + 1
+            entries = entries[forward]
+            np.add.at(sigma, dst[entries], sigma[src[entries]])
+            levels.append(entries)
+            frontier = np.unique(dst[entries])
+
+        delta = np.zeros(num_nodes)
+        for entries in reversed(levels):
+            u, v = src[entries], dst[entries]
+            contribution = sigma[u] / sigma[v] * (1.0 + delta[v])
+            scores[entries] += contribution
+            np.add.at(delta, u, contribution)
+
+    result = np.empty_like(scores)
+    result[order] = scores
+    return result
+
+
+def girvan_newman(graph, target_communities=2, sample_sources=16, removal_fraction=0.01,
+                  max_rounds=20, time_budget=None, seed=None):
+    """
+    Bounded Girvan-Newman on an undirected CSRGraph.
+
+    Instead of recomputing exact betweenness after every single removal,
+    each round estimates edge betweenness from `sample_sources` BFS trees and
+    removes the top `removal_fraction` of edges, until the graph falls apart
+    into `target_communities` components. The round limit and time budget
+    cap the work; when either is hit the current components are returned
+    with complete=False.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n = graph.number_of_nodes()
+    src, dst = graph.edge_arrays()
+    keep = src < dst
+    src = src[keep].astype(np.int64)
+    dst = dst[keep].astype(np.int64)
+
+    labels, sizes = CSRGraph.from_indices(graph.node_ids, src, dst, directed=False).weakly_connected_components()
+    complete = len(sizes) >= target_communities
+    rounds = 0
+    while not complete and rounds < max_rounds and len(src):
+        if time_budget is not None and time.perf_counter() - start > time_budget:
+            break
+        rounds += 1
+
+        both_src = np.concatenate([src, dst])
+        both_dst = np.concatenate([dst, src])
+        sources = rng.choice(n, size=min(sample_sources, n), replace=False)
+        scores = _sampled_edge_betweenness(both_src, both_dst, n, sources)
+        # An undirected edge scores the sum of its two directions
+        scores = scores[:len(src)] + scores[len(src):]
+
+        remove = max(1, int(len(src) * removal_fraction))
+        cut = np.argsort(-scores, kind="stable")[:remove]
+        keep = np.ones(len(src), dtype=bool)
+        keep[cut] = False
+        src, dst = src[keep], dst[keep]
+
+        remaining = CSRGraph.from_indices(graph.node_ids, src, dst, directed=False)
+        labels, sizes = remaining.weakly_connected_components()
+        complete = len(sizes) >= target_communities
+
+    return CommunityRun(labels, complete, rounds, time.perf_counter() - start)
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Marks "use the pool's default timeout", since None means wait forever
+_DEFAULT_TIMEOUT = object()
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the compute pool already has max_queue calls pending"""
+
+
+class ComputePool:
+    """
+    Runs blocking analyzer calls on a thread pool so the event loop stays
+    responsive.
+
+    Calls submitted with the same key while one is still in flight share its
+    result instead of running again (single-flight). The number of pending
+    calls is bounded; once max_queue is reached new work is rejected with
+    PoolSaturatedError. Each caller waits at most `timeout` seconds; a
+    timed-out computation keeps running in the background so that its result
+    still lands in the analytics cache and coalesced callers still get it.
+
+    Only use from the event loop thread.
+    """
+
+    def __init__(self, max_workers=4, max_queue=32, timeout=60.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analytics")
+        self._inflight = {}
+        self.pending = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def run(self, key, fn, *args, timeout=_DEFAULT_TIMEOUT, **kwargs):
+        """Run fn(*args, **kwargs) on the pool, sharing in-flight calls with the same key"""
+        if timeout is _DEFAULT_TIMEOUT:
+            timeout = self.timeout
+
+        future = self._inflight.get(key) if key is not None else None
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise PoolSaturatedError(f"{self.pending} analytics calls already pending")
+            loop = asyncio.get_running_loop()
+            # Run in a copy of the caller's context so that context variables
+            # (such as the request's stage profile) carry over to the worker
+            context = contextvars.copy_context()
+            future = loop.run_in_executor(self._executor, functools.partial(context.run, fn, *args, **kwargs))
+            self.pending += 1
+            self.submitted += 1
+            if key is not None:
+                self._inflight[key] = future
+            future.add_done_callback(functools.partial(self._finished, key))
+
+        try:
+            # Shield so that a caller timing out or disconnecting does not
+            # cancel the computation other callers are waiting on
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _finished(self, key, future):
+        self.pending -= 1
+        if key is not None and self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "inflight_keys": len(self._inflight),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
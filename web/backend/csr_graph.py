@@ -0,0 +1,305 @@
+import networkx as nx
+import numpy as np
+
+# Codes used in the node_types and edge_types arrays; untyped graphs are
+# all products joined by co-purchase edges
+NODE_TYPES = ["product", "supplier", "event"]
+EDGE_RELATIONS = ["co_purchased", "supplies", "impacts"]
+
+
+def _build_offsets(rows, num_nodes):
+    """CSR offsets for row indices that are already sorted"""
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=offsets[1:])
+    return offsets
+
+
+class CSRGraph:
+    """
+    Compact graph backed by NumPy arrays.
+
+    Nodes are addressed by a dense index 0..n-1; node_ids maps each index
+    back to the original (SNAP) node id. Adjacency is stored as CSR with
+    int64 offsets and int32 indices, once for out-edges and once for
+    in-edges. For undirected graphs the adjacency is symmetric and the in-
+    arrays alias the out-arrays.
+
+    Optionally every node carries a type code (NODE_TYPES) and every out-
+    edge a relation code (EDGE_RELATIONS), aligned with out_indices.
+    """
+
+    def __init__(self, node_ids, out_offsets, out_indices, in_offsets, in_indices, directed=True,
+                 out_degree=None, in_degree=None, node_types=None, edge_types=None):
+        self.node_ids = node_ids
+        self.out_offsets = out_offsets
+        self.out_indices = out_indices
+        self.in_offsets = in_offsets
+        self.in_indices = in_indices
+        self.directed = directed
+        # Degree arrays are derived from the offsets on first use unless
+        # they are handed in precomputed (e.g. from a snapshot)
+        self._out_degree = out_degree
+        self._in_degree = in_degree
+        self._node_types = node_types
+        self._edge_types = edge_types
+        self._sorted_ids = None
+
+    @classmethod
+    def from_edges(cls, sources, targets, node_ids=None, directed=True):
+        """Build a graph from arrays of original node ids, dropping duplicate edges"""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if node_ids is None:
+            node_ids, inverse = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+            src = inverse[:len(sources)]
+            dst = inverse[len(sources):]
+        else:
+            node_ids = np.asarray(node_ids, dtype=np.int64)
+            graph = cls(node_ids, None, None, None, None, directed)
+            src = graph.index_of(sources)
+            dst = graph.index_of(targets)
+        return cls.from_indices(node_ids, src, dst, directed=directed)
+
+    @classmethod
+    def from_indices(cls, node_ids, src, dst, directed=True, node_types=None, edge_types=None):
+        """Build a graph from edge arrays that already use dense node indices"""
+        n = len(node_ids)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if not directed:
+            # Store every undirected edge in both rows, self-loops once
+            loops = src == dst
+            src, dst = (
+                np.concatenate([src, dst[~loops]]),
+                np.concatenate([dst, src[~loops]]),
+            )
+            if edge_types is not None:
+                edge_types = np.concatenate([edge_types, edge_types[~loops]])
+
+        # Sorting the packed (source, target) key orders the edges by source
+        # and removes duplicates in one go
+        if edge_types is None:
+            keys = np.unique(src * n + dst)
+        else:
+            keys, first = np.unique(src * n + dst, return_index=True)
+            edge_types = np.asarray(edge_types, dtype=np.int8)[first]
+        src = keys // n
+        dst = keys % n
+        out_offsets = _build_offsets(src, n)
+        out_indices = dst.astype(np.int32)
+
+        if not directed:
+            return cls(node_ids, out_offsets, out_indices, out_offsets, out_indices, directed=False,
+                       node_types=node_types, edge_types=edge_types)
+
+        order = np.argsort(dst, kind="stable")
+        in_offsets = _build_offsets(dst[order], n)
+        in_indices = src[order].astype(np.int32)
+        return cls(node_ids, out_offsets, out_indices, in_offsets, in_indices, directed=True,
+                   node_types=node_types, edge_types=edge_types)
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        if self.directed:
+            return len(self.out_indices)
+        # Each undirected edge is stored twice except self-loops
+        loops = int(np.count_nonzero(self.edge_arrays()[0] == self.out_indices))
+        return (len(self.out_indices) + loops) // 2
+
+    def __len__(self):
+        return self.number_of_nodes()
+
+    def out_degree(self):
+        if self._out_degree is None:
+            self._out_degree = np.diff(self.out_offsets)
+        return self._out_degree
+
+    def in_degree(self):
+        if self._in_degree is None:
+            self._in_degree = np.diff(self.in_offsets)
+        return self._in_degree
+
+    def degree(self):
+        """Total degree per node (in + out for directed graphs)"""
+        if self.directed:
+            return self.out_degree() + self.in_degree()
+        degrees = self.out_degree()
+        # Self-loops count twice towards the degree of an undirected node
+        src, dst = self.edge_arrays()
+        return degrees + np.bincount(src[src == dst], minlength=len(degrees))
+
+    def node_types(self):
+        """Type code of every node (all products for untyped graphs)"""
+        if self._node_types is None:
+            return np.zeros(self.number_of_nodes(), dtype=np.int8)
+        return self._node_types
+
+    def edge_types(self):
+        """Relation code of every out-edge, aligned with out_indices"""
+        if self._edge_types is None:
+            return np.zeros(len(self.out_indices), dtype=np.int8)
+        return self._edge_types
+
+    def is_typed(self):
+        return self._node_types is not None or self._edge_types is not None
+
+    def successors(self, index):
+        return self.out_indices[self.out_offsets[index]:self.out_offsets[index + 1]]
+
+    def predecessors(self, index):
+        return self.in_indices[self.in_offsets[index]:self.in_offsets[index + 1]]
+
+    def out_edges(self, nodes):
+        """(sources, targets) of all out-edges of an array of node indices"""
+        return self._gather(self.out_offsets, self.out_indices, nodes)
+
+    def in_edges(self, nodes):
+        """(targets, sources) of all in-edges of an array of node indices"""
+        return self._gather(self.in_offsets, self.in_indices, nodes)
+
+    @staticmethod
+    def _gather(offsets, indices, nodes):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts = offsets[nodes]
+        counts = offsets[nodes + 1] - starts
+        # Position of every entry inside its row, laid out row after row
+        entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.repeat(nodes, counts), indices[entries]
+
+    def neighbors(self, index):
+        """Successors for directed graphs, adjacent nodes for undirected ones"""
+        return self.successors(index)
+
+    def edge_arrays(self):
+        """Return (sources, targets) index arrays of the stored adjacency"""
+        sources = np.repeat(np.arange(self.number_of_nodes(), dtype=np.int32), self.out_degree())
+        return sources, self.out_indices
+
+    def find(self, ids):
+        """Map original node ids to dense indices, with -1 for ids not in the graph"""
+        if self._sorted_ids is None:
+            order = np.argsort(self.node_ids, kind="stable")
+            self._sorted_ids = (self.node_ids[order], order)
+        sorted_ids, order = self._sorted_ids
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        # [()] turns the result for a scalar id back into a scalar
+        return np.where(sorted_ids[pos] == ids, order[pos], -1)[()]
+
+    def index_of(self, ids):
+        """Map original node ids to dense indices, raising KeyError for unknown ids"""
+        ids = np.asarray(ids, dtype=np.int64)
+        indices = self.find(ids)
+        missing = indices < 0
+        if np.any(missing):
+            raise KeyError(f"Unknown node id(s): {ids[missing].ravel()[:10].tolist()}")
+        return indices
+
+    def has_node(self, node_id):
+        try:
+            self.index_of(node_id)
+        except KeyError:
+            return False
+        return True
+
+    def subgraph(self, mask):
+        """Induced subgraph on the nodes selected by a boolean mask"""
+        mask = np.asarray(mask, dtype=bool)
+        new_index = np.full(self.number_of_nodes(), -1, dtype=np.int64)
+        new_index[mask] = np.arange(np.count_nonzero(mask))
+        src, dst = self.edge_arrays()
+        keep = mask[src] & mask[dst]
+        src = new_index[src[keep]]
+        dst = new_index[dst[keep]]
+        node_types = self._node_types[mask] if self._node_types is not None else None
+        edge_types = self._edge_types[keep] if self._edge_types is not None else None
+        if self.directed:
+            return CSRGraph.from_indices(self.node_ids[mask], src, dst, directed=True,
+                                         node_types=node_types, edge_types=edge_types)
+        # The adjacency is already symmetric, keep one direction per edge
+        half = src <= dst
+        if edge_types is not None:
+            edge_types = edge_types[half]
+        return CSRGraph.from_indices(self.node_ids[mask], src[half], dst[half], directed=False,
+                                     node_types=node_types, edge_types=edge_types)
+
+    def to_undirected(self):
+        if not self.directed:
+            return self
+        src, dst = self.edge_arrays()
+        return CSRGraph.from_indices(self.node_ids, src, dst, directed=False,
+                                     node_types=self._node_types, edge_types=self._edge_types)
+
+    def density(self):
+        n = self.number_of_nodes()
+        if n <= 1:
+            return 0.0
+        m = self.number_of_edges()
+        if self.directed:
+            return m / (n * (n - 1))
+        return 2 * m / (n * (n - 1))
+
+    def weakly_connected_components(self):
+        """
+        Label every node with its weakly connected component.
+
+        Uses vectorized hooking and pointer jumping over the edge arrays.
+        Returns (labels, sizes) where labels[i] is the component of node i,
+        numbered by decreasing size.
+        """
+        n = self.number_of_nodes()
+        src, dst = self.edge_arrays()
+        parent = np.arange(n, dtype=np.int64)
+        while True:
+            ps = parent[src]
+            pd_ = parent[dst]
+            cross = ps != pd_
+            if not cross.any():
+                break
+            # Hook the larger root under the smaller one
+            low = np.minimum(ps[cross], pd_[cross])
+            high = np.maximum(ps[cross], pd_[cross])
+            np.minimum.at(parent, high, low)
+            # Pointer jumping until every node points at its root
+            while True:
+                grand = parent[parent]
+                if np.array_equal(grand, parent):
+                    break
+                parent = grand
+            src, dst = src[cross], dst[cross]
+
+        roots, labels, sizes = np.unique(parent, return_inverse=True, return_counts=True)
+        # Renumber so that component 0 is the largest
+        order = np.argsort(-sizes, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return rank[labels].astype(np.int32), sizes[order]
+
+    def to_networkx(self):
+        """Materialize the graph as a NetworkX (Di)Graph keyed by original node ids"""
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        ids = self.node_ids.tolist()
+        src, dst = self.edge_arrays()
+        edges = zip(self.node_ids[src].tolist(), self.node_ids[dst].tolist())
+        if not self.is_typed():
+            G.add_nodes_from(ids)
+            G.add_edges_from(edges)
+            return G
+        # Typed graphs carry the attributes used by the supply-chain notebook
+        G.add_nodes_from((node, {"type": NODE_TYPES[code]}) for node, code in zip(ids, self.node_types().tolist()))
+        G.add_edges_from(
+            (u, v, {"relation": EDGE_RELATIONS[code]}) for (u, v), code in zip(edges, self.edge_types().tolist())
+        )
+        return G
+
+    def nbytes(self):
+        """Memory held by the graph arrays"""
+        arrays = [self.node_ids, self.out_offsets, self.out_indices]
+        if self.directed:
+            arrays += [self.in_offsets, self.in_indices]
+        arrays += [a for a in (self._node_types, self._edge_types) if a is not None]
+        return sum(a.nbytes for a in arrays)
@@ -0,0 +1,137 @@
+import base64
+import io
+import json
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+EXPORT_DATASETS = ["community-assignments", "community-members", "degree-histogram"]
+EXPORT_FORMATS = ["ndjson", "arrow"]
+
+# Rows serialized per streamed chunk
+EXPORT_CHUNK_ROWS = 10000
+
+
+class StaleCursorError(Exception):
+    """Raised when a cursor was issued for a graph version that has since been replaced"""
+
+
+class ExportTable:
+    """
+    Rows to export, stored as columns: equal-length integer arrays plus optionally
+    one list column kept CSR-style (row i holds values[offsets[i]:offsets[i + 1]]).
+    Rows are serialized straight from the arrays, chunk by chunk.
+    """
+
+    def __init__(self, columns, list_column=None):
+        self.columns = columns
+        self.list_column = list_column
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def ndjson(self, start, stop):
+        """Rows start..stop-1 as newline-delimited JSON"""
+        names = list(self.columns)
+        values = [self.columns[name][start:stop].tolist() for name in names]
+        if self.list_column is not None:
+            name, items, offsets = self.list_column
+            names.append(name)
+            bounds = offsets[start:stop + 1]
+            chunk = items[bounds[0]:bounds[-1]].tolist()
+            bounds = (bounds - bounds[0]).tolist()
+            values.append(json.dumps(chunk[bounds[i]:bounds[i + 1]]) for i in range(stop - start))
+        template = "{" + ", ".join(f"{json.dumps(name)}: %s" for name in names) + "}\n"
+        return "".join(template % row for row in zip(*values))
+
+    def record_batch(self, start, stop):
+        """Rows start..stop-1 as an Arrow record batch"""
+        arrays = {name: pa.array(column[start:stop]) for name, column in self.columns.items()}
+        if self.list_column is not None:
+            name, items, offsets = self.list_column
+            bounds = offsets[start:stop + 1]
+            arrays[name] = pa.ListArray.from_arrays(
+                pa.array((bounds - bounds[0]).astype(np.int32)), pa.array(items[bounds[0]:bounds[-1]])
+            )
+        return pa.RecordBatch.from_pydict(arrays)
+
+
+def assignment_table(node_ids, partition):
+    """Community (1-based, as in /communities) of every node of the partitioned component"""
+    return ExportTable({"node": np.asarray(node_ids), "community": np.asarray(partition) + 1})
+
+
+def member_table(node_ids, summary):
+    """Members of every community, ordered by decreasing degree, from a partition summary"""
+    num = len(summary.sizes)
+    return ExportTable(
+        {"community": np.arange(1, num + 1), "size": np.asarray(summary.sizes)},
+        ("members", np.asarray(node_ids)[summary.members], np.asarray(summary.member_offsets)),
+    )
+
+
+def degree_table(in_degrees, out_degrees):
+    """Number of nodes with each in- and out-degree, for every degree that occurs"""
+    size = int(max(in_degrees.max(initial=0), out_degrees.max(initial=0))) + 1
+    in_counts = np.bincount(in_degrees, minlength=size)
+    out_counts = np.bincount(out_degrees, minlength=size)
+    degrees = np.flatnonzero((in_counts > 0) | (out_counts > 0))
+    return ExportTable({"degree": degrees, "in_count": in_counts[degrees], "out_count": out_counts[degrees]})
+
+
+def encode_cursor(graph_version, offset):
+    return base64.urlsafe_b64encode(f"{graph_version}:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor, graph_version):
+    """Row offset a cursor points at; it must come from the current graph version"""
+    try:
+        version, offset = (int(part) for part in base64.urlsafe_b64decode(cursor.encode()).decode().split(":"))
+        if offset < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if version != graph_version:
+        raise StaleCursorError(
+            f"Cursor is for graph version {version}, the graph is now at version {graph_version}; "
+            f"restart the export without a cursor"
+        )
+    return offset
+
+
+def page_bounds(table, graph_version, cursor=None, limit=100000):
+    """(start, stop, next_cursor) of one page; next_cursor is None on the last page"""
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+    start = decode_cursor(cursor, graph_version) if cursor else 0
+    stop = min(start + limit, len(table))
+    next_cursor = encode_cursor(graph_version, stop) if stop < len(table) else None
+    return start, stop, next_cursor
+
+
+def iter_chunks(table, start, stop, export_format="ndjson", chunk_rows=EXPORT_CHUNK_ROWS):
+    """Serialized rows start..stop-1, chunk_rows at a time; Arrow as one IPC stream"""
+    if export_format == "ndjson":
+        for begin in range(start, stop, chunk_rows):
+            yield table.ndjson(begin, min(begin + chunk_rows, stop)).encode()
+        return
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.record_batch(start, start).schema) as writer:
+        for begin in range(start, stop, chunk_rows):
+            writer.write_batch(table.record_batch(begin, min(begin + chunk_rows, stop)))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def check_format(export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}, expected one of {EXPORT_FORMATS}")
+    if export_format == "arrow" and pa is None:
+        raise ValueError("Arrow export requires pyarrow, which is not installed")
@@ -1,19 +1,73 @@
 
+import functools
 import os
+import threading
+import time
 import wget
-import gzip
-import networkx as nx
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from collections import Counter
+from collections import namedtuple
+from contextlib import contextmanager
+from analytics_cache import AnalyticsCache
+from approximate import (APPROXIMATE_METRICS, BetweennessEstimator, ClusteringEstimator, DiameterEstimator,
+                         ReachabilityEstimator)
+from communities import girvan_newman, label_propagation, summarize_partition
+from csr_graph import EDGE_RELATIONS, NODE_TYPES, CSRGraph
+from edge_loader import load_edge_arrays
+from export import EXPORT_DATASETS, assignment_table, degree_table, member_table
+from graph_snapshot import (SNAPSHOT_VERSION, load_snapshot, read_manifest, source_checksum, undirected_graph_arrays,
+                            undirected_graph_from_arrays, write_snapshot)
+from graph_store import BulkLoader
+from graph_updates import apply_batch, carry_over, type_codes, update_components, update_degrees
+from impact import impact_layers, simulate_impact
+from louvain import LouvainResult, louvain, modularity
+from metrics import stage, timed
+from pagerank import TransitionMatrix, pagerank, pagerank_push
+from risk import RiskIndex, build_risk_index, reason_labels, select_risks
+from shared_graph import ReadOnlyGraphError, SharedGraphStore
+from visualization import (MAX_EGO_NODES, MAX_LAYOUT_COMMUNITIES, community_graph, ego_nodes, force_layout,
+                           induced_edges)
+
+# The graph together with everything stored for it, swapped as a whole by a
+# single assignment. precomputed only ever gains arrays derived from graph.
+GraphState = namedtuple("GraphState", ["graph", "version", "precomputed"])
+
+def reads_graph(method):
+    """Run an analyzer method against one pinned GraphState, loading the graph first if needed"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.ensure_graph()
+        with self.pinned():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class AmazonGraphAnalyzer:
-    def __init__(self, data_dir="./data"):
+    def __init__(self, data_dir="./data", loader_workers=None, use_snapshot=True, community_workers=1,
+                 community_time_budget=10.0, shared_dir=None, store=None):
         self.data_dir = data_dir
+        self.loader_workers = loader_workers
+        self.community_workers = community_workers
+        # Seconds the bounded fallback algorithms may spend before returning partial results
+        self.community_time_budget = community_time_budget
+        self.use_snapshot = use_snapshot
         self.dataset_url = "https://snap.stanford.edu/data/amazon0302.txt.gz"
         self.dataset_path = os.path.join(data_dir, "amazon0302.txt.gz")
-        self.graph = None
+        self.snapshot_path = os.path.join(data_dir, "amazon0302.snapshot")
+        # Serializes loading and updates; readers never take it, they pin
+        # the current GraphState instead (see pinned())
+        self._graph_lock = threading.Lock()
+        self._state = GraphState(None, 0, {})
+        self._pins = threading.local()
+        self.load_report = None
+        self.source_checksum = None
+        # Version of the graph as read from the dataset (or its snapshot), before any updates
+        self._dataset_version = None
+        self.analytics = AnalyticsCache()
+        # With a shared directory the graph is attached read-only from the
+        # newest generation published there (see shared_graph.py)
+        self.shared = SharedGraphStore(shared_dir) if shared_dir else None
+        self.shared_generation = 0
+        # A GraphStore (see graph_store.py) to load the graph from instead of the edge list
+        self.store = store
         
         # Create data directory if it doesn't exist
         if not os.path.exists(data_dir):
@@ -28,77 +82,624 @@ class AmazonGraphAnalyzer:
         else:
             print("Dataset already downloaded.")
     
+    @property
+    def state(self):
+        """The GraphState pinned by this thread, else the current one"""
+        return getattr(self._pins, "state", None) or self._state
+    
+    @property
+    def graph(self):
+        return self.state.graph
+    
+    @property
+    def graph_version(self):
+        """Bumped whenever the graph changes; analytics results are cached per version"""
+        return self.state.version
+    
+    @property
+    def precomputed(self):
+        """Analytics arrays stored alongside the graph in the snapshot"""
+        return self.state.precomputed
+    
+    @contextmanager
+    def pinned(self):
+        """
+        Pin the current GraphState for this thread: graph, graph_version and
+        precomputed keep referring to it inside the block, whatever updates
+        are applied meanwhile. Nested blocks keep the outer pin.
+        """
+        if getattr(self._pins, "state", None) is not None:
+            yield self._pins.state
+            return
+        self._pins.state = self._state
+        try:
+            yield self._pins.state
+        finally:
+            self._pins.state = None
+    
+    def ensure_graph(self):
+        """
+        Load the graph unless it is loaded already; safe to call from several
+        threads. A shared graph is swapped for a newer generation when one
+        has been published.
+        """
+        if self.shared is not None and self._state.graph is not None and self.shared.generation() != self.shared_generation:
+            self._follow_shared()
+        if self._state.graph is None:
+            with self._graph_lock:
+                if self._state.graph is None:
+                    if self.shared is not None:
+                        self._load_shared()
+                    else:
+                        self.load_graph()
+        return self._state.graph
+    
+    @timed("load_graph")
     def load_graph(self):
-        """Load the dataset into a NetworkX graph"""
+        """Load the dataset, memory-mapping the binary snapshot when it is up to date"""
+        if self.store is not None:
+            return self._load_from_store()
+        
         if not os.path.exists(self.dataset_path):
             self.download_dataset()
         
+        self.source_checksum = source_checksum(self.dataset_path)
+        if self.use_snapshot and self._load_snapshot():
+            return self.graph
+        
         print("Loading graph from dataset...")
-        # Create a directed graph
-        G = nx.DiGraph()
-        
-        # Read the gzipped file and parse edges
-        with gzip.open(self.dataset_path, 'rt') as f:
-            for line in f:
-                # Skip comment lines
-                if line.startswith('#'):
-                    continue
-                # Parse edge data (source node -> target node)
-                source, target = map(int, line.strip().split())
-                G.add_edge(source, target)
-        
-        self.graph = G
-        print(f"Graph loaded: {len(G.nodes())} nodes, {len(G.edges())} edges")
+        start = time.perf_counter()
+        
+        # Decompress and parse the edge list in bulk into NumPy arrays
+        sources, targets, report = load_edge_arrays(
+            [self.dataset_path], workers=self.loader_workers
+        )
+        
+        # Build the compact directed graph from the arrays in a single pass
+        G = CSRGraph.from_edges(sources, targets)
+        
+        report["build_seconds"] = time.perf_counter() - start - report["seconds"]
+        report["total_seconds"] = time.perf_counter() - start
+        self.load_report = report
+        
+        self._dataset_version = self._set_graph(G).version
+        print(f"Graph loaded: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges "
+              f"({G.nbytes() / 2**20:.1f} MiB)")
+        print(
+            f"Parsed {report['rows']} rows in {report['seconds']:.2f}s "
+            f"({report['rows_per_second']:,.0f} rows/s), "
+            f"graph built in {report['build_seconds']:.2f}s"
+        )
+        
+        # Precompute the component labelling so warm starts get it for free;
+        # persist_analytics() adds the slower analytics once they are computed
+        self._weakly_connected_components()
+        if self.use_snapshot:
+            self.save_snapshot()
         return self.graph
     
+    def _load_from_store(self):
+        """Build the graph from the edges of the configured store"""
+        start = time.perf_counter()
+        sources, targets = self.store.read_edges()
+        G = CSRGraph.from_edges(sources, targets)
+        self.load_report = {
+            "store": self.store.describe(),
+            "rows": len(sources),
+            "total_seconds": time.perf_counter() - start,
+        }
+        self._set_graph(G)
+        print(f"Graph loaded from {self.load_report['store']} in {self.load_report['total_seconds']:.2f}s: "
+              f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+        self._weakly_connected_components()
+        return self.graph
+    
+    def export_to_store(self, store=None, **options):
+        """Bulk-load the dataset's edge list into a store (by default the configured one); see BulkLoader"""
+        if not os.path.exists(self.dataset_path):
+            self.download_dataset()
+        return BulkLoader(store or self.store, **options).load(self.dataset_path)
+    
+    def _load_snapshot(self):
+        """Attach to the snapshot in data_dir if it matches the current dataset"""
+        start = time.perf_counter()
+        snapshot = load_snapshot(self.snapshot_path, self.source_checksum)
+        if snapshot is None:
+            return False
+        
+        graph, precomputed, manifest = snapshot
+        self._dataset_version = self._set_graph(graph, precomputed).version
+        elapsed = time.perf_counter() - start
+        self.load_report = {"snapshot": self.snapshot_path, "total_seconds": elapsed}
+        print(f"Graph snapshot mapped in {elapsed:.3f}s: "
+              f"{manifest['num_nodes']} nodes, {manifest['num_edges']} edges")
+        return True
+    
+    def _load_shared(self):
+        """Attach to the shared graph; the first process to find none loads and publishes it"""
+        if self.shared.generation() == 0:
+            with self.shared.publishing():
+                if self.shared.generation() == 0:
+                    self.load_graph()
+                    self.publish_shared()
+        self._attach_shared()
+    
+    def _attach_shared(self):
+        start = time.perf_counter()
+        generation, graph, precomputed, manifest = self.shared.attach()
+        self._set_graph(graph, precomputed)
+        self.shared_generation = generation
+        self.source_checksum = manifest["source_sha256"]
+        self.load_report = {"shared_generation": generation, "total_seconds": time.perf_counter() - start}
+        print(f"Attached to shared graph generation {generation}: "
+              f"{manifest['num_nodes']} nodes, {manifest['num_edges']} edges")
+    
+    def _follow_shared(self):
+        """Swap to the newest shared generation, unless an update or batch holds the graph"""
+        if not self._graph_lock.acquire(blocking=False):
+            return
+        try:
+            if self.shared.generation() != self.shared_generation:
+                self._attach_shared()
+        finally:
+            self._graph_lock.release()
+    
+    def _stored_analytics(self):
+        """
+        The analytics kept with the graph on disk, computing any missing:
+        components, PageRank, the default Louvain partition, the risk index,
+        the undirected largest component and the community of every node.
+        Processes mapping them (shared workers, warm starts) derive nothing
+        large themselves.
+        """
+        self._weakly_connected_components()
+        self._pagerank()
+        self.get_louvain_partition()
+        analytics = dict(self.precomputed)
+        for field, values in zip(RiskIndex._fields, self._risk_index()):
+            analytics[f"risk_{field}"] = values
+        analytics.update(undirected_graph_arrays("lcc_undirected", self._largest_component_undirected()))
+        analytics["node_communities"] = self._node_communities()
+        return analytics
+    
+    @reads_graph
+    def publish_shared(self, store=None):
+        """
+        Compute the analytics every worker needs and publish them with the
+        graph as the next generation of the shared store.
+        """
+        store = store or self.shared
+        generation = store.publish(self.graph, self._stored_analytics(), self.source_checksum)
+        print(f"Published shared graph generation {generation} to {store.directory}")
+        return generation
+    
+    @contextmanager
+    def snapshot(self):
+        """
+        Pin the current graph for a group of analytics calls made by this
+        thread: every call inside sees the same graph version (which the
+        block receives). Neither updates nor other readers are blocked; an
+        update applied meanwhile takes effect for later calls.
+        """
+        self.ensure_graph()
+        with self.pinned() as state:
+            yield state.version
+    
+    def _set_graph(self, graph, precomputed=None):
+        """Swap in a new graph and drop analytics computed for the previous one; returns the new GraphState"""
+        state = GraphState(graph, self._state.version + 1, dict(precomputed or {}))
+        self._state = state
+        self.analytics.invalidate(keep_version=state.version)
+        return state
+    
+    @timed("apply_updates")
+    def apply_updates(self, add_nodes=(), remove_nodes=(), add_edges=None, remove_edges=None,
+                      add_node_types=None, add_edge_relations=None, pagerank_tol=1e-8):
+        """
+        Add or remove nodes and (source, target) edges in one batch.
+        add_node_types and add_edge_relations optionally name the type of
+        each added node (NODE_TYPES) and edge (EDGE_RELATIONS), e.g. to add
+        suppliers, disruption events and their `supplies`/`impacts` links.
+        
+        Instead of recomputing everything for the new graph, degrees and
+        connected components are updated from the changes and PageRank is
+        refreshed by local push from the previous scores (to pagerank_tol).
+        The graph version is bumped, so every other cached analytic is
+        recomputed on next use. Updates live in memory only; the snapshot
+        keeps mirroring the dataset file. A shared graph is read-only: it
+        changes only by publishing a new generation.
+        """
+        if self.shared is not None:
+            raise ReadOnlyGraphError("The graph is shared between workers and read-only; publish a new generation instead")
+        self.ensure_graph()
+        
+        with self._graph_lock, self.pinned():
+            start = time.perf_counter()
+            previous = self.graph
+            degrees = self._degrees()
+            labels, _ = self._weakly_connected_components()
+            scores = self.precomputed.get("pagerank")
+            
+            if add_node_types is not None:
+                add_node_types = type_codes(add_node_types, NODE_TYPES, len(add_nodes))
+            if add_edge_relations is not None:
+                add_edge_relations = type_codes(add_edge_relations, EDGE_RELATIONS, len(add_edges))
+            graph, changes = apply_batch(
+                previous, add_nodes, remove_nodes, add_edges, remove_edges, add_node_types, add_edge_relations
+            )
+            
+            precomputed = {}
+            precomputed["wcc_labels"], precomputed["wcc_sizes"] = update_components(graph, labels, changes)
+            transition = TransitionMatrix(graph)
+            refresh = None
+            if scores is not None and graph.number_of_nodes():
+                # New nodes start from the uniform share, as in a cold run
+                x0 = carry_over(scores, changes, fill=1.0 / graph.number_of_nodes())
+                refresh = pagerank_push(graph, x0, tol=pagerank_tol, transition=transition)
+                precomputed["pagerank"] = refresh.scores
+            
+            state = self._set_graph(graph, precomputed)
+            self.analytics.put(state.version, "degrees", update_degrees(*degrees, changes))
+            self.analytics.put(state.version, "transition_matrix", transition)
+            if refresh is not None:
+                self.analytics.put(state.version, "pagerank", refresh, alpha=0.85, seeds=None)
+            
+            num_previous = changes.num_previous
+            report = {
+                "graph_version": state.version,
+                "nodes_added": int(np.count_nonzero(changes.index_map[num_previous:] >= 0)),
+                "nodes_removed": int(np.count_nonzero(changes.index_map[:num_previous] < 0)),
+                "edges_added": len(changes.added_src),
+                "edges_removed": len(changes.removed_src),
+                "num_nodes": graph.number_of_nodes(),
+                "num_edges": graph.number_of_edges(),
+                "num_components": len(precomputed["wcc_sizes"]),
+                "pagerank": None if refresh is None else {
+                    "rounds": refresh.iterations,
+                    "residual": refresh.residual,
+                    "converged": refresh.converged,
+                },
+                "seconds": time.perf_counter() - start,
+            }
+        print(f"Applied graph update in {report['seconds']:.3f}s: +{report['edges_added']}/"
+              f"-{report['edges_removed']} edges, +{report['nodes_added']}/-{report['nodes_removed']} nodes")
+        return report
+    
+    @reads_graph
+    def nodes_of_type(self, node_type):
+        """Original ids of all nodes of one of NODE_TYPES"""
+        code = type_codes([node_type], NODE_TYPES, 1)[0]
+        return self.graph.node_ids[self.graph.node_types() == code].tolist()
+    
+    @timed("impact")
+    @reads_graph
+    def get_impact_analysis(self, scenarios, max_depth=4, spillover_hops=0, decay=0.5, top_communities=5,
+                            sample_products=10):
+        """
+        What-if analysis of disruptions. Each scenario is a list of seed node
+        ids (events or suppliers); the disruption spreads over `impacts` and
+        `supplies` edges to products and optionally spills over to products
+        co-purchased with them. All scenarios are evaluated in one batch.
+        """
+        if min(max_depth, spillover_hops, top_communities, sample_products) < 0:
+            raise ValueError("max_depth, spillover_hops, top_communities and sample_products must not be negative")
+        
+        start = time.perf_counter()
+        graph = self.graph
+        seeds = [np.atleast_1d(graph.index_of(list(scenario))) for scenario in scenarios]
+        supply, spill = self._cached("impact_layers", lambda: impact_layers(graph))
+        node_types = graph.node_types()
+        communities = self._node_communities() if top_communities > 0 else None
+        results = simulate_impact(
+            supply, spill, node_types, seeds,
+            max_depth=max_depth,
+            spillover_hops=spillover_hops,
+            decay=decay,
+            communities=communities,
+            top_communities=top_communities,
+            sample=sample_products,
+        )
+        
+        num_products = max(int(np.count_nonzero(node_types == NODE_TYPES.index("product"))), 1)
+        scenario_results = []
+        for scenario, result in zip(scenarios, results):
+            scenario_results.append({
+                "seeds": list(scenario),
+                "affected_suppliers": result["suppliers"],
+                "affected_products": result["products"],
+                "spillover_products": result["spillover"],
+                "inventory_percentage": result["products"] / num_products * 100,
+                "impact_percentage": result["weighted"] / num_products * 100,
+                "communities": [
+                    {"id": int(community), "products": count}
+                    for community, count in result.get("communities", [])
+                ],
+                "products": graph.node_ids[result["sample"]].tolist(),
+            })
+        seconds = time.perf_counter() - start
+        return {
+            "scenarios": scenario_results,
+            "seconds": seconds,
+            "scenarios_per_second": len(scenarios) / seconds if seconds > 0 else None,
+        }
+    
+    def export_table(self, dataset, algorithm="louvain"):
+        """
+        (graph_version, ExportTable) of a full dataset for /export: node
+        community assignments, community member lists or the degree
+        histogram. Built from the cached arrays of the current graph.
+        """
+        with self.snapshot() as graph_version:
+            if dataset == "community-assignments":
+                partition, _ = self._community_partition(algorithm)
+                table = assignment_table(self._largest_component_undirected().node_ids, partition)
+            elif dataset == "community-members":
+                table = member_table(self._largest_component_undirected().node_ids, self._partition_summary(algorithm))
+            elif dataset == "degree-histogram":
+                table = degree_table(*self._degrees())
+            else:
+                raise KeyError(f"Unknown export dataset: {dataset}, expected one of {EXPORT_DATASETS}")
+            return graph_version, table
+    
+    def _undirected(self):
+        """The whole graph as undirected"""
+        def compute():
+            _, sizes = self._weakly_connected_components()
+            if len(sizes) == 1:
+                # One component: the same graph as the (often stored) largest one
+                return self._largest_component_undirected()
+            return self.graph.to_undirected()
+        return self._cached("undirected", compute)
+    
+    def _estimator(self, metric):
+        """The sampling estimator of an approximate metric, kept (and refined) per graph version"""
+        def compute():
+            if metric == "clustering":
+                return ClusteringEstimator(self._undirected())
+            if metric == "betweenness":
+                return BetweennessEstimator(self.graph)
+            if metric == "diameter":
+                return DiameterEstimator(self._undirected())
+            return ReachabilityEstimator(self.graph)
+        if metric not in APPROXIMATE_METRICS:
+            raise ValueError(f"Unknown approximate metric: {metric}, expected one of {APPROXIMATE_METRICS}")
+        return self._cached("estimator", compute, metric=metric)
+    
+    @reads_graph
+    def get_approximate_stats(self, metrics=None, budget=0.1, precision=0.01, top_k=10):
+        """
+        Sampled estimates with 95% confidence intervals of metrics too slow to
+        compute exactly: average clustering, betweenness (top_k nodes),
+        effective diameter and reachability. Each metric gets an equal share
+        of `budget` seconds to refine its estimate (the first call always
+        takes one sampling step) unless its interval is already within `precision` (relative
+        half-width); estimates keep their samples, so they become more
+        accurate with every call and with refine_approximate().
+        """
+        metrics = list(metrics or APPROXIMATE_METRICS)
+        estimators = {metric: self._estimator(metric) for metric in metrics}
+        results = {}
+        for metric, estimator in estimators.items():
+            with stage(f"approximate_{metric}"):
+                estimator.refine(budget / len(metrics), precision)
+            results[metric] = estimator.estimate(top_k)
+        return {
+            "graph_version": self.graph_version,
+            "precision": precision,
+            "metrics": results,
+            "refining": [metric for metric, estimator in estimators.items() if not estimator.precise_enough(precision)],
+        }
+    
+    @reads_graph
+    def refine_approximate(self, metric, seconds, precision=0.01):
+        """
+        Refine one approximate metric for up to `seconds`, or one step when
+        steps take longer; returns whether it reached the precision.
+        """
+        estimator = self._estimator(metric)
+        with stage(f"approximate_{metric}"):
+            estimator.refine(max(seconds, 1.5 * estimator.step_seconds()), precision)
+        return estimator.precise_enough(precision)
+    
+    def _cached(self, name, compute, **params):
+        """Look up an analytic for the current graph version, computing it on a miss (timed as stage `name`)"""
+        def timed_compute():
+            with stage(name):
+                return compute()
+        return self.analytics.get_or_compute(self.graph_version, name, timed_compute, **params)
+    
+    def cache_stats(self):
+        """Hit/miss counters of the analytics cache"""
+        stats = self.analytics.stats()
+        stats["graph_version"] = self.graph_version
+        if self.shared is not None:
+            stats["shared_generation"] = self.shared_generation
+        return stats
+    
+    @reads_graph
+    def persist_analytics(self):
+        """
+        Rewrite the snapshot with PageRank, the default Louvain partition and
+        the risk index (computing any missing), so warm starts map them
+        instead of recomputing them. Returns whether it wrote anything: the
+        snapshot may hold them already, and graphs changed by updates or
+        not read from the dataset file are never written.
+        """
+        if not self.use_snapshot or self.store is not None or self.shared is not None:
+            return False
+        if self.graph_version != self._dataset_version:
+            return False
+        analytics = self._stored_analytics()
+        manifest = read_manifest(self.snapshot_path)
+        if (manifest is not None and manifest.get("version") == SNAPSHOT_VERSION
+                and manifest.get("source_sha256") == self.source_checksum
+                and set(analytics) <= set(manifest.get("analytics", []))):
+            return False
+        self.save_snapshot(analytics)
+        return True
+    
+    def save_snapshot(self, analytics=None):
+        """Persist the graph and its analytics (by default the precomputed ones) next to the dataset"""
+        state = self.state
+        if state.graph is None:
+            return
+        try:
+            write_snapshot(self.snapshot_path, state.graph, self.source_checksum,
+                           state.precomputed if analytics is None else analytics)
+            print(f"Graph snapshot written to {self.snapshot_path}")
+        except OSError as e:
+            print(f"Could not write graph snapshot: {e}")
+    
+    def _weakly_connected_components(self):
+        """Component labels and sizes, shared by every analytic"""
+        def compute():
+            if "wcc_labels" not in self.precomputed:
+                labels, sizes = self.graph.weakly_connected_components()
+                self.precomputed["wcc_labels"] = labels
+                self.precomputed["wcc_sizes"] = sizes
+            return self.precomputed["wcc_labels"], self.precomputed["wcc_sizes"]
+        return self._cached("wcc", compute)
+    
+    def _degrees(self):
+        """(in_degrees, out_degrees) arrays indexed like graph.node_ids"""
+        return self._cached("degrees", lambda: (self.graph.in_degree(), self.graph.out_degree()))
+    
+    def _transition_matrix(self):
+        """Sparse transition matrix shared by all PageRank runs on this graph"""
+        return self._cached("transition_matrix", lambda: TransitionMatrix(self.graph))
+    
+    def _pagerank_result(self, alpha=0.85, seeds=None):
+        """Run the PageRank engine, optionally personalized on a tuple of seed node ids"""
+        def compute():
+            personalization = dict.fromkeys(seeds, 1.0) if seeds else None
+            result = pagerank(
+                self.graph,
+                alpha=alpha,
+                personalization=personalization,
+                transition=self._transition_matrix(),
+            )
+            status = "converged" if result.converged else "did NOT converge"
+            print(f"PageRank {status} after {result.iterations} iterations "
+                  f"(residual {result.residual:.2e}, {result.seconds:.3f}s)")
+            return result
+        return self._cached("pagerank", compute, alpha=alpha, seeds=seeds)
+    
+    def _pagerank(self, alpha=0.85):
+        """Global PageRank scores indexed like graph.node_ids"""
+        if alpha == 0.85 and "pagerank" in self.precomputed:
+            return self.precomputed["pagerank"]
+        scores = self._pagerank_result(alpha).scores
+        if alpha == 0.85:
+            self.precomputed["pagerank"] = scores
+        return scores
+    
+    @reads_graph
+    def get_pagerank(self, seeds=None, alpha=0.85, top_k=10):
+        """
+        Top nodes by PageRank together with convergence details. With seeds
+        the random walk teleports only to those nodes, giving a PageRank
+        centred on e.g. event or supplier nodes.
+        """
+        seeds = tuple(sorted(set(seeds))) if seeds else None
+        result = self._pagerank_result(alpha, seeds)
+        return {
+            "top_nodes": self._top_nodes(result.scores, k=top_k),
+            "iterations": result.iterations,
+            "residual": result.residual,
+            "converged": result.converged,
+            "seconds": result.seconds,
+        }
+    
+    def _largest_component_undirected(self):
+        """Undirected view of the largest weakly connected component"""
+        def compute():
+            stored = undirected_graph_from_arrays("lcc_undirected", self.precomputed)
+            if stored is not None:
+                return stored
+            labels, _ = self._weakly_connected_components()
+            return self.graph.subgraph(labels == 0).to_undirected()
+        return self._cached("largest_cc_undirected", compute)
+    
+    @reads_graph
+    def to_networkx(self):
+        """Materialize the loaded graph as a NetworkX DiGraph (on demand, not cached)"""
+        return self.graph.to_networkx()
+    
+    @reads_graph
+    def graph_schema(self):
+        """Structure of the graph as described to generated NetworkX code; independent of its size"""
+        def compute():
+            schema = {"directed": self.graph.directed, "node_ids": "int (SNAP product id)"}
+            if self.graph.is_typed():
+                schema["node_attributes"] = {
+                    "type": [NODE_TYPES[code] for code in np.unique(self.graph.node_types()).tolist()]
+                }
+                schema["edge_attributes"] = {
+                    "relation": [EDGE_RELATIONS[code] for code in np.unique(self.graph.edge_types()).tolist()]
+                }
+            return schema
+        return self._cached("graph_schema", compute)
+    
+    @reads_graph
+    def write_graph_snapshot(self, directory):
+        """
+        Write the current graph as a snapshot for other processes, with the
+        Louvain community id (as in /communities, 0 outside the largest
+        component) of every node as analytic `communities`. Returns the
+        graph version written.
+        """
+        write_snapshot(directory, self.graph, self.source_checksum, {"communities": self._node_communities()})
+        return self.graph_version
+    
+    def _top_nodes(self, values, k=10):
+        """Return the k (node_id, value) pairs with the largest values"""
+        order = np.argsort(-values, kind="stable")[:k]
+        node_ids = self.graph.node_ids[order].tolist()
+        return list(zip(node_ids, values[order].tolist()))
+    
+    @reads_graph
     def get_basic_stats(self):
         """Get basic statistics about the graph"""
-        if self.graph is None:
-            self.load_graph()
-        
+        return self._cached("basic_stats", self._compute_basic_stats)
+    
+    def _compute_basic_stats(self):
         G = self.graph
         
         # Basic stats
-        num_nodes = len(G.nodes())
-        num_edges = len(G.edges())
+        num_nodes = G.number_of_nodes()
+        num_edges = G.number_of_edges()
         
         # Graph density
-        density = nx.density(G)
+        density = G.density()
         
-        # Calculate the strongest connected component
-        largest_cc = max(nx.weakly_connected_components(G), key=len)
-        largest_cc_size = len(largest_cc)
+        # Calculate the largest weakly connected component
+        _, component_sizes = self._weakly_connected_components()
+        largest_cc_size = int(component_sizes[0]) if len(component_sizes) else 0
         
         # In-degree and out-degree stats
-        in_degrees = [d for n, d in G.in_degree()]
-        out_degrees = [d for n, d in G.out_degree()]
+        in_degrees, out_degrees = self._degrees()
         
-        avg_in_degree = sum(in_degrees) / len(in_degrees) if in_degrees else 0
-        avg_out_degree = sum(out_degrees) / len(out_degrees) if out_degrees else 0
-        max_in_degree = max(in_degrees) if in_degrees else 0
-        max_out_degree = max(out_degrees) if out_degrees else 0
+        avg_in_degree = float(in_degrees.mean()) if num_nodes else 0
+        avg_out_degree = float(out_degrees.mean()) if num_nodes else 0
+        max_in_degree = int(in_degrees.max()) if num_nodes else 0
+        max_out_degree = int(out_degrees.max()) if num_nodes else 0
         
         # Degree distribution
-        in_degree_counts = Counter(in_degrees)
-        out_degree_counts = Counter(out_degrees)
+        in_values, in_counts = np.unique(in_degrees, return_counts=True)
+        out_values, out_counts = np.unique(out_degrees, return_counts=True)
         
-        in_degree_dist = {k: v/num_nodes for k, v in sorted(in_degree_counts.items())}
-        out_degree_dist = {k: v/num_nodes for k, v in sorted(out_degree_counts.items())}
+        in_degree_dist = dict(zip(in_values.tolist(), (in_counts / num_nodes).tolist()))
+        out_degree_dist = dict(zip(out_values.tolist(), (out_counts / num_nodes).tolist()))
         
         # Get top 10 nodes by degree (potential hubs)
-        top_in_degree_nodes = sorted(G.in_degree(), key=lambda x: x[1], reverse=True)[:10]
-        top_out_degree_nodes = sorted(G.out_degree(), key=lambda x: x[1], reverse=True)[:10]
+        top_in_degree_nodes = self._top_nodes(in_degrees)
+        top_out_degree_nodes = self._top_nodes(out_degrees)
         
-        # Calculate average clustering coefficient (this can be slow for large graphs)
-        # avg_clustering = nx.average_clustering(G)  # Uncommenting this may slow down processing
+        # The average clustering coefficient is too slow to compute exactly
+        # here; get_approximate_stats() estimates it by sampling
         
         # PageRank (identify important nodes)
-        try:
-            pagerank = list(nx.pagerank(G).items())
-            top_pagerank_nodes = sorted(pagerank, key=lambda x: x[1], reverse=True)[:10]
-        except:
-            top_pagerank_nodes = []
-            print("PageRank calculation failed, possibly due to graph complexity.")
+        top_pagerank_nodes = self._top_nodes(self._pagerank())
         
         return {
             "basic_stats": {
@@ -123,158 +724,295 @@ class AmazonGraphAnalyzer:
             }
         }
     
+    @reads_graph
+    def get_louvain_partition(self, seed=42, resolution=1.0):
+        """
+        Louvain communities of the largest component (undirected). Returns a
+        LouvainResult with the partition indexed like the component's nodes,
+        its modularity and per-level timings.
+        """
+        default = seed == 42 and resolution == 1.0
+        
+        def compute():
+            undirected_graph = self._largest_component_undirected()
+            if default and "louvain_partition" in self.precomputed:
+                partition = self.precomputed["louvain_partition"]
+                return LouvainResult(partition, modularity(undirected_graph, partition), [])
+            
+            result = louvain(
+                undirected_graph,
+                resolution=resolution,
+                seed=seed,
+                workers=self.community_workers,
+            )
+            seconds = sum(level["seconds"] for level in result.levels)
+            print(f"Louvain found {int(result.partition.max()) + 1} communities "
+                  f"(modularity {result.modularity:.4f}) in {seconds:.2f}s")
+            if default:
+                self.precomputed["louvain_partition"] = result.partition
+            return result
+        return self._cached("louvain", compute, seed=seed, resolution=resolution)
+    
+    @reads_graph
     def get_community_detection(self, algorithm="louvain", max_communities=10):
         """Detect communities in the graph using various algorithms"""
-        if self.graph is None:
-            self.load_graph()
-        
-        # For large graphs, we might want to use the largest connected component
-        print("Extracting largest connected component for community detection...")
-        largest_cc = max(nx.weakly_connected_components(self.graph), key=len)
-        subgraph = self.graph.subgraph(largest_cc).copy()
-        
-        # Convert to undirected for community detection
-        undirected_graph = subgraph.to_undirected()
+        return self._cached(
+            "communities",
+            lambda: self._compute_community_detection(algorithm, max_communities),
+            algorithm=algorithm,
+            max_communities=max_communities,
+        )
+    
+    def _community_partition(self, algorithm):
+        """(partition, complete) of the largest component for the given algorithm"""
+        def compute():
+            if algorithm == "louvain":
+                return self.get_louvain_partition().partition, True
+            
+            undirected_graph = self._largest_component_undirected()
+            if algorithm == "label_propagation":
+                run = label_propagation(undirected_graph, seed=42, time_budget=self.community_time_budget)
+            elif algorithm == "girvan_newman":
+                run = girvan_newman(undirected_graph, seed=42, time_budget=self.community_time_budget)
+            else:
+                raise ValueError(f"Unknown community detection algorithm: {algorithm}")
+            
+            if not run.complete:
+                print(f"{algorithm} stopped after {run.iterations} iterations ({run.seconds:.2f}s), "
+                      f"returning partial communities")
+            return run.partition, run.complete
+        return self._cached("community_partition", compute, algorithm=algorithm)
+    
+    def _partition_summary(self, algorithm):
+        """Sizes, internal edges, densities and members of every community, in one pass"""
+        def compute():
+            partition, _ = self._community_partition(algorithm)
+            return summarize_partition(self._largest_component_undirected(), partition)
+        return self._cached("partition_summary", compute, algorithm=algorithm)
+    
+    def _compute_community_detection(self, algorithm, max_communities, top_members=5):
+        # Communities are detected on the largest connected component
+        # (converted to undirected), numbered by decreasing size
+        undirected_graph = self._largest_component_undirected()
+        num_nodes = undirected_graph.number_of_nodes()
+        _, complete = self._community_partition(algorithm)
+        summary = self._partition_summary(algorithm)
         
         communities = []
-        
-        # Use NetworkX's community detection algorithms
-        if algorithm == "louvain":
-            try:
-                import community as community_louvain
-                partition = community_louvain.best_partition(undirected_graph)
-                
-                # Count nodes in each community
-                community_counts = Counter(partition.values())
-                
-                # Get top communities
-                top_communities = community_counts.most_common(max_communities)
-                
-                for i, (community_id, count) in enumerate(top_communities):
-                    # Get nodes in this community
-                    nodes = [node for node, comm_id in partition.items() if comm_id == community_id]
-                    
-                    # Calculate density of this community
-                    community_subgraph = undirected_graph.subgraph(nodes)
-                    density = nx.density(community_subgraph)
-                    
-                    communities.append({
-                        "id": i + 1,  # Use 1-based indexing for display
-                        "name": f"Community {i + 1}",
-                        "count": count,
-                        "percentage": (count / len(undirected_graph)) * 100,
-                        "density": density,
-                        "color": f"#{hash(community_id) % 0xffffff:06x}"  # Generate a color based on community_id
-                    })
-            except ImportError:
-                print("python-louvain package not installed. Using Girvan-Newman instead.")
-                algorithm = "girvan_newman"
-        
-        if algorithm == "girvan_newman":
-            try:
-                comp = list(nx.community.girvan_newman(undirected_graph))
-                if len(comp) > 0:
-                    # Take first iteration result
-                    first_iteration = tuple(sorted(c) for c in next(iter(comp)))
-                    
-                    # Sort communities by size (largest first)
-                    sorted_communities = sorted(first_iteration, key=len, reverse=True)
-                    
-                    for i, community in enumerate(sorted_communities[:max_communities]):
-                        count = len(community)
-                        community_subgraph = undirected_graph.subgraph(community)
-                        density = nx.density(community_subgraph)
-                        
-                        communities.append({
-                            "id": i + 1,
-                            "name": f"Community {i + 1}",
-                            "count": count,
-                            "percentage": (count / len(undirected_graph)) * 100,
-                            "density": density,
-                            "color": f"#{hash(i) % 0xffffff:06x}"
-                        })
-            except Exception as e:
-                print(f"Girvan-Newman failed: {e}")
+        for community_id in range(min(max_communities, len(summary.sizes))):
+            count = int(summary.sizes[community_id])
+            start = summary.member_offsets[community_id]
+            members = summary.members[start:start + min(top_members, count)]
+            
+            communities.append({
+                "id": community_id + 1,  # Use 1-based indexing for display
+                "name": f"Community {community_id + 1}",
+                "count": count,
+                "percentage": (count / num_nodes) * 100,
+                "density": float(summary.density[community_id]),
+                "internal_edges": int(summary.internal_edges[community_id]),
+                "top_members": undirected_graph.node_ids[members].tolist(),
+                "partial": not complete,
+                "color": f"#{hash(community_id) % 0xffffff:06x}"  # Generate a color based on community_id
+            })
         
         return communities
     
-    def get_risk_analysis(self, num_suppliers=10):
+    @reads_graph
+    def get_risk_analysis(self, num_suppliers=10, offset=0, min_score=None, community=None):
         """
         Generate a mock risk analysis based on graph properties
         For a real implementation, this would incorporate domain knowledge
-        """
-        if self.graph is None:
-            self.load_graph()
-        
-        # Use PageRank to identify important nodes (products)
-        try:
-            pagerank = nx.pagerank(self.graph)
-            top_nodes = sorted(pagerank.items(), key=lambda x: x[1], reverse=True)[:50]
-        except:
-            # Fallback to degree centrality if PageRank fails
-            centrality = nx.degree_centrality(self.graph)
-            top_nodes = sorted(centrality.items(), key=lambda x: x[1], reverse=True)[:50]
         
-        # Generate mock risk scores based on centrality and random factors
-        risk_scores = []
-        node_ids = [node for node, _ in top_nodes]
-        
-        np.random.seed(42)  # For reproducibility
+        Every node is scored once per graph version; this returns the page of
+        num_suppliers nodes starting at offset in order of decreasing risk,
+        optionally only nodes scoring at least min_score or belonging to the
+        Louvain community with the given id (as listed by /communities).
+        """
+        if community is None:
+            index = self._risk_index()
+            order, ranked_scores = index.order, index.ranked_scores
+        else:
+            order, ranked_scores = self._risk_by_community(community)
+        page = select_risks(order, ranked_scores, offset, num_suppliers, min_score)
         
-        for i in range(min(num_suppliers, len(node_ids))):
-            node = node_ids[i]
-            
-            # Base risk on node's importance (more central = more critical)
-            base_risk = np.random.uniform(0.3, 0.9)
-            
-            # Add some network-based factors
-            in_degree = self.graph.in_degree(node)
-            out_degree = self.graph.out_degree(node)
-            
-            # Higher in-degree might mean more dependent on other suppliers
-            in_degree_factor = min(in_degree / 20, 0.5)
-            
-            # Higher out-degree might mean more products depend on this supplier
-            out_degree_factor = min(out_degree / 20, 0.5)
-            
-            # Calculate final risk score
-            risk_score = (base_risk + in_degree_factor + out_degree_factor) / 3
-            risk_score = min(risk_score, 0.95)  # Cap at 0.95
-            
-            # Generate reasons for the risk score
-            reasons = []
-            if in_degree > 10:
-                reasons.append("High dependency on other suppliers")
-            if out_degree > 10:
-                reasons.append("Critical for many products")
-            if base_risk > 0.7:
-                reasons.append("Historical performance issues")
-            if len(reasons) == 0:
-                reasons.append("General supply chain position")
-            
-            # Add some randomized reasons
-            possible_reasons = [
-                "Geographic concentration risk",
-                "Limited alternative sources",
-                "Single sourcing for key components",
-                "Long lead times",
-                "Quality control challenges",
-                "Contractual constraints",
-                "Market volatility exposure"
-            ]
-            
-            # Add 1-2 random reasons
-            num_random = np.random.randint(1, 3)
-            random_reasons = np.random.choice(possible_reasons, num_random, replace=False)
-            reasons.extend(random_reasons)
-            
-            risk_scores.append({
+        index = self._risk_index()
+        node_ids = self.graph.node_ids[page].tolist()
+        return [
+            {
                 "supplier": f"Supplier-{node}",
-                "score": float(risk_score),
-                "reasons": reasons
-            })
+                "node": node,
+                "rank": offset + i + 1,
+                "score": float(index.scores[p]),
+                "reasons": reason_labels(index.reasons[p]),
+            }
+            for i, (node, p) in enumerate(zip(node_ids, page.tolist()))
+        ]
+    
+    @reads_graph
+    def get_community_graph(self, algorithm="louvain", max_communities=50, min_weight=1):
+        """
+        Communities as a graph for visualization: the max_communities
+        largest communities with their size, internal edges, risk
+        aggregates and layout position, and the weighted edges between them
+        (at least min_weight graph edges). The layout is computed once per
+        partition, so this only slices cached arrays.
+        """
+        if not 0 < max_communities <= MAX_LAYOUT_COMMUNITIES:
+            raise ValueError(f"max_communities must be between 1 and {MAX_LAYOUT_COMMUNITIES}")
         
-        return risk_scores
+        quotient = self._community_graph(algorithm)
+        positions = self._community_layout(algorithm)
+        _, complete = self._community_partition(algorithm)
+        num = min(max_communities, len(quotient.sizes))
+        communities = [
+            {
+                "id": c + 1,
+                "size": int(quotient.sizes[c]),
+                "internal_edges": int(quotient.internal_edges[c]),
+                "mean_risk": float(quotient.mean_risk[c]),
+                "max_risk": float(quotient.max_risk[c]),
+                "high_risk_members": int(quotient.high_risk_members[c]),
+                "x": float(positions[c, 0]),
+                "y": float(positions[c, 1]),
+            }
+            for c in range(num)
+        ]
+        shown = (quotient.sources < num) & (quotient.targets < num) & (quotient.weights >= min_weight)
+        edges = [
+            {"source": source + 1, "target": target + 1, "weight": weight}
+            for source, target, weight in zip(
+                quotient.sources[shown].tolist(), quotient.targets[shown].tolist(), quotient.weights[shown].tolist()
+            )
+        ]
+        return {
+            "algorithm": algorithm,
+            "num_communities": len(quotient.sizes),
+            "complete": complete,
+            "communities": communities,
+            "edges": edges,
+        }
+    
+    def _community_assignment(self, algorithm):
+        """Community id (1-based, as in /communities) of every node, 0 outside the largest component"""
+        if algorithm == "louvain":
+            return self._node_communities()
+        def compute():
+            labels, _ = self._weakly_connected_components()
+            partition, _ = self._community_partition(algorithm)
+            communities = np.zeros(self.graph.number_of_nodes(), dtype=np.int64)
+            communities[labels == 0] = partition + 1
+            return communities
+        return self._cached("community_assignment", compute, algorithm=algorithm)
+    
+    def _community_graph(self, algorithm):
+        """Quotient graph of the communities with sizes, weights and risk aggregates"""
+        def compute():
+            return community_graph(self.graph, self._community_assignment(algorithm), self._risk_index().scores)
+        return self._cached("community_graph", compute, algorithm=algorithm)
+    
+    def _community_layout(self, algorithm):
+        """Force-directed positions of the largest communities, heavier ones pushing harder"""
+        def compute():
+            quotient = self._community_graph(algorithm)
+            num = min(len(quotient.sizes), MAX_LAYOUT_COMMUNITIES)
+            laid_out = (quotient.sources < num) & (quotient.targets < num)
+            return force_layout(
+                num,
+                quotient.sources[laid_out],
+                quotient.targets[laid_out],
+                weights=quotient.weights[laid_out],
+                masses=np.sqrt(quotient.sizes[:num]),
+            )
+        return self._cached("community_layout", compute, algorithm=algorithm)
+    
+    @reads_graph
+    def get_ego_graph(self, node, hops=2, max_nodes=200):
+        """
+        The neighbourhood of a product or supplier within `hops` (in either
+        edge direction), capped at max_nodes by keeping the riskiest nodes
+        of the last hop, with a force-directed layout centred on it. Not
+        cached: every call is bounded by max_nodes, and one entry per node
+        would crowd the shared analytics out of the cache.
+        """
+        if hops < 0 or not 0 < max_nodes <= MAX_EGO_NODES:
+            raise ValueError(f"hops must not be negative and max_nodes must be between 1 and {MAX_EGO_NODES}")
+        
+        graph = self.graph
+        center = int(graph.index_of(node))
+        index = self._risk_index()
+        nodes, distances, truncated = ego_nodes(graph, center, hops, max_nodes, index.scores)
+        sources, targets, positions = induced_edges(graph, nodes)
+        local = np.full(graph.number_of_nodes(), -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        layout = force_layout(len(nodes), local[sources], local[targets], iterations=50)
+        layout -= layout[0]
+        node_ids = graph.node_ids
+        node_types = graph.node_types()[nodes].tolist()
+        communities = self._node_communities()[nodes].tolist()
+        relations = graph.edge_types()[positions].tolist()
+        return {
+            "center": node,
+            "hops": hops,
+            "truncated": truncated,
+            "nodes": [
+                {
+                    "id": node_id,
+                    "type": NODE_TYPES[node_type],
+                    "community": community,
+                    "risk": risk,
+                    "hop": hop,
+                    "x": x,
+                    "y": y,
+                }
+                for node_id, node_type, community, risk, hop, (x, y) in zip(
+                    node_ids[nodes].tolist(), node_types, communities, index.scores[nodes].tolist(),
+                    distances.tolist(), layout.tolist()
+                )
+            ],
+            "edges": [
+                {"source": source, "target": target, "relation": EDGE_RELATIONS[relation]}
+                for source, target, relation in zip(
+                    node_ids[sources].tolist(), node_ids[targets].tolist(), relations
+                )
+            ],
+        }
+    
+    def _risk_index(self):
+        """Risk scores of all nodes, sorted, from degrees and PageRank centrality"""
+        def compute():
+            if "risk_order" in self.precomputed:
+                return RiskIndex(*(self.precomputed[f"risk_{field}"] for field in RiskIndex._fields))
+            in_degrees, out_degrees = self._degrees()
+            return build_risk_index(self.graph.node_ids, in_degrees, out_degrees, self._pagerank())
+        return self._cached("risk_index", compute)
+    
+    def _node_communities(self):
+        """Louvain community id (1-based, as in /communities) of every node, 0 outside the largest component"""
+        def compute():
+            if "node_communities" in self.precomputed:
+                return self.precomputed["node_communities"]
+            labels, _ = self._weakly_connected_components()
+            communities = np.zeros(self.graph.number_of_nodes(), dtype=np.int64)
+            communities[labels == 0] = self.get_louvain_partition().partition + 1
+            return communities
+        return self._cached("node_communities", compute)
+    
+    def _risk_by_community(self, community):
+        """The risk ordering restricted to one community, with its scores"""
+        def compute():
+            index = self._risk_index()
+            communities = self._node_communities()
+            # Stable sort by community keeps the risk order within each
+            grouped = np.argsort(communities[index.order], kind="stable")
+            offsets = np.zeros(int(communities.max()) + 2, dtype=np.int64)
+            np.cumsum(np.bincount(communities, minlength=len(offsets) - 1), out=offsets[1:])
+            return index.order[grouped], index.ranked_scores[grouped], offsets
+        order, ranked_scores, offsets = self._cached("risk_by_community", compute)
+        if not 0 < community < len(offsets) - 1:
+            return order[:0], ranked_scores[:0]
+        lo, hi = offsets[community], offsets[community + 1]
+        return order[lo:hi], ranked_scores[lo:hi]
 
 # Example usage
 if __name__ == "__main__":
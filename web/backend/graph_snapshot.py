@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from csr_graph import CSRGraph
+
+# Bump whenever the on-disk layout, or the way a stored analytic is
+# computed, changes so old snapshots get rebuilt
+SNAPSHOT_VERSION = 2
+
+MANIFEST_NAME = "manifest.json"
+GRAPH_ARRAYS = ("node_ids", "out_offsets", "out_indices", "in_offsets", "in_indices")
+
+
+def source_checksum(path, block_size=1024 * 1024):
+    """SHA-256 of the source dataset file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def undirected_graph_arrays(name, graph):
+    """An undirected graph derived from the main one as analytics arrays <name>_<array>"""
+    arrays = {
+        f"{name}_node_ids": graph.node_ids,
+        f"{name}_offsets": graph.out_offsets,
+        f"{name}_indices": graph.out_indices,
+    }
+    if graph.is_typed():
+        arrays[f"{name}_node_types"] = graph.node_types()
+        arrays[f"{name}_edge_types"] = graph.edge_types()
+    return arrays
+
+
+def undirected_graph_from_arrays(name, analytics):
+    """The graph stored by undirected_graph_arrays, or None when the analytics do not hold it"""
+    if f"{name}_offsets" not in analytics:
+        return None
+    offsets, indices = analytics[f"{name}_offsets"], analytics[f"{name}_indices"]
+    return CSRGraph(
+        analytics[f"{name}_node_ids"], offsets, indices, offsets, indices,
+        directed=False,
+        node_types=analytics.get(f"{name}_node_types"),
+        edge_types=analytics.get(f"{name}_edge_types"),
+    )
+
+
+def _array_path(directory, name):
+    return os.path.join(directory, f"{name}.npy")
+
+
+def read_manifest(directory):
+    """Return the snapshot manifest, or None if there is no readable snapshot"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(directory, graph, checksum, analytics=None):
+    """
+    Write the graph arrays and precomputed analytics as .npy files plus a
+    manifest. The snapshot is assembled in a temporary directory and moved
+    into place so that readers never see a half-written snapshot.
+    """
+    analytics = analytics or {}
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    arrays = {name: getattr(graph, name) for name in GRAPH_ARRAYS}
+    arrays["out_degree"] = graph.out_degree()
+    arrays["in_degree"] = graph.in_degree()
+    if graph.is_typed():
+        arrays["node_types"] = graph.node_types()
+        arrays["edge_types"] = graph.edge_types()
+    for name, values in analytics.items():
+        arrays[f"analytics.{name}"] = np.asarray(values)
+
+    for name, values in arrays.items():
+        np.save(_array_path(tmp_dir, name), np.ascontiguousarray(values))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "source_sha256": checksum,
+        "directed": graph.directed,
+        "num_nodes": graph.number_of_nodes(),
+        "num_edges": graph.number_of_edges(),
+        "arrays": {
+            name: {"dtype": str(values.dtype), "shape": list(values.shape)}
+            for name, values in arrays.items()
+        },
+        "analytics": sorted(analytics),
+        "created": time.time(),
+    }
+    # The manifest goes last: a snapshot without one is never loaded
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.rename(directory, old_dir)
+    os.rename(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+def load_snapshot(directory, checksum=None, mmap_mode="r"):
+    """
+    Memory-map a snapshot written by write_snapshot.
+
+    Returns (graph, analytics, manifest), or None when the snapshot is
+    missing, was written by another SNAPSHOT_VERSION or does not match the
+    checksum of the current source file.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None or manifest.get("version") != SNAPSHOT_VERSION:
+        return None
+    if checksum is not None and manifest.get("source_sha256") != checksum:
+        return None
+
+    try:
+        arrays = {
+            name: np.load(_array_path(directory, name), mmap_mode=mmap_mode)
+            for name in manifest["arrays"]
+        }
+    except (OSError, ValueError):
+        return None
+
+    graph = CSRGraph(
+        *(arrays[name] for name in GRAPH_ARRAYS),
+        directed=manifest["directed"],
+        out_degree=arrays.get("out_degree"),
+        in_degree=arrays.get("in_degree"),
+        node_types=arrays.get("node_types"),
+        edge_types=arrays.get("edge_types"),
+    )
+    analytics = {
+        name: arrays[f"analytics.{name}"]
+        for name in manifest.get("analytics", [])
+    }
+    return graph, analytics, manifest
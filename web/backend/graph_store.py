@@ -0,0 +1,442 @@
+"""
+Persistent graph stores and a streaming bulk loader into them.
+
+The loader reads a SNAP edge list chunk by chunk, turns each batch of
+edges into node and edge documents (the `nodes`/`edges` collections of the
+notebook's ArangoDB graph) and hands the batches to several concurrent
+writers. At most max_pending batches are in flight, so reading waits for
+slow writers. Transient failures are retried with exponential backoff.
+The number of rows written without gaps is checkpointed, so an interrupted
+load resumes from that offset. Writes are idempotent, which makes
+rewriting a batch after a resume harmless.
+
+    python graph_store.py sqlite:./data/graph.sqlite
+    python graph_store.py file:./data/graph-documents
+    ARANGO_PASSWORD=... python graph_store.py http://localhost:8529 --writers 8
+
+AmazonGraphAnalyzer(store=open_store(...)) then loads the graph from the
+store instead of the edge list.
+"""
+import argparse
+import errno
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from edge_loader import DEFAULT_CHUNK_BYTES, iter_edge_chunks, parse_edge_chunk
+from graph_snapshot import source_checksum
+
+NODE_COLLECTION = "nodes"
+EDGE_COLLECTION = "edges"
+
+# Rows of the edge list per written batch
+DEFAULT_BATCH_SIZE = 10000
+
+# File system errors that may clear up by themselves (interrupted or busy
+# calls, a full disk or quota that cleanup frees) and are worth retrying
+TRANSIENT_ERRNOS = {errno.EAGAIN, errno.EINTR, errno.EBUSY, errno.ENOSPC, errno.EDQUOT, errno.ETIMEDOUT}
+
+_NODE_DOCUMENT = '{"_key":"%d","type":"product"}\n'
+_EDGE_DOCUMENT = (
+    '{"_key":"%d-%d","_from":"' + NODE_COLLECTION + '/%d","_to":"' + NODE_COLLECTION + '/%d",'
+    '"relation":"co_purchased"}\n'
+)
+
+
+class StoreError(Exception):
+    """Raised when a store rejects a write or cannot be read"""
+
+
+class TransientStoreError(StoreError):
+    """A failure worth retrying: unreachable, overloaded or locked store"""
+
+
+def node_documents(node_ids):
+    """Node documents of a batch as JSON lines (SNAP nodes are all products)"""
+    return "".join(_NODE_DOCUMENT % node for node in node_ids.tolist())
+
+
+def edge_documents(sources, targets):
+    """Edge documents of a batch as JSON lines, keyed by their endpoints"""
+    pairs = zip(sources.tolist(), targets.tolist())
+    return "".join(_EDGE_DOCUMENT % (source, target, source, target) for source, target in pairs)
+
+
+class GraphStore(ABC):
+    """
+    Interface of a graph store. write_batch must be idempotent and safe to
+    call from several threads at once; offset (the batch's first row in the
+    edge list) identifies the batch.
+    """
+
+    @abstractmethod
+    def describe(self):
+        """Short name of the store, identifying it in checkpoints and reports"""
+
+    def prepare(self):
+        """Create whatever the store needs before the first write"""
+
+    @abstractmethod
+    def write_batch(self, offset, node_ids, sources, targets):
+        """Write the node and edge documents of one batch"""
+
+    @abstractmethod
+    def read_edges(self):
+        """(sources, targets) arrays of original node ids of every stored edge"""
+
+
+class ArangoStore(GraphStore):
+    """ArangoDB through its HTTP API: documents go in with the bulk import endpoint"""
+
+    def __init__(self, url, database="SupplyChainv0", username="root", password="", timeout=60.0,
+                 read_batch_size=100000):
+        self.url = url.rstrip("/")
+        self.database = database
+        self.auth = (username, password)
+        self.timeout = timeout
+        self.read_batch_size = read_batch_size
+        self._local = threading.local()
+
+    def describe(self):
+        return f"arango:{self.url}/{self.database}"
+
+    def _request(self, method, path, database=None, **kwargs):
+        # One connection pool per writer thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.auth = self.auth
+        url = f"{self.url}/_db/{database or self.database}{path}"
+        try:
+            response = session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise TransientStoreError(f"{method} {path} failed: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientStoreError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    def _check(self, response, what, allowed=()):
+        if response.status_code >= 400 and response.status_code not in allowed:
+            raise StoreError(f"{what} failed with {response.status_code}: {response.text[:200]}")
+        return response
+
+    def prepare(self):
+        self._check(self._request("POST", "/_api/database", database="_system", json={"name": self.database}),
+                    "Creating the database", allowed=(409,))
+        for name, collection_type in ((NODE_COLLECTION, 2), (EDGE_COLLECTION, 3)):
+            self._check(self._request("POST", "/_api/collection", json={"name": name, "type": collection_type}),
+                        f"Creating collection {name}", allowed=(409,))
+
+    def _import(self, collection, body):
+        response = self._check(self._request(
+            "POST",
+            "/_api/import",
+            params={"collection": collection, "type": "documents", "onDuplicate": "ignore", "complete": "true"},
+            data=body.encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        ), f"Importing into {collection}")
+        result = response.json()
+        if result.get("errors"):
+            raise StoreError(f"Importing into {collection}: {result['errors']} documents rejected")
+
+    def write_batch(self, offset, node_ids, sources, targets):
+        if len(node_ids):
+            self._import(NODE_COLLECTION, node_documents(node_ids))
+        self._import(EDGE_COLLECTION, edge_documents(sources, targets))
+
+    def read_edges(self):
+        query = ("FOR e IN @@edges RETURN [TO_NUMBER(PARSE_IDENTIFIER(e._from).key), "
+                 "TO_NUMBER(PARSE_IDENTIFIER(e._to).key)]")
+        body = {"query": query, "bindVars": {"@edges": EDGE_COLLECTION}, "batchSize": self.read_batch_size}
+        result = self._check(self._request("POST", "/_api/cursor", json=body), "Reading edges").json()
+        parts = [np.array(result["result"], dtype=np.int64).reshape(-1, 2)]
+        while result.get("hasMore"):
+            result = self._check(self._request("PUT", f"/_api/cursor/{result['id']}"), "Reading edges").json()
+            parts.append(np.array(result["result"], dtype=np.int64).reshape(-1, 2))
+        edges = np.concatenate(parts)
+        return edges[:, 0].copy(), edges[:, 1].copy()
+
+
+class SQLiteStore(GraphStore):
+    """A local SQLite database with nodes and edges tables"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def describe(self):
+        return f"sqlite:{os.path.abspath(self.path)}"
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def prepare(self):
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, type TEXT NOT NULL)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS edges (source INTEGER NOT NULL, target INTEGER NOT NULL, "
+                "relation TEXT NOT NULL, PRIMARY KEY (source, target)) WITHOUT ROWID"
+            )
+
+    def write_batch(self, offset, node_ids, sources, targets):
+        try:
+            with self._connection() as connection:
+                connection.executemany("INSERT OR IGNORE INTO nodes VALUES (?, 'product')",
+                                       ((node,) for node in node_ids.tolist()))
+                connection.executemany("INSERT OR IGNORE INTO edges VALUES (?, ?, 'co_purchased')",
+                                       zip(sources.tolist(), targets.tolist()))
+        except sqlite3.OperationalError as e:
+            # Typically "database is locked" while another writer commits
+            raise TransientStoreError(str(e))
+
+    def read_edges(self):
+        cursor = self._connection().execute("SELECT source, target FROM edges")
+        parts = [np.empty((0, 2), dtype=np.int64)]
+        while True:
+            rows = cursor.fetchmany(100000)
+            if not rows:
+                break
+            parts.append(np.array(rows, dtype=np.int64))
+        edges = np.concatenate(parts)
+        return edges[:, 0].copy(), edges[:, 1].copy()
+
+
+class FileStore(GraphStore):
+    """
+    Node and edge documents as JSON-lines files, one pair per batch, that
+    arangoimport can load as they are
+    """
+
+    _EDGE_PATTERN = re.compile(rb'"_from":"' + NODE_COLLECTION.encode() + rb'/(\d+)","_to":"'
+                               + NODE_COLLECTION.encode() + rb'/(\d+)"')
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def describe(self):
+        return f"file:{os.path.abspath(self.directory)}"
+
+    def prepare(self):
+        for collection in (NODE_COLLECTION, EDGE_COLLECTION):
+            os.makedirs(os.path.join(self.directory, collection), exist_ok=True)
+
+    def _write(self, collection, offset, body):
+        path = os.path.join(self.directory, collection, f"{offset:015d}.jsonl")
+        with open(f"{path}.tmp-{threading.get_ident()}", "w") as f:
+            f.write(body)
+        os.replace(f"{path}.tmp-{threading.get_ident()}", path)
+
+    def write_batch(self, offset, node_ids, sources, targets):
+        try:
+            self._write(NODE_COLLECTION, offset, node_documents(node_ids))
+            self._write(EDGE_COLLECTION, offset, edge_documents(sources, targets))
+        except OSError as e:
+            if e.errno in TRANSIENT_ERRNOS:
+                raise TransientStoreError(str(e))
+            raise StoreError(str(e))
+
+    def read_edges(self):
+        parts = [np.empty((0, 2), dtype=np.int64)]
+        for path in sorted(glob.glob(os.path.join(self.directory, EDGE_COLLECTION, "*.jsonl"))):
+            with open(path, "rb") as f:
+                pairs = self._EDGE_PATTERN.findall(f.read())
+            parts.append(np.array(pairs, dtype=np.int64).reshape(-1, 2))
+        edges = np.concatenate(parts)
+        return edges[:, 0].copy(), edges[:, 1].copy()
+
+
+def open_store(spec):
+    """
+    Store named by a spec: sqlite:<path>, file:<directory>, or the http(s)
+    URL of an ArangoDB server, with ARANGO_DB, ARANGO_USERNAME and
+    ARANGO_PASSWORD taken from the environment
+    """
+    if spec.startswith("sqlite:"):
+        return SQLiteStore(spec[len("sqlite:"):])
+    if spec.startswith("file:"):
+        return FileStore(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return ArangoStore(
+            spec,
+            database=os.getenv("ARANGO_DB", "SupplyChainv0"),
+            username=os.getenv("ARANGO_USERNAME", "root"),
+            password=os.getenv("ARANGO_PASSWORD", ""),
+        )
+    raise ValueError(f"Unknown graph store: {spec}, expected sqlite:<path>, file:<directory> or an ArangoDB URL")
+
+
+class BulkLoader:
+    """Streams an edge list into a GraphStore with concurrent, retried, resumable batch writes"""
+
+    def __init__(self, store, batch_size=DEFAULT_BATCH_SIZE, writers=4, max_pending=None, retries=5, backoff=0.5,
+                 checkpoint_path=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        self.store = store
+        self.batch_size = batch_size
+        self.writers = writers
+        self.max_pending = max_pending or 2 * writers
+        self.retries = retries
+        self.backoff = backoff
+        self.checkpoint_path = checkpoint_path
+        self.chunk_bytes = chunk_bytes
+        self._retried = 0
+        self._lock = threading.Lock()
+
+    def _read_checkpoint(self, identity):
+        """Rows already written by an earlier load of the same file into the same store"""
+        if not self.checkpoint_path:
+            return 0
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if {key: checkpoint.get(key) for key in identity} != identity:
+            print(f"Ignoring checkpoint {self.checkpoint_path}: it is for another source or store")
+            return 0
+        return int(checkpoint.get("offset", 0))
+
+    def _write_checkpoint(self, identity, offset):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(identity, offset=offset, updated=time.time()), f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _write_with_retries(self, offset, node_ids, sources, targets):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.store.write_batch(offset, node_ids, sources, targets)
+            except TransientStoreError as e:
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self._retried += 1
+                delay = self.backoff * 2 ** attempt
+                print(f"Batch at row {offset} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def load(self, path):
+        """
+        Load an edge list into the store and return a throughput report.
+        Raises StoreError when a batch cannot be written; the checkpoint
+        then holds the offset to resume from.
+        """
+        start = time.perf_counter()
+        identity = {"source_sha256": source_checksum(path), "store": self.store.describe()}
+        resumed_from = self._read_checkpoint(identity)
+        self.store.prepare()
+
+        self._retried = 0
+        slots = threading.BoundedSemaphore(self.max_pending)
+        finished = {}
+        state = {"watermark": resumed_from, "nodes": 0, "edges": 0, "batches": 0, "error": None}
+
+        def on_done(future, offset, end, num_nodes):
+            slots.release()
+            with self._lock:
+                if future.exception() is not None:
+                    state["error"] = state["error"] or future.exception()
+                    return
+                state["nodes"] += num_nodes
+                state["edges"] += end - offset
+                state["batches"] += 1
+                # The checkpoint only moves past batches that are all written
+                finished[offset] = end
+                advanced = False
+                while state["watermark"] in finished:
+                    state["watermark"] = finished.pop(state["watermark"])
+                    advanced = True
+                if advanced:
+                    self._write_checkpoint(identity, state["watermark"])
+
+        # Indexed by node id: whether a batch already wrote the node
+        seen = np.zeros(0, dtype=bool)
+        row = 0
+        with ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix="store-writer") as pool:
+            for chunk in iter_edge_chunks(path, self.chunk_bytes):
+                edges = parse_edge_chunk(chunk)
+                for begin in range(0, len(edges), self.batch_size):
+                    batch = edges[begin:begin + self.batch_size]
+                    offset, row = row, row + len(batch)
+                    if row <= resumed_from:
+                        continue
+                    if offset < resumed_from:
+                        batch, offset = batch[resumed_from - offset:], resumed_from
+                    # Nodes are written with the first batch that mentions them
+                    node_ids = np.unique(batch)
+                    if node_ids[-1] >= len(seen):
+                        grown = np.zeros(max(node_ids[-1] + 1, 2 * len(seen)), dtype=bool)
+                        grown[:len(seen)] = seen
+                        seen = grown
+                    node_ids = node_ids[~seen[node_ids]]
+                    seen[node_ids] = True
+                    # Backpressure: wait for a writer once max_pending batches are in flight
+                    slots.acquire()
+                    if state["error"] is not None:
+                        slots.release()
+                        break
+                    future = pool.submit(self._write_with_retries, offset, node_ids, batch[:, 0], batch[:, 1])
+                    future.add_done_callback(
+                        lambda f, offset=offset, end=row, num_nodes=len(node_ids): on_done(f, offset, end, num_nodes)
+                    )
+                if state["error"] is not None:
+                    break
+
+        seconds = time.perf_counter() - start
+        if state["error"] is not None:
+            raise StoreError(f"Bulk load stopped: {state['error']}; {state['watermark']} rows are stored, "
+                             f"loading again resumes from there")
+        documents = state["nodes"] + state["edges"]
+        report = {
+            "store": self.store.describe(),
+            "rows": row,
+            "resumed_from": resumed_from,
+            "nodes": state["nodes"],
+            "edges": state["edges"],
+            "documents": documents,
+            "batches": state["batches"],
+            "retries": self._retried,
+            "writers": self.writers,
+            "seconds": seconds,
+            "documents_per_second": documents / seconds if seconds > 0 else float(documents),
+        }
+        print(f"Loaded {documents} documents into {report['store']} in {seconds:.2f}s "
+              f"({report['documents_per_second']:,.0f} documents/s, {report['retries']} retries)")
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("store", help="sqlite:<path>, file:<directory> or an ArangoDB URL")
+    parser.add_argument("--source", default="./data/amazon0302.txt.gz", help="SNAP edge list to load")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--writers", type=int, default=4, help="concurrent batch writers")
+    parser.add_argument("--max-pending", type=int, help="batches in flight before reading pauses (default 2 per writer)")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--checkpoint", help="resume file (default: next to the source)")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    checkpoint = args.checkpoint or f"{args.source}.{re.sub(r'[^A-Za-z0-9]+', '_', store.describe())}.checkpoint"
+    loader = BulkLoader(store, batch_size=args.batch_size, writers=args.writers, max_pending=args.max_pending,
+                        retries=args.retries, checkpoint_path=checkpoint)
+    print(json.dumps(loader.load(args.source), indent=2))
+
+
+if __name__ == "__main__":
+    main()
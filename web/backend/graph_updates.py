@@ -0,0 +1,280 @@
+from collections import namedtuple
+
+import numpy as np
+
+from communities import relabel_by_size
+from csr_graph import CSRGraph
+
+# Describes one applied batch. Indices refer to the "extended" index space:
+# the nodes of the previous graph (0..num_previous-1) followed by the nodes
+# added in the batch. index_map takes an extended index to its index in the
+# new graph, or -1 if the node was removed.
+GraphChanges = namedtuple(
+    "GraphChanges",
+    ["num_previous", "index_map", "added_src", "added_dst", "removed_src", "removed_dst"],
+)
+
+
+def _member(sorted_keys, keys):
+    """Boolean mask of the keys that occur in the sorted key array"""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[pos] == keys
+
+
+def _last_per_key(keys, values):
+    """Unique keys with the value given last for each"""
+    keys, last = np.unique(keys[::-1], return_index=True)
+    return keys, values[::-1][last]
+
+
+def _edge_pairs(edges):
+    """(sources, targets) id arrays from a sequence of (source, target) pairs"""
+    pairs = np.asarray(edges if edges is not None else [], dtype=np.int64)
+    if pairs.size == 0:
+        pairs = pairs.reshape(0, 2)
+    if pairs.ndim != 2 or pairs.shape[1] != 2:
+        raise ValueError("Edges must be given as (source, target) pairs")
+    return pairs[:, 0], pairs[:, 1]
+
+
+def type_codes(names, vocabulary, count):
+    """Codes of type or relation names (NODE_TYPES / EDGE_RELATIONS), one per added item"""
+    if len(names) != count:
+        raise ValueError(f"Expected {count} type names, got {len(names)}")
+    unknown = sorted(set(names) - set(vocabulary))
+    if unknown:
+        raise ValueError(f"Unknown type(s) {unknown}, expected one of {vocabulary}")
+    return np.array([vocabulary.index(name) for name in names], dtype=np.int8)
+
+
+def apply_batch(graph, add_nodes=(), remove_nodes=(), add_edges=None, remove_edges=None,
+                add_node_types=None, add_edge_types=None):
+    """
+    Apply a batch of node and edge changes to a directed CSRGraph.
+
+    Nodes and edges are given by original node ids; edges as (source,
+    target) pairs. Additions are applied before removals. Endpoints of new
+    edges are added as nodes when missing, and removing a node also removes
+    its edges. Removing unknown nodes or edges is a no-op. Nodes of the
+    previous graph keep their relative order and new nodes are appended,
+    so arrays indexed by the old graph carry over with carry_over().
+
+    add_node_types and add_edge_types optionally give a type code for each
+    added node and edge (see type_codes()); adding an existing node or edge
+    with a type changes its type. Nodes and edges added without one are
+    products and co-purchase edges.
+
+    Returns (new_graph, changes).
+    """
+    if not graph.directed:
+        raise ValueError("Batch updates are only supported on directed graphs")
+
+    add_nodes = np.asarray(add_nodes, dtype=np.int64).ravel()
+    remove_nodes = np.asarray(remove_nodes, dtype=np.int64).ravel()
+    add_src, add_dst = _edge_pairs(add_edges)
+    remove_src, remove_dst = _edge_pairs(remove_edges)
+
+    num_previous = graph.number_of_nodes()
+    candidates = np.concatenate([add_nodes, add_src, add_dst])
+    new_ids = np.unique(candidates[graph.find(candidates) < 0])
+    node_ids = np.concatenate([graph.node_ids, new_ids])
+    num = len(node_ids)
+
+    def find(ids):
+        # Extended index of each id, -1 when it is neither old nor new
+        indices = graph.find(ids)
+        unknown = indices < 0
+        if len(new_ids) and unknown.any():
+            pos = np.minimum(np.searchsorted(new_ids, ids[unknown]), len(new_ids) - 1)
+            indices[unknown] = np.where(new_ids[pos] == ids[unknown], num_previous + pos, -1)
+        return indices
+
+    # Edges as packed (source, target) keys; the rows of a CSRGraph are
+    # sorted, so the keys of the previous graph come out sorted
+    src, dst = graph.edge_arrays()
+    old_keys = src.astype(np.int64) * num + dst
+
+    typed = graph.is_typed() or add_node_types is not None or add_edge_types is not None
+    node_types = edge_types = None
+    if typed:
+        node_types = np.concatenate([graph.node_types(), np.zeros(len(new_ids), dtype=np.int8)])
+        if add_node_types is not None:
+            nodes, types = _last_per_key(find(add_nodes), np.asarray(add_node_types, dtype=np.int8))
+            node_types[nodes] = types
+        edge_types = graph.edge_types().copy()
+
+    add_keys = find(add_src) * num + find(add_dst)
+    if add_edge_types is None:
+        add_types = np.zeros(len(add_keys), dtype=np.int8)
+    else:
+        add_types = np.asarray(add_edge_types, dtype=np.int8)
+    add_keys, add_types = _last_per_key(add_keys, add_types)
+    existing = _member(old_keys, add_keys)
+    added_keys = add_keys[~existing]
+    if typed:
+        if add_edge_types is not None:
+            # Re-adding an existing edge with a type changes its type
+            edge_types[np.searchsorted(old_keys, add_keys[existing])] = add_types[existing]
+        edge_types = np.concatenate([edge_types, add_types[~existing]])
+
+    rs, rd = find(remove_src), find(remove_dst)
+    known = (rs >= 0) & (rd >= 0)
+    removed_keys = np.unique(rs[known] * num + rd[known])
+
+    alive = np.ones(num, dtype=bool)
+    removed_nodes = find(remove_nodes)
+    alive[removed_nodes[removed_nodes >= 0]] = False
+
+    keys = np.concatenate([old_keys, added_keys])
+    drop = _member(removed_keys, keys) | ~alive[keys // num] | ~alive[keys % num]
+    removed = keys[drop]
+    kept = keys[~drop]
+
+    index_map = np.where(alive, np.cumsum(alive) - 1, -1)
+    new_graph = CSRGraph.from_indices(
+        node_ids[alive], index_map[kept // num], index_map[kept % num], directed=True,
+        node_types=node_types[alive] if typed else None,
+        edge_types=edge_types[~drop] if typed else None,
+    )
+    changes = GraphChanges(
+        num_previous, index_map,
+        added_keys // num, added_keys % num,
+        removed // num, removed % num,
+    )
+    return new_graph, changes
+
+
+def carry_over(values, changes, fill=0):
+    """Re-index a per-node array of the previous graph to the new graph, new nodes get `fill`"""
+    extended = np.full(len(changes.index_map), fill, dtype=np.asarray(values).dtype)
+    extended[:changes.num_previous] = values
+    return extended[changes.index_map >= 0]
+
+
+def update_degrees(in_degree, out_degree, changes):
+    """In- and out-degrees of the new graph from those of the previous one and the changes"""
+    num = len(changes.index_map)
+    alive = changes.index_map >= 0
+    degrees = []
+    for previous, added, removed in [
+        (in_degree, changes.added_dst, changes.removed_dst),
+        (out_degree, changes.added_src, changes.removed_src),
+    ]:
+        extended = np.zeros(num, dtype=np.int64)
+        extended[:changes.num_previous] = previous
+        extended += np.bincount(added, minlength=num) - np.bincount(removed, minlength=num)
+        degrees.append(extended[alive])
+    return tuple(degrees)
+
+
+def _find_roots(parent, groups):
+    """Follow union-find parent pointers up to the roots"""
+    roots = parent[groups]
+    while True:
+        above = parent[roots]
+        if np.array_equal(above, roots):
+            return roots
+        roots = above
+
+
+def _split_components(graph, labels, seeds):
+    """
+    Relabel the pieces that components fall apart into after edge removals.
+
+    seeds are the surviving endpoints of removed edges; every piece of a
+    component that lost edges contains one of them. A breadth-first search
+    grows a group from every seed, in both edge directions, and groups that
+    meet are merged. A group whose search runs out of nodes is a complete
+    piece and gets a new label. Once at most one group of a component is
+    still growing, the rest of the component is connected to it and keeps
+    the old label, so the search stops early when nothing split off or only
+    small pieces did.
+    """
+    n = len(labels)
+    k = len(seeds)
+    group = np.full(n, -1, dtype=np.int64)
+    group[seeds] = np.arange(k)
+    parent = np.arange(k)
+    seed_component = labels[seeds]
+    keeps_label = np.zeros(k, dtype=bool)
+    frontier = seeds
+
+    while len(frontier):
+        origins, neighbours = np.concatenate([graph.out_edges(frontier), graph.in_edges(frontier)], axis=1)
+        # Claim unvisited neighbours for the first group reaching them
+        fresh = group[neighbours] < 0
+        reached, first = np.unique(neighbours[fresh], return_index=True)
+        group[reached] = group[origins[fresh][first]]
+
+        # Merge every pair of groups that touch
+        a = _find_roots(parent, group[origins])
+        b = _find_roots(parent, group[neighbours])
+        while True:
+            cross = a != b
+            if not cross.any():
+                break
+            np.minimum.at(parent, np.maximum(a[cross], b[cross]), np.minimum(a[cross], b[cross]))
+            parent = _find_roots(parent, parent)
+            a, b = parent[a], parent[b]
+
+        # A component is settled once at most one of its groups still grows
+        growing = np.unique(_find_roots(parent, group[reached]))
+        per_component = np.bincount(seed_component[growing], minlength=int(labels.max()) + 1)
+        settled = per_component[seed_component[growing]] <= 1
+        keeps_label[growing[settled]] = True
+        frontier = reached[~settled[np.searchsorted(growing, _find_roots(parent, group[reached]))]]
+
+    # Every finished group that does not keep the old label is a piece of its own
+    labels = labels.copy()
+    visited = np.flatnonzero(group >= 0)
+    roots = _find_roots(parent, group[visited])
+    new_piece = ~keeps_label[roots]
+    labels[visited[new_piece]] = int(labels.max()) + 1 + roots[new_piece]
+    return labels
+
+
+def update_components(graph, labels, changes):
+    """
+    Weakly connected components of the new graph from those of the previous one.
+
+    Inserted edges merge the components they connect (union-find over the
+    component labels they touch). Removals can only split the components
+    they touch; those are searched from the endpoints of the removed edges
+    only as far as needed to find the pieces. Returns (labels, sizes)
+    numbered by decreasing size like CSRGraph.weakly_connected_components().
+    """
+    num = len(changes.index_map)
+    extended = np.empty(num, dtype=np.int64)
+    extended[:changes.num_previous] = labels
+    # Every new node starts out as its own component
+    first_new = int(labels.max()) + 1 if len(labels) else 0
+    extended[changes.num_previous:] = first_new + np.arange(num - changes.num_previous)
+
+    # Merge the components joined by new edges
+    a, b = extended[changes.added_src], extended[changes.added_dst]
+    cross = a != b
+    if cross.any():
+        touched, pairs = np.unique(np.concatenate([a[cross], b[cross]]), return_inverse=True)
+        pairs = pairs.ravel()
+        merged, _ = CSRGraph.from_indices(
+            touched, pairs[:cross.sum()], pairs[cross.sum():], directed=False
+        ).weakly_connected_components()
+        # Each merged group takes the smallest label among its members
+        root = np.full(int(merged.max()) + 1, np.iinfo(np.int64).max)
+        np.minimum.at(root, merged, touched)
+        remap = np.arange(int(extended.max()) + 1)
+        remap[touched] = root[merged]
+        extended = remap[extended]
+
+    # Find the pieces of the components that lost edges
+    alive = changes.index_map >= 0
+    labels = extended[alive]
+    ends = np.concatenate([changes.removed_src, changes.removed_dst])
+    seeds = np.unique(changes.index_map[ends[alive[ends]]])
+    if len(seeds):
+        labels = _split_components(graph, labels, seeds)
+
+    labels = relabel_by_size(labels)
+    return labels, np.bincount(labels)
@@ -0,0 +1,273 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+LouvainResult = namedtuple("LouvainResult", ["partition", "modularity", "levels"])
+
+# Edge entries below which a color class is not worth splitting across threads
+PARALLEL_MIN_EDGES = 200_000
+
+
+def _weighted_edges(graph):
+    """
+    Symmetric (src, dst, weight) arrays of an undirected CSRGraph with unit
+    weights. Self-loops are stored once with weight 2 so that row sums are
+    the node strengths, as in networkx.
+    """
+    src, dst = graph.edge_arrays()
+    src = src.astype(np.int64)
+    dst = dst.astype(np.int64)
+    weights = np.where(src == dst, 2.0, 1.0)
+    return src, dst, weights
+
+
+def modularity_from_edges(src, dst, weights, labels, resolution=1.0):
+    """Modularity of a partition given symmetric weighted edge arrays"""
+    total = weights.sum()
+    if total == 0:
+        return 0.0
+    num_labels = int(labels.max()) + 1 if len(labels) else 0
+    strength = np.bincount(src, weights=weights, minlength=len(labels))
+    sigma = np.bincount(labels, weights=strength, minlength=num_labels)
+    inside = labels[src] == labels[dst]
+    internal = weights[inside].sum()
+    return float(internal / total - resolution * np.square(sigma / total).sum())
+
+
+def modularity(graph, labels, resolution=1.0):
+    """Modularity of a node labelling of an undirected CSRGraph"""
+    src, dst, weights = _weighted_edges(graph)
+    return modularity_from_edges(src, dst, weights, np.asarray(labels), resolution)
+
+
+def _best_moves(src, dst, weights, comm, sigma, strength, total, resolution):
+    """
+    Best target community for every source node in the given edge slice.
+
+    Returns (nodes, targets, improvements) for the nodes whose best move
+    strictly improves modularity over staying where they are.
+    """
+    n = len(comm)
+    if len(src) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+
+    # Weight from each node to each neighbouring community; the packed keys
+    # come back sorted by node, one run of entries per node
+    keys, inverse = np.unique(src * n + comm[dst], return_inverse=True)
+    link = np.bincount(inverse.ravel(), weights=weights)
+    nodes = keys // n
+    targets = keys % n
+    own = comm[nodes] == targets
+    run_start = np.r_[True, nodes[1:] != nodes[:-1]]
+    run = np.cumsum(run_start) - 1
+    run_nodes = nodes[run_start]
+
+    # Gains relative to the node sitting alone in its own community
+    k = strength[run_nodes]
+    own_link = np.bincount(run, weights=np.where(own, link, 0.0))
+    stay = own_link - resolution * k * (sigma[comm[run_nodes]] - k) / total
+    gain = link - resolution * strength[nodes] * sigma[targets] / total
+    gain[own] = -np.inf
+
+    # Highest gain per node, ties going to the lowest community label
+    best_gain = np.maximum.reduceat(gain, np.flatnonzero(run_start))
+    candidates = np.flatnonzero(gain == best_gain[run])
+    best = candidates[np.r_[True, run[candidates][1:] != run[candidates][:-1]]]
+    improvement = gain[best] - stay
+    ok = improvement > 1e-12
+    return run_nodes[ok], targets[best][ok], improvement[ok]
+
+
+def _split_rows(src, parts):
+    """Cut points of a source-sorted edge array into row-aligned slices"""
+    parts = min(parts, len(src) // PARALLEL_MIN_EDGES)
+    if parts <= 1:
+        return [0, len(src)]
+    cuts = [0]
+    for i in range(1, parts):
+        pos = len(src) * i // parts
+        # Move the cut to the start of the row so no node is split
+        pos = int(np.searchsorted(src, src[pos], side="left"))
+        if pos > cuts[-1]:
+            cuts.append(pos)
+    cuts.append(len(src))
+    return cuts
+
+
+def _color_classes(src, dst, n, rng):
+    """
+    Split the nodes into independent sets (no edge inside a set) with the
+    Jones-Plassmann scheme: in every round, uncolored nodes whose random
+    priority beats all their uncolored neighbours form the next set.
+    """
+    priority = rng.permutation(n)
+    color = np.full(n, -1, dtype=np.int64)
+    uncolored = np.ones(n, dtype=bool)
+    rounds = 0
+    while uncolored.any():
+        live = uncolored[src] & uncolored[dst]
+        src, dst = src[live], dst[live]
+        blocked = np.zeros(n, dtype=bool)
+        blocked[src[priority[dst] > priority[src]]] = True
+        chosen = uncolored & ~blocked
+        color[chosen] = rounds
+        uncolored &= ~chosen
+        rounds += 1
+    return color
+
+
+def _local_moving(src, dst, weights, strength, total, resolution, rng, max_sweeps, tol, pool, workers):
+    """
+    Vectorized local-moving phase.
+
+    Nodes are grouped into independent sets; the best moves of all nodes in
+    one set are evaluated and applied at once. This approximates moving
+    them one by one: no two of them are adjacent, but their gains all use
+    the community totals (sigma) from before the set moved, so they are
+    stale once a node of the set joins or leaves a community another one
+    targets. The batch then gains less than the sum of its moves (which is
+    what `gained` adds up) and may even lose a little; in practice each
+    sweep still improves modularity, and the result can differ from
+    sequential Louvain. A sweep goes through every set, and only nodes next
+    to a move in the previous sweep are re-evaluated.
+    """
+    n = len(strength)
+    comm = np.arange(n)
+    sigma = strength.copy()
+    loops = src == dst
+    ls, ld, lw = src[~loops], dst[~loops], weights[~loops]
+
+    # Order the edges by (color of source, source) so that each color class
+    # owns a contiguous, row-aligned slice of the edge arrays
+    color = _color_classes(ls, ld, n, rng)
+    order = np.lexsort((ls, color[ls]))
+    ls, ld, lw = ls[order], ld[order], lw[order]
+    class_bounds = np.searchsorted(color[ls], np.arange(int(color.max()) + 2))
+
+    active = np.ones(n, dtype=bool)
+    sweeps = 0
+
+    while sweeps < max_sweeps and active.any():
+        sweeps += 1
+        touched = np.zeros(n, dtype=bool)
+        gained = 0.0
+        for lo, hi in zip(class_bounds[:-1], class_bounds[1:]):
+            if lo == hi:
+                continue
+            cs, cd, cw = ls[lo:hi], ld[lo:hi], lw[lo:hi]
+            sel = active[cs]
+            cs, cd, cw = cs[sel], cd[sel], cw[sel]
+
+            cuts = _split_rows(cs, workers)
+            slices = [(cs[a:b], cd[a:b], cw[a:b]) for a, b in zip(cuts[:-1], cuts[1:])]
+            if pool is not None and len(slices) > 1:
+                results = list(pool.map(
+                    lambda part: _best_moves(*part, comm, sigma, strength, total, resolution),
+                    slices,
+                ))
+            else:
+                results = [_best_moves(*part, comm, sigma, strength, total, resolution) for part in slices]
+            movers = np.concatenate([r[0] for r in results])
+            if len(movers) == 0:
+                continue
+            targets = np.concatenate([r[1] for r in results])
+            # Each improvement is half the modularity gain in units of 1 / total
+            gained += 2.0 * np.concatenate([r[2] for r in results]).sum() / total
+
+            moved_strength = strength[movers]
+            np.subtract.at(sigma, comm[movers], moved_strength)
+            np.add.at(sigma, targets, moved_strength)
+            comm[movers] = targets
+            touched[movers] = True
+
+        if not touched.any():
+            break
+        # Only nodes next to a move can have a new best community
+        active = touched.copy()
+        active[ld[touched[ls]]] = True
+
+        if gained < tol:
+            break
+
+    return comm, sweeps
+
+
+def _aggregate(src, dst, weights, comm):
+    """Collapse communities into nodes, summing the weights between them"""
+    num = int(comm.max()) + 1
+    keys, inverse = np.unique(comm[src] * num + comm[dst], return_inverse=True)
+    agg_weights = np.bincount(inverse.ravel(), weights=weights)
+    return keys // num, keys % num, agg_weights
+
+
+def louvain(graph, resolution=1.0, seed=None, max_levels=10, max_sweeps=50, tol=1e-7, workers=1):
+    """
+    Multi-level Louvain community detection on an undirected CSRGraph.
+
+    The local-moving phase is vectorized over NumPy edge arrays; with
+    workers > 1 the best-move evaluation runs on row-aligned slices of the
+    edges in a thread pool. The seed makes runs reproducible (results do not
+    depend on the number of workers).
+
+    Returns a LouvainResult whose partition labels every node of the graph
+    with a community numbered by decreasing size, the final modularity and
+    per-level statistics and timings.
+    """
+    n = graph.number_of_nodes()
+    if n == 0:
+        return LouvainResult(np.zeros(0, dtype=np.int32), 0.0, [])
+    if graph.directed:
+        graph = graph.to_undirected()
+
+    rng = np.random.default_rng(seed)
+    src, dst, weights = _weighted_edges(graph)
+    total = weights.sum()
+    membership = np.arange(n)
+    levels = []
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        for level in range(max_levels):
+            start = time.perf_counter()
+            strength = np.bincount(src, weights=weights, minlength=int(membership.max()) + 1)
+            if total == 0:
+                break
+            comm, sweeps = _local_moving(
+                src, dst, weights, strength, total, resolution, rng,
+                max_sweeps, tol, pool, workers,
+            )
+            _, comm = np.unique(comm, return_inverse=True)
+            comm = comm.ravel()
+            num_communities = int(comm.max()) + 1
+            improved = num_communities < len(strength)
+            if improved:
+                membership = comm[membership]
+                src, dst, weights = _aggregate(src, dst, weights, comm)
+            levels.append({
+                "level": level,
+                "nodes": len(strength),
+                "communities": num_communities,
+                "sweeps": sweeps,
+                "modularity": modularity_from_edges(
+                    src, dst, weights, np.arange(int(src.max()) + 1 if len(src) else 0), resolution
+                ),
+                "seconds": time.perf_counter() - start,
+            })
+            if not improved:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Number communities by decreasing size for stable presentation
+    sizes = np.bincount(membership)
+    order = np.argsort(-sizes, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    partition = rank[membership].astype(np.int32)
+
+    final = modularity(graph, partition, resolution)
+    return LouvainResult(partition, final, levels)
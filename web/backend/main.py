@@ -1,15 +1,56 @@
 
+import asyncio
 import os
-from typing import Dict, List, Optional, Union
-from fastapi import FastAPI, HTTPException
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uuid
 import json
 from datetime import datetime
+from analytics_cache import AnalyticsCache
+from compute_pool import ComputePool, PoolSaturatedError
+from export import StaleCursorError, check_format, iter_chunks, page_bounds
 from graph_analysis import AmazonGraphAnalyzer
+from graph_store import open_store
+from metrics import profiling, request_seconds, sample, server_timing, stage, stage_seconds
+from nx_qa import LLMError, NetworkXQA, make_llm, normalize_query
+from response_encoding import choose_encoding, encode_response, not_modified
+from shared_graph import ReadOnlyGraphError
 
-app = FastAPI(title="Supply Chain Resilience API")
+# Seconds clients are asked to wait before retrying a 503
+RETRY_AFTER = "5"
+
+# Background refinement of approximate metrics: seconds per pool job, and
+# the most pool time spent per metric and graph version
+APPROXIMATE_REFINE_SLICE = 1.0
+APPROXIMATE_REFINE_LIMIT = float(os.getenv("APPROXIMATE_REFINE_SECONDS", "60"))
+
+# Bounds on /approximate-stats: refinement that outlives the pool timeout
+# keeps its worker busy, and tighter precisions are never reached
+MAX_APPROXIMATE_BUDGET = float(os.getenv("APPROXIMATE_MAX_BUDGET", "5"))
+MIN_APPROXIMATE_PRECISION = 1e-4
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start the warm-up in the background and release the compute pool on shutdown"""
+    task = None
+    if os.getenv("WARMUP_ON_STARTUP", "1") != "0":
+        warmup["status"] = "running"
+        task = asyncio.create_task(run_warmup())
+    yield
+    for running in (task, refinement["task"]):
+        if running is not None:
+            running.cancel()
+    compute_pool.shutdown()
+    nx_qa.close()
+
+app = FastAPI(title="Supply Chain Resilience API", lifespan=lifespan)
 
 # Configure CORS to allow requests from the frontend
 app.add_middleware(
@@ -20,13 +61,225 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the graph analyzer
-graph_analyzer = AmazonGraphAnalyzer()
+class InstrumentationMiddleware:
+    """
+    Record request latency (until the response starts) per route. Requests
+    sent with `X-Profile: 1` get a Server-Timing header with the stages
+    computed on their behalf. Plain ASGI, so it adds no per-request task.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        profiled = (b"x-profile", b"1") in scope["headers"]
+
+        async def send_instrumented(message):
+            if message["type"] == "http.response.start":
+                seconds = time.perf_counter() - start
+                route = scope.get("route")
+                request_seconds.observe(
+                    seconds, scope["method"], route.path if route else "unmatched", str(message["status"])
+                )
+                if profiled:
+                    timing = server_timing(profile, seconds).encode()
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing)]
+            await send(message)
+
+        with profiling() as profile:
+            await self.app(scope, receive, send_instrumented)
+
+app.add_middleware(InstrumentationMiddleware)
+
+# Initialize the graph analyzer; with SHARED_GRAPH_DIR every worker process
+# attaches to one read-only copy of the graph instead of loading its own, and
+# with GRAPH_STORE the graph is read from a store filled by graph_store.py
+graph_analyzer = AmazonGraphAnalyzer(
+    shared_dir=os.getenv("SHARED_GRAPH_DIR") or None,
+    store=open_store(os.getenv("GRAPH_STORE")) if os.getenv("GRAPH_STORE") else None
+)
+
+# Blocking analyzer calls run on this pool so the event loop stays free
+compute_pool = ComputePool(
+    max_workers=int(os.getenv("ANALYTICS_WORKERS", "4")),
+    max_queue=int(os.getenv("ANALYTICS_MAX_QUEUE", "32")),
+    timeout=float(os.getenv("ANALYTICS_TIMEOUT", "60")),
+)
+
+# Questions answered by LLM-generated NetworkX programs, run in forked workers
+nx_qa = NetworkXQA(
+    graph_analyzer,
+    make_llm(),
+    workers=int(os.getenv("NX_QA_WORKERS", "2")),
+    cpu_seconds=float(os.getenv("NX_QA_CPU_SECONDS", "10")),
+    memory_mb=int(os.getenv("NX_QA_MEMORY_MB", "1024")),
+    cache_ttl=float(os.getenv("NX_QA_CACHE_TTL", "3600")),
+    rebuild_seconds=float(os.getenv("NX_QA_REBUILD_SECONDS", "30")),
+)
+
+# Pre-encoded response bodies per graph version and request key, kept apart
+# from the analytics cache so paging through results cannot evict the
+# intermediates those results are computed from
+encoded_responses = AnalyticsCache(max_entries=int(os.getenv("ENCODED_RESPONSE_CACHE_ENTRIES", "512")))
+
+# Warm-up progress; "idle" when no warm-up was started, in which case
+# requests load the graph and compute analytics on demand
+warmup = {"status": "idle", "stage": None, "completed": [], "error": None, "started_at": None, "seconds": None}
+
+# Last successful response per request key, served while warm-up is running
+MAX_REMEMBERED_RESPONSES = 256
+remembered_responses = OrderedDict()
+
+def warmup_stages():
+    """The standard analytics computed at startup, keyed like the endpoints that serve them"""
+    return [
+        ("graph-stats", ("graph-stats",), graph_analyzer.get_basic_stats, {}),
+        ("communities", ("communities", "louvain", 10), graph_analyzer.get_community_detection,
+         {"algorithm": "louvain", "max_communities": 10}),
+        ("risk-analysis", ("risk-analysis", 10, 0, None, None), graph_analyzer.get_risk_analysis,
+         {"num_suppliers": 10}),
+    ]
+
+async def run_warmup():
+    """Load the graph and precompute the standard analytics, recording progress for /ready"""
+    start = time.perf_counter()
+    warmup["started_at"] = datetime.now().isoformat()
+    stage = "load_graph"
+    try:
+        warmup["stage"] = stage
+        await compute_pool.run("load_graph", graph_analyzer.ensure_graph, timeout=None)
+        warmup["completed"].append({"stage": stage, "seconds": time.perf_counter() - start})
+        for stage, key, fn, kwargs in warmup_stages():
+            warmup["stage"] = stage
+            stage_start = time.perf_counter()
+            remember_response(key, await compute_pool.run(key, encoded_analytics, key, fn, timeout=None, **kwargs))
+            warmup["completed"].append({"stage": stage, "seconds": time.perf_counter() - stage_start})
+        warmup["status"] = "ready"
+        print(f"Warm-up finished in {time.perf_counter() - start:.1f}s")
+        # Keep what warm-up computed in the snapshot for the next start
+        await compute_pool.run(None, graph_analyzer.persist_analytics, timeout=None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Fall back to computing on demand rather than refusing requests forever
+        warmup["status"] = "failed"
+        warmup["error"] = f"{stage}: {e}"
+        print(f"Warm-up failed during {stage}: {e}")
+    finally:
+        warmup["stage"] = None
+        warmup["seconds"] = time.perf_counter() - start
+
+def remember_response(key, value):
+    remembered_responses[key] = value
+    remembered_responses.move_to_end(key)
+    while len(remembered_responses) > MAX_REMEMBERED_RESPONSES:
+        remembered_responses.popitem(last=False)
+
+async def run_analytics(key, fn, *args, **kwargs):
+    """Run a blocking analyzer call on the compute pool, loading the graph first if needed"""
+    if warmup["status"] == "running":
+        # Never block behind the warm-up: answer from an earlier result or ask to retry
+        if key in remembered_responses:
+            return remembered_responses[key]
+        raise HTTPException(
+            status_code=503,
+            detail=f"Warming up ({warmup['stage']})",
+            headers={"Retry-After": RETRY_AFTER},
+        )
+    try:
+        if graph_analyzer.graph is None:
+            # Loading can take much longer than one analytics call, so it is not timed out
+            await compute_pool.run("load_graph", graph_analyzer.ensure_graph, timeout=None)
+        result = await compute_pool.run(key, fn, *args, **kwargs)
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": RETRY_AFTER})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analytics computation timed out")
+    if key is not None:
+        remember_response(key, result)
+    return result
+
+def encoded_analytics(key, fn, cache=True, **kwargs):
+    """fn(**kwargs) encoded as a response body once per graph version and request key (every time without cache)"""
+    def compute():
+        value = fn(**kwargs)
+        with stage("serialize"):
+            return encode_response(value)
+    if not cache:
+        return compute()
+    graph_analyzer.ensure_graph()
+    with graph_analyzer.pinned() as state:
+        return encoded_responses.get_or_compute(state.version, "encoded_response", compute, key=key)
+
+async def serve_encoded(request, key, fn, cache=True, **kwargs):
+    """Serve a pre-encoded analytics result with a strong ETag, answering If-None-Match with 304"""
+    encoded = await run_analytics(key, encoded_analytics, key, fn, cache, **kwargs)
+    coding = choose_encoding(encoded, request.headers.get("accept-encoding"))
+    body, etag = encoded.variants[coding]
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if not_modified(encoded, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Background refinement of approximate metrics: the metrics waiting for it
+# (metric -> (graph version, precision)) and the pool time spent per
+# (metric, graph version)
+refinement = {"task": None, "backlog": {}, "spent": {}}
+
+def schedule_refinement(metrics, graph_version, precision):
+    for metric in metrics:
+        refinement["backlog"][metric] = (graph_version, precision)
+    if refinement["task"] is None or refinement["task"].done():
+        refinement["task"] = asyncio.create_task(refine_in_background())
+
+async def refine_in_background():
+    """
+    Refine the backlogged metrics round-robin, one pool slice at a time.
+    Only one slice runs at once, and none while all workers are busy, so
+    interactive requests keep priority.
+    """
+    backlog = refinement["backlog"]
+    while backlog:
+        if compute_pool.pending >= compute_pool.max_workers:
+            await asyncio.sleep(APPROXIMATE_REFINE_SLICE)
+            continue
+        metric = next(iter(backlog))
+        graph_version, precision = backlog[metric] = backlog.pop(metric)
+        key = (metric, graph_version)
+        if graph_version != graph_analyzer.graph_version:
+            del backlog[metric]
+            refinement["spent"].pop(key, None)
+            continue
+        if refinement["spent"].get(key, 0) >= APPROXIMATE_REFINE_LIMIT:
+            del backlog[metric]
+            continue
+        try:
+            precise = await compute_pool.run(
+                None, graph_analyzer.refine_approximate, metric, APPROXIMATE_REFINE_SLICE, precision, timeout=None
+            )
+        except PoolSaturatedError:
+            await asyncio.sleep(APPROXIMATE_REFINE_SLICE)
+            continue
+        except Exception as e:
+            print(f"Refining {metric} failed: {e}")
+            precise = True
+        refinement["spent"][key] = refinement["spent"].get(key, 0) + APPROXIMATE_REFINE_SLICE
+        if precise:
+            backlog.pop(metric, None)
 
 # Request and response models
 class QueryRequest(BaseModel):
     query: str
 
+class QueryBatchRequest(BaseModel):
+    queries: List[str]
+    stream: bool = False  # stream results as NDJSON as they complete
+
 class RiskScore(BaseModel):
     supplier: str
     score: float
@@ -43,6 +296,22 @@ class VisualData(BaseModel):
     riskScores: Optional[List[RiskScore]] = None
     basicStats: Optional[Dict] = None
 
+class GraphUpdate(BaseModel):
+    add_nodes: List[int] = []
+    remove_nodes: List[int] = []
+    add_edges: List[Tuple[int, int]] = []
+    remove_edges: List[Tuple[int, int]] = []
+    add_node_types: Optional[List[str]] = None  # "product", "supplier" or "event" per added node
+    add_edge_relations: Optional[List[str]] = None  # "co_purchased", "supplies" or "impacts" per added edge
+
+class ImpactRequest(BaseModel):
+    scenarios: List[List[int]]  # seed node ids (events or suppliers) per scenario
+    max_depth: int = 4
+    spillover_hops: int = 0
+    decay: float = 0.5
+    top_communities: int = 5
+    sample_products: int = 10
+
 class QueryResponse(BaseModel):
     type: str  # "simple", "complex", or "hybrid"
     text: str
@@ -121,17 +390,36 @@ def process_simple_query(query: str) -> QueryResponse:
                 type="simple",
                 text="Socks are supplied by Adidas (70% of production) and SupplierX (30% of production)."
             )
-        elif "strike" in query:
-            return QueryResponse(
-                type="simple",
-                text="The Strike_China_2025 event would directly impact 3 suppliers: Nike (primary impact: 80% production capacity affected), Adidas (secondary impact: 45% production capacity affected), and SupplierX (minimal impact: 15% production capacity affected). These suppliers collectively provide 70% of your total product inventory. Recommended action: Establish emergency procurement procedures with alternative suppliers in Southeast Asia."
-            )
+        elif "strike" in query or "disruption" in query:
+            return describe_disruptions()
         else:
             return QueryResponse(
                 type="simple",
                 text=f"Based on your query '{query}', I found relevant supply chain information from our graph database. Please refer to the details in the results section."
             )
 
+def describe_disruptions(max_events: int = 100) -> QueryResponse:
+    """Simulate every disruption event in the graph and describe the most damaging one"""
+    events = graph_analyzer.nodes_of_type("event")[:max_events]
+    if not events:
+        return QueryResponse(
+            type="simple",
+            text="The graph contains no disruption events yet. Add event and supplier nodes with "
+                 "`impacts` and `supplies` edges through /graph-updates to simulate their impact."
+        )
+    impact = graph_analyzer.get_impact_analysis([[event] for event in events], spillover_hops=1)
+    worst = max(impact["scenarios"], key=lambda scenario: scenario["impact_percentage"])
+    response_text = (
+        f"Simulated {len(events)} disruption event(s). Event {worst['seeds'][0]} has the largest impact: "
+        f"it affects {worst['affected_suppliers']} suppliers and {worst['affected_products']} products directly "
+        f"({worst['inventory_percentage']:.2f}% of the product inventory), and {worst['spillover_products']} "
+        f"co-purchased products indirectly."
+    )
+    if worst["communities"]:
+        top = worst["communities"][0]
+        response_text += f" Community {top['id']} is hit hardest with {top['products']} affected products."
+    return QueryResponse(type="simple", text=response_text)
+
 def process_complex_query(query: str) -> QueryResponse:
     """Process a complex query using Louvain community detection"""
     # Get community detection results
@@ -206,23 +494,154 @@ def determine_query_type(query: str) -> str:
     # Default to simple queries
     return "simple"
 
+QUERY_HANDLERS = {
+    "simple": process_simple_query,
+    "complex": process_complex_query,
+    "hybrid": process_hybrid_query,
+}
+
+# Analytics each query type reads, as (analyzer method, keyword arguments)
+QUERY_ANALYTICS = {
+    "simple": [("get_basic_stats", {})],
+    "complex": [
+        ("get_community_detection", {"algorithm": "louvain", "max_communities": 5}),
+        ("get_risk_analysis", {"num_suppliers": 5}),
+    ],
+    "hybrid": [
+        ("get_basic_stats", {}),
+        ("get_community_detection", {"algorithm": "louvain", "max_communities": 3}),
+        ("get_risk_analysis", {"num_suppliers": 3}),
+    ],
+}
+
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "100"))
+
+def plan_query_batch(queries):
+    """Query type of every query and the union of the analytics they need, in first-use order"""
+    query_types = [determine_query_type(query) for query in queries]
+    planned = {}
+    for query_type in query_types:
+        for method, params in QUERY_ANALYTICS[query_type]:
+            planned.setdefault((method, tuple(sorted(params.items()))), params)
+    return query_types, [(method, params) for (method, _), params in planned.items()]
+
+def run_query_batch(queries, emit=None):
+    """
+    Answer many queries against one graph snapshot.
+
+    The analytics the queries need are computed once, up front, after which
+    every handler reads them from the analytics cache; repeated queries are
+    answered once. Updates applied meanwhile do not affect the batch. emit, when
+    given, receives the header, every result and the summary as soon as
+    each is ready; the full batch is also returned.
+    """
+    emit = emit or (lambda item: None)
+    start = time.perf_counter()
+    with graph_analyzer.snapshot() as graph_version:
+        query_types, planned = plan_query_batch(queries)
+        header = {
+            "graph_version": graph_version,
+            "num_queries": len(queries),
+            "plan": [method for method, _ in planned],
+        }
+        emit(header)
+        
+        analytics = []
+        for method, params in planned:
+            began = time.perf_counter()
+            entry = {"name": method, "params": params}
+            try:
+                getattr(graph_analyzer, method)(**params)
+            except Exception as e:
+                # The queries that need it report the error themselves
+                entry["error"] = str(e)
+            entry["seconds"] = time.perf_counter() - began
+            analytics.append(entry)
+        
+        results = []
+        answered = {}
+        for index, (query, query_type) in enumerate(zip(queries, query_types)):
+            began = time.perf_counter()
+            key = (query_type, query.lower())
+            repeated = key in answered
+            if not repeated:
+                try:
+                    answered[key] = QUERY_HANDLERS[query_type](query)
+                except Exception as e:
+                    answered[key] = QueryResponse(type=query_type, text="", error=str(e))
+            result = {
+                "index": index,
+                "query": query,
+                "type": query_type,
+                "repeated": repeated,
+                "seconds": time.perf_counter() - began,
+                "response": answered[key],
+            }
+            emit(result)
+            results.append(result)
+    
+    summary = {"analytics": analytics, "seconds": time.perf_counter() - start}
+    emit(summary)
+    return {**header, "results": results, **summary}
+
+async def stream_query_batch(header, lines, batch):
+    """NDJSON lines of a running batch; a failure after the header becomes an error line"""
+    yield json.dumps(jsonable_encoder(header)) + "\n"
+    while True:
+        line = asyncio.ensure_future(lines.get())
+        await asyncio.wait({line, batch}, return_when=asyncio.FIRST_COMPLETED)
+        if not line.done() and batch.exception() is not None:
+            line.cancel()
+            error = batch.exception()
+            detail = error.detail if isinstance(error, HTTPException) else str(error)
+            yield json.dumps({"error": detail}) + "\n"
+            return
+        item = await line
+        yield json.dumps(jsonable_encoder(item)) + "\n"
+        if "analytics" in item:
+            return
+
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process a natural language query about the supply chain graph"""
     try:
-        # Ensure the graph is loaded
-        if graph_analyzer.graph is None:
-            # This will load the graph on first API call
-            graph_analyzer.load_graph()
-        
         query_type = determine_query_type(request.query)
+        handler = QUERY_HANDLERS[query_type]
+        return await run_analytics(("query", query_type, request.query.lower()), handler, request.query)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/query/batch")
+async def process_query_batch(request: QueryBatchRequest):
+    """Answer many queries against one graph snapshot, computing the analytics they share once"""
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        if not request.stream:
+            return await run_analytics(
+                ("query-batch", tuple(query.lower() for query in request.queries)),
+                run_query_batch,
+                request.queries
+            )
         
-        if query_type == "complex":
-            return process_complex_query(request.query)
-        elif query_type == "hybrid":
-            return process_hybrid_query(request.query)
-        else:
-            return process_simple_query(request.query)
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+        emit = lambda item: loop.call_soon_threadsafe(lines.put_nowait, item)
+        batch = asyncio.ensure_future(run_analytics(None, run_query_batch, request.queries, emit=emit))
+        # Wait for the header so that warm-up or a full pool still get a proper status code
+        header = asyncio.ensure_future(lines.get())
+        await asyncio.wait({header, batch}, return_when=asyncio.FIRST_COMPLETED)
+        if not header.done() and batch.exception() is not None:
+            header.cancel()
+            batch.result()
+        return StreamingResponse(
+            stream_query_batch(await header, lines, batch),
+            media_type="application/x-ndjson"
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -231,42 +650,295 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: stage and request latency histograms, cache, pool and graph gauges"""
+    cache = graph_analyzer.cache_stats()
+    pool = compute_pool.stats()
+    graph = graph_analyzer.graph
+    lines = stage_seconds.render() + request_seconds.render()
+    lines += sample("analytics_cache_hits_total", "counter", "Analytics cache hits", cache["hits"])
+    lines += sample("analytics_cache_misses_total", "counter", "Analytics cache misses", cache["misses"])
+    lines += sample("analytics_cache_hit_ratio", "gauge", "Analytics cache hit ratio", cache["hit_ratio"])
+    lines += sample("analytics_cache_entries", "gauge", "Entries in the analytics cache", cache["entries"])
+    lines += sample("pool_pending", "gauge", "Analytics calls queued or running", pool["pending"])
+    lines += sample("pool_workers", "gauge", "Compute pool worker threads", pool["workers"])
+    lines += sample("pool_submitted_total", "counter", "Analytics calls submitted", pool["submitted"])
+    lines += sample("pool_coalesced_total", "counter", "Calls that shared an in-flight computation", pool["coalesced"])
+    lines += sample("pool_rejected_total", "counter", "Calls rejected with 503", pool["rejected"])
+    lines += sample("pool_timeouts_total", "counter", "Calls that timed out with 504", pool["timeouts"])
+    lines += sample("graph_nodes", "gauge", "Nodes in the loaded graph", graph.number_of_nodes() if graph else 0)
+    lines += sample("graph_edges", "gauge", "Edges in the loaded graph", graph.number_of_edges() if graph else 0)
+    lines += sample("graph_version", "gauge", "Version of the loaded graph", cache["graph_version"])
+    if "shared_generation" in cache:
+        lines += sample("shared_generation", "gauge", "Shared graph generation this worker is attached to",
+                        cache["shared_generation"])
+    lines += sample("ready", "gauge", "1 once warm-up is no longer running", int(warmup["status"] != "running"))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint reporting warm-up progress; 503 until the standard analytics are computed"""
+    body = {
+        "ready": warmup["status"] != "running",
+        "status": warmup["status"],
+        "stage": warmup["stage"],
+        "completed": warmup["completed"],
+        "pending": [],
+        "started_at": warmup["started_at"],
+        "seconds": warmup["seconds"],
+        "error": warmup["error"],
+        "graph_version": graph_analyzer.graph_version,
+    }
+    if warmup["status"] == "running":
+        done = {entry["stage"] for entry in warmup["completed"]}
+        body["pending"] = [stage for stage in ["load_graph"] + [s[0] for s in warmup_stages()] if stage not in done]
+    if body["ready"]:
+        return body
+    return JSONResponse(status_code=503, content=body, headers={"Retry-After": RETRY_AFTER})
+
 @app.get("/graph-stats")
-async def get_graph_stats():
+async def get_graph_stats(request: Request):
     """Get basic statistics about the graph"""
     try:
-        if graph_analyzer.graph is None:
-            graph_analyzer.load_graph()
-        
-        stats = graph_analyzer.get_basic_stats()
-        return stats
+        return await serve_encoded(request, ("graph-stats",), graph_analyzer.get_basic_stats)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """Get hit/miss counters of the analytics and response caches and the compute pool"""
+    stats = graph_analyzer.cache_stats()
+    stats["encoded_responses"] = encoded_responses.stats()
+    stats["pool"] = compute_pool.stats()
+    stats["nx_qa"] = nx_qa.stats()
+    return stats
+
 @app.get("/communities")
-async def get_communities(algorithm: str = "louvain", max_communities: int = 10):
+async def get_communities(request: Request, algorithm: str = "louvain", max_communities: int = 10):
     """Get community detection results"""
     try:
-        if graph_analyzer.graph is None:
-            graph_analyzer.load_graph()
-        
-        communities = graph_analyzer.get_community_detection(
+        return await serve_encoded(
+            request,
+            ("communities", algorithm, max_communities),
+            graph_analyzer.get_community_detection,
             algorithm=algorithm,
             max_communities=max_communities
         )
-        return communities
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/community-graph")
+async def get_community_graph(request: Request, algorithm: str = "louvain", max_communities: int = 50,
+                              min_weight: int = 1):
+    """Communities as a weighted graph with sizes, risk aggregates and cached layout positions"""
+    try:
+        return await serve_encoded(
+            request,
+            ("community-graph", algorithm, max_communities, min_weight),
+            graph_analyzer.get_community_graph,
+            algorithm=algorithm,
+            max_communities=max_communities,
+            min_weight=min_weight
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ego-graph/{node}")
+async def get_ego_graph(request: Request, node: int, hops: int = 2, max_nodes: int = 200):
+    """The laid-out neighbourhood of a product or supplier within `hops`, at most max_nodes nodes"""
+    try:
+        return await serve_encoded(
+            request,
+            ("ego-graph", node, hops, max_nodes),
+            graph_analyzer.get_ego_graph,
+            # One per node: cheap to recompute, and caching them would let a
+            # crawl evict every other response
+            cache=False,
+            node=node,
+            hops=hops,
+            max_nodes=max_nodes
+        )
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/risk-analysis")
-async def get_risk_analysis(num_suppliers: int = 10):
-    """Get risk analysis results"""
+async def get_risk_analysis(request: Request, num_suppliers: int = 10, offset: int = 0,
+                            min_score: Optional[float] = None, community: Optional[int] = None):
+    """Get risk analysis results, highest risk first, paginated with offset and num_suppliers"""
     try:
-        if graph_analyzer.graph is None:
-            graph_analyzer.load_graph()
-        
-        risks = graph_analyzer.get_risk_analysis(num_suppliers=num_suppliers)
-        return risks
+        return await serve_encoded(
+            request,
+            ("risk-analysis", num_suppliers, offset, min_score, community),
+            graph_analyzer.get_risk_analysis,
+            num_suppliers=num_suppliers,
+            offset=offset,
+            min_score=min_score,
+            community=community
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/pagerank")
+async def get_pagerank(seeds: Optional[str] = None, alpha: float = 0.85, top_k: int = 10):
+    """Get top nodes by PageRank, optionally personalized on comma-separated seed node ids"""
+    try:
+        seed_ids = [int(seed) for seed in seeds.split(",") if seed.strip()] if seeds else None
+        return await run_analytics(
+            ("pagerank", tuple(seed_ids or ()), alpha, top_k),
+            graph_analyzer.get_pagerank,
+            seeds=seed_ids,
+            alpha=alpha,
+            top_k=top_k
+        )
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/export/{dataset}")
+async def export_dataset(dataset: str, format: str = "ndjson", cursor: Optional[str] = None, limit: int = 100000,
+                         algorithm: str = "louvain"):
+    """
+    Stream a full dataset (community-assignments, community-members or
+    degree-histogram) as NDJSON or Arrow IPC, one page of at most `limit`
+    rows per request; X-Next-Cursor continues with the next page.
+    """
+    try:
+        check_format(format)
+        graph_version, table = await run_analytics(None, graph_analyzer.export_table, dataset, algorithm=algorithm)
+        start, stop, next_cursor = page_bounds(table, graph_version, cursor, limit)
+        headers = {"X-Graph-Version": str(graph_version), "X-Total-Rows": str(len(table))}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        media_type = "application/x-ndjson" if format == "ndjson" else "application/vnd.apache.arrow.stream"
+        return StreamingResponse(iter_chunks(table, start, stop, format), media_type=media_type, headers=headers)
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except StaleCursorError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/approximate-stats")
+async def get_approximate_stats(metrics: Optional[str] = None, budget: float = 0.1, precision: float = 0.01,
+                                top_k: int = 10):
+    """
+    Sampled estimates with 95% confidence intervals of clustering, betweenness,
+    effective diameter and reachability; refined in the background until
+    within `precision`
+    """
+    try:
+        names = [name.strip() for name in metrics.split(",") if name.strip()] if metrics else None
+        max_budget = min(MAX_APPROXIMATE_BUDGET, compute_pool.timeout)
+        if not 0 <= budget <= max_budget:
+            raise ValueError(f"budget must be between 0 and {max_budget:g} seconds")
+        if precision < MIN_APPROXIMATE_PRECISION:
+            raise ValueError(f"precision must be at least {MIN_APPROXIMATE_PRECISION:g}")
+        # Never coalesced: every call refines the estimates further
+        result = await run_analytics(
+            None,
+            graph_analyzer.get_approximate_stats,
+            metrics=names,
+            budget=budget,
+            precision=precision,
+            top_k=top_k
+        )
+        schedule_refinement(result["refining"], result["graph_version"], precision)
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/nx-query")
+async def answer_with_networkx(request: QueryRequest):
+    """Answer a graph question with an LLM-generated NetworkX program, run in an isolated worker"""
+    try:
+        # Identical questions in flight share one answer
+        return await run_analytics(("nx-query", normalize_query(request.query)), nx_qa.ask, request.query)
+    except HTTPException:
+        raise
+    except LLMError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/graph-updates")
+async def update_graph(update: GraphUpdate):
+    """Add or remove nodes and edges in one batch; degrees, components and PageRank are updated incrementally"""
+    try:
+        # Updates are never coalesced with each other
+        return await run_analytics(
+            None,
+            graph_analyzer.apply_updates,
+            add_nodes=update.add_nodes,
+            remove_nodes=update.remove_nodes,
+            add_edges=update.add_edges,
+            remove_edges=update.remove_edges,
+            add_node_types=update.add_node_types,
+            add_edge_relations=update.add_edge_relations
+        )
+    except HTTPException:
+        raise
+    except ReadOnlyGraphError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/impact")
+async def simulate_impact(request: ImpactRequest):
+    """Simulate disruption scenarios: which suppliers, products and communities each set of seeds affects"""
+    try:
+        return await run_analytics(
+            ("impact", tuple(tuple(scenario) for scenario in request.scenarios), request.max_depth,
+             request.spillover_hops, request.decay, request.top_communities, request.sample_products),
+            graph_analyzer.get_impact_analysis,
+            request.scenarios,
+            max_depth=request.max_depth,
+            spillover_hops=request.spillover_hops,
+            decay=request.decay,
+            top_communities=request.top_communities,
+            sample_products=request.sample_products
+        )
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
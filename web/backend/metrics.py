@@ -0,0 +1,117 @@
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "supply_chain_"
+
+
+class Histogram:
+    """Prometheus-style histogram, one set of buckets per label combination; thread-safe"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = METRIC_PREFIX + name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def sample(name, kind, help_text, value):
+    """Exposition lines of a single unlabeled gauge or counter"""
+    name = METRIC_PREFIX + name
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+stage_seconds = Histogram("stage_seconds", "Time spent computing analytics stages", ["stage"])
+request_seconds = Histogram(
+    "request_seconds", "HTTP request latency until the response starts", ["method", "route", "status"]
+)
+
+# Stage timings of the request being profiled, if any. The compute pool
+# runs work in a copy of the submitting context, so stages computed on a
+# worker thread are recorded for the request that submitted them.
+_profile = contextvars.ContextVar("profile", default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as analytics stage `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, name)
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((name, seconds))
+
+
+def timed(name):
+    """Decorator timing every call of a function as stage `name`"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def profiling():
+    """Collect (stage, seconds) of every stage computed on behalf of this context"""
+    profile = []
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def server_timing(profile, total):
+    """
+    Server-Timing header value for a profile: time per stage, summed over
+    repeated stages, in order of first use. Stages nest (Louvain runs inside
+    community detection), so their durations overlap.
+    """
+    durations = {}
+    for name, seconds in profile:
+        durations[name] = durations.get(name, 0.0) + seconds
+    entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
@@ -0,0 +1,537 @@
+"""
+Answer graph questions with LLM-generated NetworkX programs.
+
+The notebook's text_to_nx_algorithm_to_text tool as a backend service: an
+LLM writes a NetworkX program for the question, the program runs against
+the graph, and the LLM phrases its FINAL_RESULT as an answer. Programs are
+cached by normalized question and graph schema, answers additionally by
+graph version, both with LRU and TTL eviction. Programs run in worker
+processes forked by a helper that builds the NetworkX graph from a
+snapshot, so they share it copy-on-write, and run under CPU time and
+memory limits, so a runaway algorithm costs one worker, not the server.
+Set NX_QA_LLM=stub to run without network access.
+"""
+import gc
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import queue
+import re
+import resource
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from types import MappingProxyType
+
+import networkx as nx
+import numpy as np
+import requests
+
+from graph_snapshot import load_snapshot
+
+# FINAL_RESULT is passed on (and returned) as text, cut to this length
+MAX_RESULT_CHARS = 2000
+
+# Outcome of running one program: status is "ok", "error", "cpu_limit",
+# "memory_limit", "timeout" or "crashed"; result is FINAL_RESULT as text,
+# or the error message
+ExecutionResult = namedtuple("ExecutionResult", ["status", "result", "seconds"])
+
+
+class LLMError(Exception):
+    """Raised when the language model cannot be reached or is not configured"""
+
+
+class PoolClosedError(RuntimeError):
+    """Raised when running a program on an execution pool that was replaced or broke meanwhile"""
+
+
+def normalize_query(query):
+    """Cache key form of a question: lower case, single spaces, no trailing punctuation"""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?.! ")
+
+
+def schema_hash(schema):
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def clean_program(text):
+    """Strip the markdown code fences models like to add"""
+    return re.sub(r"^```(?:python)?\n|```$", "", text.strip(), flags=re.MULTILINE).strip()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ttl seconds after they were stored"""
+
+    def __init__(self, max_entries=256, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+PROGRAM_PROMPT = """
+I have a NetworkX Graph called `G_adb`. It has the following schema: {schema}
+I have a precomputed Louvain community map called `community_map`.
+
+I have the following graph analysis query: {query}.
+
+Generate the Python Code required to answer the query using the `G_adb` object and `community_map`.
+
+Be very precise on the NetworkX algorithm you select to answer this query. Think step by step.
+
+Only assume that networkx is installed, and other base python dependencies.
+
+Always set the last variable as `FINAL_RESULT`, which represents the answer to the original query.
+
+Only provide python code that I can directly execute via `exec()`. Do not provide any instructions.
+
+Make sure that `FINAL_RESULT` stores a short & concise answer. Avoid setting this variable to a long sequence.
+
+Your code:
+"""
+
+ANSWER_PROMPT = """
+I have a NetworkX Graph called `G_adb`. It has the following schema: {schema}
+
+I have the following graph analysis query: {query}.
+
+I have executed the following python code to help me answer my query:
+
+---
+{program}
+---
+
+The `FINAL_RESULT` variable is set to the following: {result}.
+
+Based on my original Query and FINAL_RESULT, generate a short and concise response to
+answer my query.
+
+Your response:
+"""
+
+
+class OpenAIChat:
+    """The two LLM round-trips, through the OpenAI chat completions API"""
+
+    def __init__(self, model="gpt-4o", api_key=None, base_url="https://api.openai.com/v1", timeout=60.0):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def complete(self, prompt):
+        if not self.api_key:
+            raise LLMError("OPENAI_API_KEY is not set")
+        try:
+            response = requests.post(
+                f"{self.base_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={"model": self.model, "temperature": 0, "messages": [{"role": "user", "content": prompt}]},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+        except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+            raise LLMError(f"LLM request failed: {e}")
+
+    def generate_program(self, query, schema):
+        return clean_program(self.complete(PROGRAM_PROMPT.format(schema=schema, query=query)))
+
+    def answer(self, query, schema, program, result):
+        return self.complete(ANSWER_PROMPT.format(schema=schema, query=query, program=program, result=result))
+
+
+class StubLLM:
+    """
+    Offline stand-in for the LLM: programs come from a table keyed by
+    normalized question (default_program otherwise) and the answer is
+    FINAL_RESULT itself. Counts its calls, so cache behaviour can be checked.
+    """
+
+    def __init__(self, programs=None, default_program="FINAL_RESULT = G_adb.number_of_nodes()"):
+        self.programs = {normalize_query(query): program for query, program in (programs or {}).items()}
+        self.default_program = default_program
+        self.calls = 0
+
+    def generate_program(self, query, schema):
+        self.calls += 1
+        return self.programs.get(normalize_query(query), self.default_program)
+
+    def answer(self, query, schema, program, result):
+        self.calls += 1
+        return f"The answer to '{query}' is {result}."
+
+
+def make_llm():
+    """The LLM configured by NX_QA_LLM ("openai" or "stub") and OPENAI_API_KEY / NX_QA_MODEL"""
+    if os.getenv("NX_QA_LLM", "openai") == "stub":
+        return StubLLM()
+    return OpenAIChat(model=os.getenv("NX_QA_MODEL", "gpt-4o"), api_key=os.getenv("OPENAI_API_KEY"))
+
+
+class _CpuLimitExceeded(BaseException):
+    """Raised in a worker by SIGXCPU; a BaseException so programs cannot swallow it with `except Exception`"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CpuLimitExceeded()
+
+
+def _describe(value):
+    text = str(value)
+    return text if len(text) <= MAX_RESULT_CHARS else text[:MAX_RESULT_CHARS] + "..."
+
+
+def _worker_main(conn, namespace, cpu_seconds, memory_bytes):
+    """Run programs received on conn, one at a time, each under a fresh CPU time allowance"""
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    # Handlers inherited from the server must not run here
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if memory_bytes:
+        # The inherited graph counts towards the address space, so the limit is on top of it
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+        resource.setrlimit(resource.RLIMIT_AS, (current + memory_bytes, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    while True:
+        try:
+            program = conn.recv()
+        except EOFError:
+            return
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds), cpu_hard))
+        scope = dict(namespace)
+        try:
+            exec(program, scope)
+            if "FINAL_RESULT" in scope:
+                reply = ("ok", _describe(scope["FINAL_RESULT"]))
+            else:
+                reply = ("error", "The program did not set FINAL_RESULT")
+        except _CpuLimitExceeded:
+            reply = ("cpu_limit", f"CPU time limit of {cpu_seconds}s exceeded")
+        except MemoryError:
+            reply = ("memory_limit", f"Memory limit of {memory_bytes // 2**20} MiB exceeded")
+        except BaseException as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+        del scope
+        conn.send(reply)
+
+
+def _zygote_main(control, snapshot_dir, cpu_seconds, memory_bytes):
+    """
+    Build the program namespace from a graph snapshot, then fork a worker
+    for every connection received on control and send back its pid. Started
+    by the forkserver, so this process is single-threaded and safe to fork,
+    and its workers share the namespace copy-on-write.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Exited workers are reaped by the kernel
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    graph, analytics, _ = load_snapshot(snapshot_dir)
+    communities = np.asarray(analytics["communities"])
+    members = np.flatnonzero(communities)
+    namespace = {
+        "G_adb": nx.freeze(graph.to_networkx()),
+        "nx": nx,
+        "community_map": MappingProxyType(dict(zip(graph.node_ids[members].tolist(), communities[members].tolist()))),
+    }
+    # Drop the mapped snapshot files so they can be removed
+    del graph, analytics, communities, members
+    # Objects allocated so far are never collected again, so the workers'
+    # garbage collector does not touch (and copy) their pages
+    gc.collect()
+    gc.freeze()
+    control.send("ready")
+    while True:
+        try:
+            conn = Connection(reduction.recv_handle(control))
+        except (EOFError, OSError):
+            return
+        pid = os.fork()
+        if pid == 0:
+            try:
+                control.close()
+                _worker_main(conn, namespace, cpu_seconds, memory_bytes)
+            finally:
+                os._exit(0)
+        conn.close()
+        control.send(pid)
+
+
+class ExecutionPool:
+    """
+    Processes that run programs against the graph (as G_adb) and Louvain
+    community map of a snapshot written by write_graph_snapshot.
+
+    A helper process started through the forkserver builds the NetworkX
+    graph once and forks the workers, which share it copy-on-write; the
+    server itself never holds the NetworkX graph or forks. Every program
+    gets cpu_seconds of CPU time and memory_mb of memory on top of the
+    graph, and wall_seconds before its worker is killed. Workers that hit
+    a limit, time out or die are replaced by a fresh fork, so no program
+    sees state left over by a failed one. If the helper process is gone
+    and no replacement can be forked, the pool is marked broken and
+    stops taking programs.
+    """
+
+    def __init__(self, snapshot_dir, workers=2, cpu_seconds=10.0, memory_mb=1024, wall_seconds=None,
+                 start_timeout=600.0):
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = int(memory_mb * 2**20) if memory_mb else 0
+        self.wall_seconds = wall_seconds or 3 * cpu_seconds + 1
+        self.restarts = 0
+        self.broken = False
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._closed = False
+        self._spawn_lock = threading.Lock()
+        context = multiprocessing.get_context("forkserver")
+        self._control, child = context.Pipe()
+        self._zygote = context.Process(
+            target=_zygote_main,
+            args=(child, snapshot_dir, cpu_seconds, self.memory_bytes),
+            daemon=True,
+        )
+        self._zygote.start()
+        child.close()
+        try:
+            if not self._control.poll(start_timeout) or self._control.recv() != "ready":
+                raise RuntimeError("timed out")
+        except (EOFError, OSError, RuntimeError) as e:
+            self._zygote.kill()
+            self._zygote.join()
+            raise RuntimeError(f"NetworkX execution pool did not start: {str(e) or 'helper process exited'}")
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        parent, child = multiprocessing.Pipe()
+        with self._spawn_lock:
+            reduction.send_handle(self._control, child.fileno(), self._zygote.pid)
+            pid = self._control.recv()
+        child.close()
+        worker = (pid, parent)
+        self._workers.add(worker)
+        return worker
+
+    def _discard(self, worker):
+        pid, conn = worker
+        self._workers.discard(worker)
+        conn.close()
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def run(self, program):
+        """Run one program on an idle worker, waiting for one if all are busy"""
+        worker = self._idle.get()
+        if worker is None:
+            # Closed or broken; wake the next waiter too
+            self._idle.put(None)
+            raise PoolClosedError("Execution pool is " + ("broken" if self.broken else "closed"))
+        _, conn = worker
+        start = time.perf_counter()
+        try:
+            conn.send(program)
+            if conn.poll(self.wall_seconds):
+                status, result = conn.recv()
+            else:
+                status, result = "timeout", f"Wall time limit of {self.wall_seconds}s exceeded"
+        except (EOFError, OSError):
+            status, result = "crashed", "Worker exited unexpectedly"
+        seconds = time.perf_counter() - start
+        if self._closed:
+            self._discard(worker)
+        elif status not in ("ok", "error"):
+            self._discard(worker)
+            try:
+                self._idle.put(self._spawn())
+                self.restarts += 1
+            except (EOFError, OSError):
+                # The helper process died (e.g. OOM killed); let waiters go
+                # on to a rebuilt pool rather than block on a lost worker
+                print("NetworkX execution pool helper process is gone; pool marked broken")
+                self.broken = True
+                self._idle.put(None)
+        else:
+            self._idle.put(worker)
+        return ExecutionResult(status, result, seconds)
+
+    def close(self):
+        """Stop the idle workers now and busy ones once their program finishes"""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                self._discard(worker)
+        self._idle.put(None)
+        self._control.close()
+        self._zygote.join(1)
+        if self._zygote.is_alive():
+            self._zygote.kill()
+            self._zygote.join()
+
+
+class NetworkXQA:
+    """
+    Question answering over the analyzer's graph with generated NetworkX
+    programs. The execution pool is started lazily on the first question
+    and rebuilt after the graph version changes, but at most once every
+    rebuild_seconds: in between, programs run against the graph version
+    the pool was built for, which the response reports. A broken pool is
+    rebuilt on the next question.
+    """
+
+    def __init__(self, analyzer, llm, workers=2, cpu_seconds=10.0, memory_mb=1024, cache_entries=256,
+                 cache_ttl=3600.0, rebuild_seconds=30.0):
+        self.analyzer = analyzer
+        self.llm = llm
+        self.workers = workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.rebuild_seconds = rebuild_seconds
+        self.programs = TTLCache(cache_entries, cache_ttl)
+        self.answers = TTLCache(cache_entries, cache_ttl)
+        self._pool = None
+        self._pool_version = None
+        self._built_at = 0.0
+        self._pool_lock = threading.Lock()
+
+    def _execution_pool(self):
+        """(pool, graph version it runs programs against), building a pool for the current version when due"""
+        with self._pool_lock:
+            graph_version = self.analyzer.graph_version
+            stale = self._pool_version != graph_version
+            due = stale and time.monotonic() - self._built_at >= self.rebuild_seconds
+            if self._pool is None or self._pool.broken or due:
+                start = time.perf_counter()
+                directory = tempfile.mkdtemp(prefix="nx-qa-")
+                try:
+                    snapshot_dir = os.path.join(directory, "graph")
+                    self.analyzer.write_graph_snapshot(snapshot_dir)
+                    pool = ExecutionPool(
+                        snapshot_dir,
+                        workers=self.workers,
+                        cpu_seconds=self.cpu_seconds,
+                        memory_mb=self.memory_mb,
+                    )
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+                if self._pool is not None:
+                    self._pool.close()
+                self._pool, self._pool_version, self._built_at = pool, graph_version, time.monotonic()
+                print(f"NetworkX execution pool of {self.workers} workers started for graph version "
+                      f"{graph_version} in {time.perf_counter() - start:.2f}s")
+            return self._pool, self._pool_version
+
+    def ask(self, query):
+        """
+        Answer a question. Failed programs are reported with their status
+        and error and are not cached, so asking again generates a new one.
+        """
+        self.analyzer.ensure_graph()
+        with self.analyzer.pinned():
+            while True:
+                try:
+                    return self._ask(query)
+                except PoolClosedError:
+                    # Rebuilt, or broke, while this question waited; a pool
+                    # that fails to start raises RuntimeError instead
+                    continue
+
+    def _ask(self, query):
+        schema = self.analyzer.graph_schema()
+        key = (normalize_query(query), schema_hash(schema))
+        start = time.perf_counter()
+        pool, graph_version = self._execution_pool()
+
+        found, cached = self.answers.get(key + (graph_version,))
+        if found:
+            return dict(cached, query=query, cached={"program": True, "answer": True},
+                        seconds=time.perf_counter() - start)
+
+        program_cached, program = self.programs.get(key)
+        if not program_cached:
+            program = self.llm.generate_program(query, schema)
+            self.programs.put(key, program)
+
+        execution = pool.run(program)
+        response = {
+            "query": query,
+            "graph_version": graph_version,
+            "program": program,
+            "status": execution.status,
+            "result": execution.result if execution.status == "ok" else None,
+            "answer": None,
+            "error": None if execution.status == "ok" else execution.result,
+            "execution_seconds": execution.seconds,
+        }
+        if execution.status == "ok":
+            response["answer"] = self.llm.answer(query, schema, program, execution.result)
+            self.answers.put(key + (graph_version,), response)
+        else:
+            self.programs.pop(key)
+        return dict(response, cached={"program": program_cached, "answer": False}, seconds=time.perf_counter() - start)
+
+    def stats(self):
+        pool = self._pool
+        return {
+            "programs": self.programs.stats(),
+            "answers": self.answers.stats(),
+            "pool_graph_version": self._pool_version,
+            "rebuild_seconds": self.rebuild_seconds,
+            "workers": self.workers,
+            "restarts": pool.restarts if pool is not None else 0,
+        }
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+                self._pool_version = None
@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import json
+from collections import namedtuple
+
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are only kept uncompressed
+MIN_COMPRESS_BYTES = 512
+
+# A JSON response body encoded once, ahead of any request. variants maps a
+# content coding ("identity", "gzip", "br") to (body, strong etag).
+EncodedResponse = namedtuple("EncodedResponse", ["variants"])
+
+
+def encode_json(value):
+    """JSON bytes of an analytics result, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(jsonable_encoder(value), separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def encode_response(value):
+    """
+    Encode a result as JSON plus gzip and (when brotli is installed)
+    brotli variants. The etag is a hash of the JSON, so an unchanged result
+    keeps its etag across graph versions; compressed variants get a suffix
+    since strong etags must differ between content codings.
+    """
+    body = encode_json(value)
+    etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+    variants = {"identity": (body, f'"{etag}"')}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        variants["gzip"] = (gzip.compress(body, compresslevel=6, mtime=0), f'"{etag}-gzip"')
+        if brotli is not None:
+            variants["br"] = (brotli.compress(body, quality=5), f'"{etag}-br"')
+    return EncodedResponse(variants)
+
+
+def choose_encoding(encoded, accept_encoding):
+    """Best variant the client accepts per its Accept-Encoding header: br, then gzip, then identity"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    for coding in ("br", "gzip"):
+        if coding in encoded.variants and (coding in accepted or "*" in accepted):
+            return coding
+    return "identity"
+
+
+def not_modified(encoded, if_none_match):
+    """Whether an If-None-Match header matches the response, in any of its codings"""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or any(etag in tags for _, etag in encoded.variants.values())
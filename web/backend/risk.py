@@ -0,0 +1,100 @@
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+# Reasons 0-3 follow from a node's position, 4 and up are mock reasons of
+# which every node gets one or two
+RISK_REASONS = [
+    "High dependency on other suppliers",
+    "Critical for many products",
+    "Historical performance issues",
+    "General supply chain position",
+    "Geographic concentration risk",
+    "Limited alternative sources",
+    "Single sourcing for key components",
+    "Long lead times",
+    "Quality control challenges",
+    "Contractual constraints",
+    "Market volatility exposure",
+]
+_FIRST_MOCK_REASON = 4
+
+# Node indices ordered by decreasing risk and their scores in that order,
+# plus the score and a bitmask of RISK_REASONS for every node index
+RiskIndex = namedtuple("RiskIndex", ["order", "ranked_scores", "scores", "reasons"])
+
+
+def node_uniforms(node_ids, stream, seed=42):
+    """
+    Pseudo-random numbers in [0, 1), one per node.
+
+    Each value is a hash (splitmix64) of the node id, the stream number and
+    the seed, so a node always gets the same value, independent of which
+    other nodes are scored and of any global RNG state.
+    """
+    with np.errstate(over="ignore"):
+        x = np.asarray(node_ids).astype(np.uint64)
+        x = x * np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed * 0x632BE59BD9B4E019 + stream * 0xD1B54A32D192ED03 & (2**64 - 1))
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+def score_nodes(node_ids, in_degree, out_degree, centrality, seed=42):
+    """
+    Mock risk score and reasons for every node at once.
+
+    The base risk lies in [0.3, 0.9] and grows with the node's centrality
+    percentile, jittered per node; in- and out-degree each add up to 0.5.
+    Returns (scores, reasons) with reasons as bitmasks over RISK_REASONS.
+    """
+    n = len(node_ids)
+    percentile = np.empty(n)
+    percentile[np.argsort(centrality, kind="stable")] = np.arange(n) / max(n - 1, 1)
+    base_risk = 0.3 + 0.6 * (percentile + node_uniforms(node_ids, 0, seed)) / 2
+
+    in_degree_factor = np.minimum(in_degree / 20, 0.5)
+    out_degree_factor = np.minimum(out_degree / 20, 0.5)
+    scores = np.minimum((base_risk + in_degree_factor + out_degree_factor) / 3, 0.95)
+
+    reasons = np.where(in_degree > 10, 1 << 0, 0) | np.where(out_degree > 10, 1 << 1, 0)
+    reasons |= np.where(base_risk > 0.7, 1 << 2, 0)
+    reasons |= np.where(reasons == 0, 1 << 3, 0)
+
+    # One or two distinct mock reasons per node
+    num_mock = len(RISK_REASONS) - _FIRST_MOCK_REASON
+    first = (node_uniforms(node_ids, 1, seed) * num_mock).astype(np.int64)
+    second = (first + 1 + (node_uniforms(node_ids, 2, seed) * (num_mock - 1)).astype(np.int64)) % num_mock
+    reasons |= 1 << (_FIRST_MOCK_REASON + first)
+    reasons |= np.where(node_uniforms(node_ids, 3, seed) < 0.5, 1 << (_FIRST_MOCK_REASON + second), 0)
+    return scores, reasons.astype(np.uint16)
+
+
+def build_risk_index(node_ids, in_degree, out_degree, centrality, seed=42):
+    """Score every node and sort them by decreasing risk, once per graph version"""
+    scores, reasons = score_nodes(node_ids, in_degree, out_degree, centrality, seed)
+    order = np.argsort(-scores, kind="stable")
+    return RiskIndex(order, scores[order], scores, reasons)
+
+
+def reason_labels(mask):
+    """The RISK_REASONS selected by a bitmask, in list order"""
+    return [reason for bit, reason in enumerate(RISK_REASONS) if int(mask) >> bit & 1]
+
+
+def select_risks(order, ranked_scores, offset=0, limit=10, min_score=None):
+    """
+    One page of a risk ordering.
+
+    order lists node indices by decreasing score and ranked_scores their
+    scores in that order. Nodes scoring below min_score are cut off by
+    binary search, so a page costs O(limit) whatever the graph size.
+    """
+    if offset < 0 or limit < 0:
+        raise ValueError("offset and limit must not be negative")
+    end = len(order)
+    if min_score is not None:
+        end = bisect_right(ranked_scores, -min_score, key=lambda score: -score)
+    return order[min(offset, end):min(offset + limit, end)]
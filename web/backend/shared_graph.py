@@ -0,0 +1,131 @@
+"""
+Graph shared read-only between worker processes.
+
+One process publishes the graph arrays and precomputed analytics as a
+numbered generation of snapshot files; every worker memory-maps the
+newest generation, so the arrays live once in the page cache however many
+workers attach. A generation counter, itself a memory-mapped 8-byte file,
+tells workers when a newer generation is published. Put the directory on
+tmpfs (e.g. /dev/shm) to keep it in shared memory.
+
+Publish (or reload) from the command line while the workers keep running:
+
+    python shared_graph.py --data-dir ./data --shared-dir /dev/shm/eeve-graph
+"""
+import argparse
+import fcntl
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from graph_snapshot import load_snapshot, write_snapshot
+
+# Generations kept on disk besides the newest, for workers still swapping over
+KEEP_GENERATIONS = 1
+
+# Attempts at attaching before giving up, in case generations are published
+# (and old ones removed) faster than a worker can map them
+ATTACH_ATTEMPTS = 5
+
+
+class ReadOnlyGraphError(Exception):
+    """Raised when updating a graph that is shared between workers"""
+
+
+class SharedGraphStore:
+    """
+    Generations of a graph in a directory shared between processes:
+    gen-<N>/ snapshot directories plus the generation counter.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, "publish.lock"), "a")
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        counter_path = os.path.join(directory, "generation")
+        with self.publishing():
+            if not os.path.exists(counter_path):
+                with open(counter_path + ".tmp", "wb") as f:
+                    f.write(np.zeros(1, dtype=np.int64).tobytes())
+                os.replace(counter_path + ".tmp", counter_path)
+        # A shared mapping: generations published by other processes show up here
+        self._counter = np.memmap(counter_path, dtype=np.int64, mode="r+", shape=(1,))
+
+    def generation(self):
+        """Newest published generation, 0 when there is none yet"""
+        return int(self._counter[0])
+
+    def generation_path(self, generation):
+        return os.path.join(self.directory, f"gen-{generation}")
+
+    @contextmanager
+    def publishing(self):
+        """Exclusive between processes (and threads) while held; reentrant"""
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def publish(self, graph, analytics=None, checksum=None):
+        """
+        Write the graph and analytics arrays as the next generation, then
+        bump the counter. The counter only moves once the snapshot is
+        complete, so workers never map a half-written generation.
+        """
+        with self.publishing():
+            generation = self.generation() + 1
+            write_snapshot(self.generation_path(generation), graph, checksum, analytics)
+            self._counter[0] = generation
+            self._counter.flush()
+            # Workers keep mapping removed files until they swap over
+            for name in os.listdir(self.directory):
+                if name.startswith("gen-") and name[4:].isdigit() and int(name[4:]) < generation - KEEP_GENERATIONS:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        return generation
+
+    def attach(self):
+        """
+        Memory-map the newest generation.
+
+        Returns (generation, graph, analytics, manifest), or None when
+        nothing is published yet.
+        """
+        for _ in range(ATTACH_ATTEMPTS):
+            generation = self.generation()
+            if generation == 0:
+                return None
+            snapshot = load_snapshot(self.generation_path(generation))
+            if snapshot is not None:
+                return (generation, *snapshot)
+            time.sleep(0.1)
+        raise RuntimeError(f"Could not attach to shared graph generation {generation} in {self.directory}")
+
+
+def main():
+    from graph_analysis import AmazonGraphAnalyzer
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--shared-dir", default=os.getenv("SHARED_GRAPH_DIR"), required=not os.getenv("SHARED_GRAPH_DIR"),
+                        help="directory the workers attach to (default: $SHARED_GRAPH_DIR)")
+    args = parser.parse_args()
+
+    analyzer = AmazonGraphAnalyzer(args.data_dir)
+    analyzer.load_graph()
+    analyzer.publish_shared(SharedGraphStore(args.shared_dir))
+
+
+if __name__ == "__main__":
+    main()
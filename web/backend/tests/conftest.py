@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The backend modules are imported flat, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class EdgeListStore:
+    """In-memory stand-in for a GraphStore the analyzer loads its graph from"""
+
+    def __init__(self, sources, targets):
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+
+    def describe(self):
+        return "memory"
+
+    def read_edges(self):
+        return self.sources, self.targets
+
+
+@pytest.fixture
+def make_analyzer(tmp_path):
+    """AmazonGraphAnalyzer over the given edges, without dataset or snapshot files"""
+    from graph_analysis import AmazonGraphAnalyzer
+
+    def make(sources, targets, **options):
+        options.setdefault("use_snapshot", False)
+        return AmazonGraphAnalyzer(str(tmp_path / "data"), store=EdgeListStore(sources, targets), **options)
+    return make
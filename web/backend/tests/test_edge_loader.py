@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from edge_loader import load_edge_arrays, parse_edge_chunk
+
+
+def test_parse_edge_chunk_skips_comments_and_blank_lines():
+    edges = parse_edge_chunk(b"# FromNodeId\tToNodeId\n1\t2\n\n3 4\r\n  \n5 6")
+    assert edges.tolist() == [[1, 2], [3, 4], [5, 6]]
+
+
+def test_parse_edge_chunk_rejects_malformed_line_mid_chunk():
+    with pytest.raises(ValueError, match="foo bar"):
+        parse_edge_chunk(b"1 2\n3 4\nfoo bar\n5 6\n7 8\n")
+
+
+@pytest.mark.parametrize("line", [b"9", b"9 10 11", b"9 1.5", b"9 x"])
+def test_parse_edge_chunk_rejects_wrong_field_count_or_type(line):
+    with pytest.raises(ValueError, match="Malformed edge list line"):
+        parse_edge_chunk(b"1 2\n" + line + b"\n3 4\n")
+
+
+@pytest.mark.parametrize("line", [b"3 4.5", b"3 4abc", b"3 0x4", b"3 -4"])
+def test_parse_edge_chunk_rejects_malformed_last_line(line):
+    with pytest.raises(ValueError, match="Malformed edge list line"):
+        parse_edge_chunk(b"1 2\n" + line + b"\n")
+    with pytest.raises(ValueError, match="Malformed edge list line"):
+        parse_edge_chunk(b"1 2\n" + line)
+
+
+def test_parse_edge_chunk_rejects_bad_lines_that_cancel_out():
+    with pytest.raises(ValueError, match="1 2 3"):
+        parse_edge_chunk(b"1 2 3\n4\n5 6\n")
+
+
+def test_load_edge_arrays_raises_on_bad_line_in_later_chunk(tmp_path):
+    path = tmp_path / "edges.txt"
+    path.write_bytes(b"".join(b"%d %d\n" % (i, i + 1) for i in range(1000)) + b"oops\n1 2\n")
+    with pytest.raises(ValueError, match="oops"):
+        load_edge_arrays(str(path), chunk_bytes=256)
+
+
+def test_load_edge_arrays_round_trip(tmp_path):
+    path = tmp_path / "edges.txt"
+    path.write_bytes(b"# header\n" + b"".join(b"%d\t%d\n" % (i, i * 2) for i in range(1000)))
+    sources, targets, report = load_edge_arrays(str(path), chunk_bytes=256)
+    assert report["rows"] == 1000
+    np.testing.assert_array_equal(sources, np.arange(1000))
+    np.testing.assert_array_equal(targets, np.arange(1000) * 2)
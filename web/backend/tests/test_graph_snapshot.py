@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+
+import numpy as np
+import pytest
+
+from graph_analysis import AmazonGraphAnalyzer
+from graph_snapshot import MANIFEST_NAME, load_snapshot, source_checksum
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    rng = np.random.default_rng(1)
+    sources = rng.integers(0, 300, 1500)
+    targets = rng.integers(0, 300, 1500)
+    lines = b"".join(b"%d\t%d\n" % pair for pair in zip(sources.tolist(), targets.tolist()))
+    with gzip.open(tmp_path / "amazon0302.txt.gz", "wb") as f:
+        f.write(b"# Directed graph\n" + lines)
+    return str(tmp_path)
+
+
+def warm(analyzer):
+    analyzer.get_basic_stats()
+    analyzer.get_community_detection()
+    return analyzer.get_risk_analysis(num_suppliers=50)
+
+
+def test_warm_start_maps_the_analytics_computed_at_warm_up(data_dir):
+    cold = AmazonGraphAnalyzer(data_dir)
+    risks = warm(cold)
+    assert cold.persist_analytics()
+    assert not cold.persist_analytics()
+
+    warm_start = AmazonGraphAnalyzer(data_dir)
+    warm_start.ensure_graph()
+    assert {"pagerank", "louvain_partition", "risk_order", "risk_scores"} <= set(warm_start.precomputed)
+    assert isinstance(warm_start.precomputed["risk_order"], np.memmap)
+    assert warm(warm_start) == risks
+    np.testing.assert_array_equal(
+        warm_start.get_louvain_partition().partition, cold.get_louvain_partition().partition
+    )
+
+
+def test_updated_graph_is_not_persisted(data_dir):
+    analyzer = AmazonGraphAnalyzer(data_dir)
+    analyzer.ensure_graph()
+    analyzer.apply_updates(add_edges=[(1, 2)])
+    assert not analyzer.persist_analytics()
+
+
+def test_snapshot_of_other_version_or_dataset_is_not_loaded(data_dir):
+    analyzer = AmazonGraphAnalyzer(data_dir)
+    warm(analyzer)
+    analyzer.persist_analytics()
+    snapshot = analyzer.snapshot_path
+    checksum = source_checksum(analyzer.dataset_path)
+    assert load_snapshot(snapshot, checksum) is not None
+    assert load_snapshot(snapshot, "0" * 64) is None
+
+    manifest_path = os.path.join(snapshot, MANIFEST_NAME)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["version"] -= 1
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    assert load_snapshot(snapshot, checksum) is None
+    # A stale snapshot is rebuilt from the dataset on the next start
+    rebuilt = AmazonGraphAnalyzer(data_dir)
+    rebuilt.ensure_graph()
+    assert "snapshot" not in rebuilt.load_report
+    assert load_snapshot(snapshot, checksum) is not None
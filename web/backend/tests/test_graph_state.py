@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+
+NUM_NODES = 200
+
+
+def ring_with_chords(num_nodes, seed=0):
+    rng = np.random.default_rng(seed)
+    sources = np.concatenate([np.arange(num_nodes), rng.integers(0, num_nodes, num_nodes)])
+    targets = np.concatenate([(np.arange(num_nodes) + 1) % num_nodes, rng.integers(0, num_nodes, num_nodes)])
+    return sources, targets
+
+
+def test_readers_see_one_graph_version_while_updates_swap_it(make_analyzer):
+    analyzer = make_analyzer(*ring_with_chords(NUM_NODES))
+    analyzer.get_risk_analysis()
+    stop = threading.Event()
+    errors = []
+
+    def update():
+        # Version v (after v - 1 updates) holds the nodes v - 1 .. NUM_NODES + 2 (v - 1) - 1,
+        # so node indices shift with every update
+        for step in range(40):
+            first = NUM_NODES + 2 * step
+            analyzer.apply_updates(
+                add_nodes=[first, first + 1],
+                remove_nodes=[step],
+                add_edges=[(first, first + 1), (first + 1, step + 1), (step + 2, first)],
+            )
+        stop.set()
+
+    def read():
+        while not stop.is_set():
+            try:
+                with analyzer.pinned() as state:
+                    assert analyzer.graph is state.graph and analyzer.graph_version == state.version
+                    assert len(analyzer._risk_index().scores) == state.graph.number_of_nodes()
+                risks = analyzer.get_risk_analysis(num_suppliers=10 * NUM_NODES)
+                nodes = sorted(risk["node"] for risk in risks)
+                removed = nodes[0]
+                assert nodes == list(range(removed, NUM_NODES + 2 * removed)), "response mixes graph versions"
+                assert all(a["score"] >= b["score"] for a, b in zip(risks, risks[1:]))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    writer = threading.Thread(target=update)
+    for thread in readers + [writer]:
+        thread.start()
+    for thread in readers + [writer]:
+        thread.join()
+    assert not errors, errors[0]
+    assert analyzer.graph_version == 41
+
+
+def test_pin_outlives_update(make_analyzer):
+    analyzer = make_analyzer(*ring_with_chords(NUM_NODES))
+    analyzer.ensure_graph()
+    with analyzer.pinned() as state:
+        analyzer.apply_updates(remove_nodes=[0])
+        assert analyzer.graph is state.graph
+        assert analyzer.graph.number_of_nodes() == NUM_NODES
+    assert analyzer.graph.number_of_nodes() == NUM_NODES - 1
+    assert analyzer.graph_version == state.version + 1
+
+
+def test_snapshots_do_not_block_each_other_or_updates(make_analyzer):
+    analyzer = make_analyzer(*ring_with_chords(NUM_NODES))
+    entered = threading.Barrier(3, timeout=5)
+    versions = []
+
+    def batch():
+        with analyzer.snapshot() as graph_version:
+            entered.wait()
+            entered.wait()
+            versions.append((graph_version, analyzer.graph_version, analyzer.graph.number_of_nodes()))
+
+    readers = [threading.Thread(target=batch) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    entered.wait()
+    # Both batches hold their snapshot; an update still goes through
+    report = analyzer.apply_updates(remove_nodes=[0])
+    entered.wait()
+    for thread in readers:
+        thread.join()
+    assert versions == [(1, 1, NUM_NODES)] * 2
+    assert report["graph_version"] == 2
@@ -0,0 +1,180 @@
+import errno
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+from edge_loader import parse_edge_file
+from graph_store import ArangoStore, BulkLoader, FileStore, GraphStore, StoreError
+
+
+class FakeArango:
+    """
+    Stand-in for the parts of the ArangoDB HTTP API the store uses: database
+    and collection creation, bulk import and cursors. fail(n) answers the
+    n-th import request with the status given.
+    """
+
+    def __init__(self):
+        self.collections = {}
+        self.imports = 0
+        self.failures = {}
+        self.cursors = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def edges(self):
+        with self.lock:
+            return sorted((int(d["_from"][6:]), int(d["_to"][6:])) for d in self.collections["edges"].values())
+
+    def _import(self, collection, body):
+        with self.lock:
+            self.imports += 1
+            status = self.failures.get(self.imports)
+            if status is not None:
+                return status, {"error": True, "errorMessage": "injected"}
+            documents = self.collections[collection]
+            for line in body.splitlines():
+                document = json.loads(line)
+                documents.setdefault(document["_key"], document)
+        return 201, {"errors": 0}
+
+    def _cursor(self, items, size, cursor_id):
+        with self.lock:
+            if len(items) > size:
+                self.cursors[cursor_id] = (items[size:], size)
+        return 201, {"result": items[:size], "hasMore": len(items) > size, "id": cursor_id}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if url.path.endswith("/_api/database"):
+                    return self._reply(201, {})
+                if url.path.endswith("/_api/collection"):
+                    name = json.loads(body)["name"]
+                    with fake.lock:
+                        exists = name in fake.collections
+                        fake.collections.setdefault(name, {})
+                    return self._reply(409 if exists else 200, {})
+                if url.path.endswith("/_api/import"):
+                    return self._reply(*fake._import(parse_qs(url.query)["collection"][0], body))
+                if url.path.endswith("/_api/cursor"):
+                    edges = [list(edge) for edge in fake.edges()]
+                    return self._reply(*fake._cursor(edges, json.loads(body)["batchSize"], "1"))
+                self._reply(404, {})
+
+            def do_PUT(self):
+                with fake.lock:
+                    items, size = fake.cursors.pop(self.path.rsplit("/", 1)[1])
+                self._reply(*fake._cursor(items, size, "1"))
+
+        return Handler
+
+
+@pytest.fixture
+def arango():
+    fake = FakeArango()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def edge_file(tmp_path):
+    rng = np.random.default_rng(3)
+    pairs = np.unique(rng.integers(0, 400, (2000, 2)), axis=0)
+    rng.shuffle(pairs)
+    path = tmp_path / "edges.txt"
+    path.write_bytes(b"# edges\n" + b"".join(b"%d\t%d\n" % (s, t) for s, t in pairs.tolist()))
+    return str(path)
+
+
+def expected_edges(path):
+    return sorted(map(tuple, parse_edge_file(path).tolist()))
+
+
+def test_graph_store_is_abstract():
+    with pytest.raises(TypeError):
+        GraphStore()
+
+
+def test_import_and_cursor_round_trip(arango, edge_file):
+    store = ArangoStore(arango.url, read_batch_size=128)
+    report = BulkLoader(store, batch_size=100, writers=4).load(edge_file)
+    assert report["edges"] == len(expected_edges(edge_file))
+    assert arango.edges() == expected_edges(edge_file)
+    sources, targets = store.read_edges()
+    assert sorted(zip(sources.tolist(), targets.tolist())) == expected_edges(edge_file)
+
+
+def test_transient_failures_are_retried(arango, edge_file):
+    arango.failures = {3: 503, 7: 429, 8: 503}
+    report = BulkLoader(ArangoStore(arango.url), batch_size=100, writers=4, backoff=0.01).load(edge_file)
+    assert report["retries"] == 3
+    assert arango.edges() == expected_edges(edge_file)
+
+
+def test_failed_load_resumes_from_the_watermark(arango, edge_file, tmp_path):
+    checkpoint = str(tmp_path / "load.checkpoint")
+    arango.failures = {12: 400}
+    loader = BulkLoader(ArangoStore(arango.url), batch_size=100, writers=2, backoff=0.01, checkpoint_path=checkpoint)
+    with pytest.raises(StoreError, match="resumes"):
+        loader.load(edge_file)
+    with open(checkpoint) as f:
+        watermark = json.load(f)["offset"]
+    assert 0 < watermark < len(expected_edges(edge_file))
+    # Everything below the watermark is stored
+    rows = parse_edge_file(edge_file)
+    assert set(map(tuple, rows[:watermark].tolist())) <= set(arango.edges())
+
+    arango.failures = {}
+    report = loader.load(edge_file)
+    assert report["resumed_from"] == watermark
+    assert report["edges"] == len(rows) - watermark
+    assert arango.edges() == expected_edges(edge_file)
+
+
+def test_file_store_retries_transient_os_errors(edge_file, tmp_path, monkeypatch):
+    store = FileStore(str(tmp_path / "documents"))
+    write = store._write
+    failures = [errno.ENOSPC, errno.EAGAIN]
+
+    def flaky_write(*args):
+        if failures:
+            raise OSError(failures.pop(), "injected")
+        return write(*args)
+
+    monkeypatch.setattr(store, "_write", flaky_write)
+    report = BulkLoader(store, batch_size=100, writers=1, backoff=0.01).load(edge_file)
+    assert report["retries"] == 2
+    sources, targets = store.read_edges()
+    assert sorted(zip(sources.tolist(), targets.tolist())) == expected_edges(edge_file)
+
+
+def test_nodes_are_written_once(tmp_path, edge_file):
+    store = FileStore(str(tmp_path / "documents"))
+    report = BulkLoader(store, batch_size=100, writers=2).load(edge_file)
+    assert report["nodes"] == len(np.unique(parse_edge_file(edge_file)))
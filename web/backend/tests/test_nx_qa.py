@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from nx_qa import NetworkXQA, StubLLM
+
+PROGRAMS = {
+    "how many edges": "FINAL_RESULT = G_adb.number_of_edges()",
+    "how many communities": "FINAL_RESULT = len(set(community_map.values()))",
+    "spin": "while True:\n    pass",
+    "hoard": "x = bytearray(4 * 2**30)\nFINAL_RESULT = len(x)",
+    "crash": "import os\nos._exit(3)",
+    "mutate": "G_adb.add_edge(-1, -2)",
+}
+
+
+@pytest.fixture
+def analyzer(make_analyzer):
+    rng = np.random.default_rng(5)
+    return make_analyzer(rng.integers(0, 200, 800), rng.integers(0, 200, 800))
+
+
+@pytest.fixture
+def qa(analyzer):
+    qa = NetworkXQA(analyzer, StubLLM(PROGRAMS), workers=2, cpu_seconds=1, memory_mb=256, rebuild_seconds=3600)
+    yield qa
+    qa.close()
+
+
+def test_answers_and_caches(qa, analyzer):
+    first = qa.ask("How many edges?")
+    assert first["status"] == "ok"
+    assert first["result"] == str(analyzer.graph.number_of_edges())
+    assert first["cached"] == {"program": False, "answer": False}
+    calls = qa.llm.calls
+    again = qa.ask("how many  EDGES")
+    assert again["cached"] == {"program": True, "answer": True}
+    assert again["answer"] == first["answer"]
+    assert qa.llm.calls == calls
+    assert qa.ask("how many communities")["result"] == str(int(analyzer.get_louvain_partition().partition.max()) + 1)
+
+
+@pytest.mark.parametrize("query, status", [
+    ("spin", "cpu_limit"),
+    ("hoard", "memory_limit"),
+    ("crash", "crashed"),
+])
+def test_limits_replace_the_worker(qa, query, status):
+    result = qa.ask(query)
+    assert result["status"] == status
+    assert result["answer"] is None
+    assert qa.stats()["restarts"] == 1
+    # The failed program is not cached and the replacement worker answers
+    assert qa.stats()["programs"]["entries"] == 0
+    for _ in range(3):
+        assert qa.ask("how many edges")["status"] == "ok"
+
+
+@pytest.mark.parametrize("first", ["crash", "how many edges"])
+def test_pool_is_rebuilt_after_helper_process_dies(qa, first):
+    assert qa.ask("how many edges")["status"] == "ok"
+    pool = qa._pool
+    pool._zygote.kill()
+    pool._zygote.join()
+    # Losing workers the helper cannot replace must not leave questions waiting
+    for query in [first, "crash", "crash", "how many edges"]:
+        qa.ask(query)
+    assert qa.ask("how many edges")["status"] == "ok"
+    assert qa._pool is not pool
+
+
+def test_graph_is_frozen(qa):
+    result = qa.ask("mutate")
+    assert result["status"] == "error"
+    assert "Frozen" in result["error"]
+
+
+def test_pool_is_rebuilt_after_updates_at_most_once_per_interval(qa, analyzer):
+    assert qa.ask("how many edges")["graph_version"] == 1
+    analyzer.apply_updates(add_edges=[(1000, 1001)])
+    analyzer.apply_updates(add_edges=[(1001, 1002)])
+    stale = qa.ask("how many edges")
+    assert stale["graph_version"] == 1
+    assert stale["result"] == str(analyzer.graph.number_of_edges() - 2)
+
+    qa.rebuild_seconds = 0
+    fresh = qa.ask("how many edges")
+    assert fresh["graph_version"] == 3
+    assert fresh["result"] == str(analyzer.graph.number_of_edges())
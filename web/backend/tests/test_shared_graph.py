@@ -0,0 +1,24 @@
+import numpy as np
+
+from graph_analysis import AmazonGraphAnalyzer
+from shared_graph import SharedGraphStore
+
+
+def test_workers_map_derived_graphs_instead_of_building_them(make_analyzer, tmp_path):
+    rng = np.random.default_rng(7)
+    # Two components, so the largest one is a proper subgraph
+    sources = np.concatenate([rng.integers(0, 300, 1200), [1000, 1001]])
+    targets = np.concatenate([rng.integers(0, 300, 1200), [1001, 1002]])
+    shared_dir = str(tmp_path / "shared")
+    publisher = make_analyzer(sources, targets)
+    publisher.ensure_graph()
+    publisher.publish_shared(SharedGraphStore(shared_dir))
+    expected = publisher.get_community_detection()
+
+    worker = AmazonGraphAnalyzer(str(tmp_path / "data"), shared_dir=shared_dir)
+    assert worker.get_community_detection() == expected
+    assert worker.get_risk_analysis(community=1) == publisher.get_risk_analysis(community=1)
+    component = worker._largest_component_undirected()
+    for values in (component.node_ids, component.out_offsets, component.out_indices, worker._node_communities()):
+        assert isinstance(values, np.memmap)
+    np.testing.assert_array_equal(component.out_indices, publisher._largest_component_undirected().out_indices)
@@ -0,0 +1,147 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Communities beyond this many (the smallest) are left out of the layout
+MAX_LAYOUT_COMMUNITIES = 1000
+# Ego subgraphs are laid out per request, in O(max_nodes²) per iteration
+MAX_EGO_NODES = 500
+# Share of all nodes, by decreasing risk score, counted as high risk
+HIGH_RISK_SHARE = 0.01
+
+# The communities (1..k, by decreasing size) of a partition as nodes of a
+# graph: per-community sizes, internal edges and risk aggregates (index c
+# holds community c + 1), and the edges between communities (c1 < c2,
+# 0-based) weighted by the number of graph edges joining them
+CommunityGraph = namedtuple(
+    "CommunityGraph",
+    ["sizes", "internal_edges", "mean_risk", "max_risk", "high_risk_members", "sources", "targets", "weights"],
+)
+
+
+def community_graph(graph, communities, risk_scores):
+    """
+    Quotient graph of a node -> community assignment (1-based, 0 for nodes
+    in no community), in one pass over the edges. Edge direction is ignored.
+    """
+    num = int(communities.max(initial=0))
+    members = communities > 0
+    labels = communities[members] - 1
+    sizes = np.bincount(labels, minlength=num)
+    scores = risk_scores[members]
+    mean_risk = np.bincount(labels, scores, minlength=num) / np.maximum(sizes, 1)
+    max_risk = np.zeros(num)
+    np.maximum.at(max_risk, labels, scores)
+    cutoff = np.quantile(risk_scores, 1 - HIGH_RISK_SHARE) if len(risk_scores) else 0.0
+    high_risk = np.bincount(labels[scores >= cutoff], minlength=num)
+
+    src, dst = graph.edge_arrays()
+    src, dst = communities[src], communities[dst]
+    keep = (src > 0) & (dst > 0)
+    src, dst = src[keep] - 1, dst[keep] - 1
+    inside = src == dst
+    internal = np.bincount(src[inside], minlength=num)
+    if not graph.directed:
+        # Undirected edges are stored in both rows
+        internal //= 2
+    low, high = np.minimum(src[~inside], dst[~inside]), np.maximum(src[~inside], dst[~inside])
+    pairs, weights = np.unique(low * num + high, return_counts=True)
+    if not graph.directed:
+        weights //= 2
+    return CommunityGraph(sizes, internal, mean_risk, max_risk, high_risk, pairs // num, pairs % num, weights)
+
+
+def force_layout(num_nodes, sources, targets, weights=None, masses=None, iterations=100, seed=42, block=256):
+    """
+    Fruchterman-Reingold layout, vectorized: every iteration computes all
+    pairwise repulsions block by block and all edge attractions at once.
+    Heavier nodes (masses) push harder, heavier edges (weights) pull harder.
+    Returns an (n, 2) array of positions scaled into [-1, 1].
+    """
+    if num_nodes == 0:
+        return np.zeros((0, 2))
+    if num_nodes == 1:
+        return np.zeros((1, 2))
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-1, 1, (num_nodes, 2))
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.log1p(np.asarray(weights, dtype=float))
+    weights = weights / weights.max() if len(weights) else weights
+    masses = np.ones(num_nodes) if masses is None else np.asarray(masses, dtype=float) / np.mean(masses)
+    # Ideal distance between nodes for an area of 4 (the [-1, 1] square)
+    k = 2 / np.sqrt(num_nodes)
+    temperature = 0.1
+
+    x, y = positions[:, 0].copy(), positions[:, 1].copy()
+    for _ in range(iterations):
+        dx_total = np.empty(num_nodes)
+        dy_total = np.empty(num_nodes)
+        for start in range(0, num_nodes, block):
+            dx = x[start:start + block, None] - x
+            dy = y[start:start + block, None] - y
+            force = masses / np.maximum(dx * dx + dy * dy, 1e-9)
+            dx_total[start:start + block] = (dx * force).sum(axis=1)
+            dy_total[start:start + block] = (dy * force).sum(axis=1)
+        dx_total *= k * k
+        dy_total *= k * k
+
+        dx = x[sources] - x[targets]
+        dy = y[sources] - y[targets]
+        pull = np.sqrt(dx * dx + dy * dy) * weights / k
+        dx *= pull
+        dy *= pull
+        dx_total += np.bincount(targets, dx, minlength=num_nodes) - np.bincount(sources, dx, minlength=num_nodes)
+        dy_total += np.bincount(targets, dy, minlength=num_nodes) - np.bincount(sources, dy, minlength=num_nodes)
+
+        length = np.maximum(np.sqrt(dx_total * dx_total + dy_total * dy_total), 1e-9)
+        step = np.minimum(length, temperature) / length
+        x += dx_total * step
+        y += dy_total * step
+        temperature -= 0.1 / iterations
+
+    positions = np.column_stack([x, y])
+    positions -= positions.mean(axis=0)
+    return positions / max(np.abs(positions).max(), 1e-9)
+
+
+def ego_nodes(graph, center, hops, max_nodes, scores):
+    """
+    Nodes within `hops` of a node index, ignoring edge direction, and their
+    distances. At most max_nodes are kept: when a hop would overflow, the
+    nodes of that hop with the highest scores fill the remaining room.
+    Returns (nodes, distances, truncated).
+    """
+    seen = np.zeros(graph.number_of_nodes(), dtype=bool)
+    seen[center] = True
+    layers, distances = [np.array([center])], [np.zeros(1, dtype=np.int64)]
+    frontier, count, truncated = layers[0], 1, False
+    for hop in range(1, hops + 1):
+        _, successors = graph.out_edges(frontier)
+        _, predecessors = graph.in_edges(frontier)
+        frontier = np.unique(np.concatenate([successors, predecessors]))
+        frontier = frontier[~seen[frontier]]
+        if len(frontier) == 0:
+            break
+        if count + len(frontier) > max_nodes:
+            frontier = frontier[np.argsort(-scores[frontier], kind="stable")[:max_nodes - count]]
+            truncated = True
+        seen[frontier] = True
+        layers.append(frontier)
+        distances.append(np.full(len(frontier), hop))
+        count += len(frontier)
+        if truncated:
+            break
+    return np.concatenate(layers), np.concatenate(distances), truncated
+
+
+def induced_edges(graph, nodes):
+    """(sources, targets, edge positions) of the stored edges between the given node indices"""
+    inside = np.zeros(graph.number_of_nodes(), dtype=bool)
+    inside[nodes] = True
+    counts = graph.out_offsets[nodes + 1] - graph.out_offsets[nodes]
+    positions = np.repeat(graph.out_offsets[nodes] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    sources = np.repeat(nodes, counts)
+    targets = graph.out_indices[positions]
+    keep = inside[targets]
+    return sources[keep], targets[keep], positions[keep]